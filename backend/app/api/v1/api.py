@@ -7,6 +7,7 @@ from fastapi import APIRouter
 from app.modules.ml.routes import router as ml_router
 # from app.modules.tutorial.routes import router as tutorial_router  # TEMPORALMENTE DESHABILITADO
 from app.modules.gamification.routes import router as gamification_router
+from app.modules.admin.routes import router as admin_router
 
 api_router = APIRouter()
 
@@ -29,6 +30,12 @@ api_router.include_router(
     tags=["Gamification"]
 )
 
+api_router.include_router(
+    admin_router,
+    prefix="/admin",
+    tags=["Admin"]
+)
+
 # Endpoints generales de la API
 @api_router.get("/")
 async def api_root():
@@ -41,7 +48,8 @@ async def api_root():
         "modules": [
             "ml - Machine Learning y predicciones",
             "tutorial - Tutorial interactivo", 
-            "gamification - Sistema de gamificación (challenges, niveles, puntuaciones)"
+            "gamification - Sistema de gamificación (challenges, niveles, puntuaciones)",
+            "admin - Diagnóstico y operación (requiere X-Admin-Token)"
         ],
         "documentation": "/docs"
     }
@@ -0,0 +1,25 @@
+"""
+Dependencias de autenticación para endpoints administrativos
+"""
+
+import secrets
+from typing import Optional
+
+from fastapi import Header
+
+from app.core.config import settings
+from app.core.exceptions import HTTPForbiddenException, HTTPUnauthorizedException
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    """
+    Verificar el token administrativo enviado en el header X-Admin-Token.
+
+    Si ADMIN_TOKEN no está configurado los endpoints administrativos
+    quedan deshabilitados.
+    """
+    if not settings.ADMIN_TOKEN:
+        raise HTTPForbiddenException("Endpoints administrativos deshabilitados")
+
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPUnauthorizedException("Token administrativo inválido")
@@ -29,10 +29,17 @@ class Settings(BaseSettings):
     SUPABASE_ANON_KEY: str = Field(default="", env="SUPABASE_ANON_KEY")
     SUPABASE_SERVICE_ROLE_KEY: str = Field(default="", env="SUPABASE_SERVICE_ROLE_KEY")
     
+    # Backend de almacenamiento: "supabase" (remoto) o "sqlite" (local)
+    STORAGE_BACKEND: str = Field(default="supabase", env="STORAGE_BACKEND")  # "sqlite" limita app.serve a 1 worker
+    SQLITE_PATH: str = Field(default="/app/data/comsigns.db", env="SQLITE_PATH")
+    SQLITE_BATCH_SIZE: int = Field(default=50, env="SQLITE_BATCH_SIZE")  # Escrituras por commit
+    SQLITE_BATCH_INTERVAL_MS: int = Field(default=200, env="SQLITE_BATCH_INTERVAL_MS")  # Máximo antes de commit
+    
     # Seguridad
     SECRET_KEY: str = Field(default="your-secret-key-here", env="SECRET_KEY")
     ALGORITHM: str = Field(default="HS256", env="ALGORITHM")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(default=30, env="ACCESS_TOKEN_EXPIRE_MINUTES")
+    ADMIN_TOKEN: str = Field(default="", env="ADMIN_TOKEN")  # Vacío = endpoints admin deshabilitados
     
     # CORS
     ALLOWED_ORIGINS: List[str] = Field(
@@ -47,6 +54,123 @@ class Settings(BaseSettings):
     # ML Model Configuration
     MODEL_PATH: str = Field(default="/app/models/model.h5", env="MODEL_PATH")
     CONFIDENCE_THRESHOLD: float = Field(default=0.65, env="CONFIDENCE_THRESHOLD")
+    MODEL_WARMUP_RUNS: int = Field(default=3, env="MODEL_WARMUP_RUNS")  # Inferencias de prueba antes del swap
+    MODEL_REGISTRY_KEEP: int = Field(default=3, env="MODEL_REGISTRY_KEEP")  # Versiones cargadas (para rollback)
+    
+    # Extractor de landmarks: "solutions" (mp.solutions.hands) o "tasks" (HandLandmarker por sesión,
+    # solo con INFERENCE_BACKEND=local) en modo "video" o "live_stream"
+    LANDMARK_EXTRACTOR: str = Field(default="solutions", env="LANDMARK_EXTRACTOR")
+    HAND_LANDMARKER_MODEL_PATH: str = Field(default="/app/models/hand_landmarker.task", env="HAND_LANDMARKER_MODEL_PATH")
+    HAND_LANDMARKER_MODE: str = Field(default="live_stream", env="HAND_LANDMARKER_MODE")
+    
+    # Backend de inferencia: "local" (hilo dedicado), "pool" (procesos con memoria compartida)
+    # o "sidecar" (servidor de inferencia compartido por socket UNIX)
+    INFERENCE_BACKEND: str = Field(default="local", env="INFERENCE_BACKEND")
+    INFERENCE_WORKERS: int = Field(default=0, env="INFERENCE_WORKERS")  # 0 = un proceso por núcleo
+    INFERENCE_RING_SLOTS: int = Field(default=8, env="INFERENCE_RING_SLOTS")  # Frames en vuelo por proceso
+    INFERENCE_SLOT_BYTES: int = Field(default=524288, env="INFERENCE_SLOT_BYTES")  # 512KB por frame
+    INFERENCE_TIMEOUT_S: float = Field(default=10.0, env="INFERENCE_TIMEOUT_S")
+    INFERENCE_CONCURRENCY: int = Field(default=0, env="INFERENCE_CONCURRENCY")  # Frames en ejecución (0 = según backend)
+    # Plazo en la cola del planificador por clase (0 = sin plazo)
+    SCHEDULER_DEADLINE_INTERACTIVE_MS: float = Field(default=500.0, env="SCHEDULER_DEADLINE_INTERACTIVE_MS")
+    SCHEDULER_DEADLINE_UPLOAD_MS: float = Field(default=10000.0, env="SCHEDULER_DEADLINE_UPLOAD_MS")
+    SCHEDULER_DEADLINE_BATCH_MS: float = Field(default=0.0, env="SCHEDULER_DEADLINE_BATCH_MS")
+    SIDECAR_SOCKET: str = Field(default="/tmp/comsigns-inference.sock", env="SIDECAR_SOCKET")
+    SIDECAR_MAX_BATCH: int = Field(default=16, env="SIDECAR_MAX_BATCH")  # Frames por llamada al modelo
+    SIDECAR_MAX_WAIT_MS: float = Field(default=5.0, env="SIDECAR_MAX_WAIT_MS")  # Espera para completar un lote
+    
+    # Servidor pre-fork (python -m app.serve)
+    WEB_WORKERS: int = Field(default=1, env="WEB_WORKERS")  # 0 = uno por núcleo
+    WORKER_BOOT_TIMEOUT: float = Field(default=120.0, env="WORKER_BOOT_TIMEOUT")  # Hasta el primer heartbeat
+    WORKER_HEARTBEAT_TIMEOUT: float = Field(default=30.0, env="WORKER_HEARTBEAT_TIMEOUT")  # Event loop bloqueado
+    WORKER_GRACEFUL_TIMEOUT: float = Field(default=30.0, env="WORKER_GRACEFUL_TIMEOUT")  # Antes de SIGKILL
+    ML_INIT_ON_IMPORT: bool = Field(default=True, env="ML_INIT_ON_IMPORT")
+    
+    # Frames de una conexión WebSocket en vuelo a la vez (recepción, análisis y entrega en etapas)
+    WS_PIPELINE_DEPTH: int = Field(default=3, env="WS_PIPELINE_DEPTH")  # 1 = secuencial
+    
+    # Filtro de frames duplicados o sin movimiento (reutilizan el resultado anterior)
+    FRAME_GATE_ENABLED: bool = Field(default=True, env="FRAME_GATE_ENABLED")
+    FRAME_GATE_MOTION_THRESHOLD: float = Field(default=2.0, env="FRAME_GATE_MOTION_THRESHOLD")  # Diferencia media en grises (0-255)
+    FRAME_GATE_MAX_REUSE: int = Field(default=15, env="FRAME_GATE_MAX_REUSE")  # Frames seguidos antes de forzar un análisis
+    
+    # /ml/predict/batch: imágenes (multipart o zip) o landmarks (JSON) en una request
+    BATCH_MAX_ITEMS: int = Field(default=5000, env="BATCH_MAX_ITEMS")
+    BATCH_MAX_BYTES: int = Field(default=104857600, env="BATCH_MAX_BYTES")  # 100MB por request
+    BATCH_MAX_IN_FLIGHT: int = Field(default=32, env="BATCH_MAX_IN_FLIGHT")  # Imágenes en análisis por request
+    BATCH_PREDICT_SIZE: int = Field(default=64, env="BATCH_PREDICT_SIZE")  # Filas por pasada del modelo
+    BATCH_PREDICT_WAIT_MS: float = Field(default=10.0, env="BATCH_PREDICT_WAIT_MS")  # Espera para completar un lote
+    
+    # Decodificador de palabras deletreadas del WebSocket /ml/predict
+    WORD_DECODER_ENABLED: bool = Field(default=True, env="WORD_DECODER_ENABLED")
+    WORD_LEXICON_PATH: str = Field(default="/app/models/lexicon_es.txt", env="WORD_LEXICON_PATH")
+    WORD_BEAM_WIDTH: int = Field(default=8, env="WORD_BEAM_WIDTH")  # Hipótesis que se mantienen por letra
+    WORD_STABLE_FRAMES: int = Field(default=4, env="WORD_STABLE_FRAMES")  # Frames con la misma letra para aceptarla
+    WORD_GAP_FRAMES: int = Field(default=6, env="WORD_GAP_FRAMES")  # Frames sin mano que cierran la palabra
+    WORD_MIN_LETTER_PROB: float = Field(default=0.001, env="WORD_MIN_LETTER_PROB")  # Piso para letras que el modelo no predice
+    WORD_HYPOTHESES: int = Field(default=3, env="WORD_HYPOTHESES")  # Hipótesis por mensaje "word"
+    
+    # Letras con movimiento (J, Z): modelo temporal por conexión en el WebSocket
+    MOTION_ENABLED: bool = Field(default=True, env="MOTION_ENABLED")
+    MOTION_MODEL_PATH: str = Field(default="/app/models/motion_letters.npz", env="MOTION_MODEL_PATH")
+    MOTION_CLASSES: str = Field(default="J,Z,-", env="MOTION_CLASSES")  # Salidas de un modelo Keras ("-" = ninguna)
+    MOTION_MIN_FRAMES: int = Field(default=8, env="MOTION_MIN_FRAMES")  # Frames con mano antes de reportar
+    MOTION_CONFIDENCE_THRESHOLD: float = Field(default=0.7, env="MOTION_CONFIDENCE_THRESHOLD")
+    MOTION_BATCH_SIZE: int = Field(default=64, env="MOTION_BATCH_SIZE")  # Conexiones por paso del modelo
+    MOTION_BATCH_WAIT_MS: float = Field(default=2.0, env="MOTION_BATCH_WAIT_MS")
+    
+    # Dataset de landmarks de entrenamiento (índice k-NN y plantillas por letra)
+    DATASET_PATH: str = Field(default="/app/dataset/hand_data.npy", env="DATASET_PATH")
+    DATASET_LABELS_PATH: str = Field(default="/app/dataset/hand_labels.npy", env="DATASET_LABELS_PATH")
+    
+    # Segunda opinión k-NN cuando el modelo responde low_confidence
+    KNN_ENABLED: bool = Field(default=True, env="KNN_ENABLED")
+    KNN_K: int = Field(default=5, env="KNN_K")  # Vecinos que votan
+    KNN_PROTOTYPES_PER_CLASS: int = Field(default=0, env="KNN_PROTOTYPES_PER_CLASS")  # 0 = todas las muestras
+    KNN_BATCH_SIZE: int = Field(default=64, env="KNN_BATCH_SIZE")  # Consultas por lote
+    KNN_BATCH_WAIT_MS: float = Field(default=1.0, env="KNN_BATCH_WAIT_MS")
+    
+    # Plantillas por letra: corrección por dedo en el tutorial y la práctica
+    TEMPLATES_ENABLED: bool = Field(default=True, env="TEMPLATES_ENABLED")
+    TEMPLATE_TOLERANCE_QUANTILE: float = Field(default=0.98, env="TEMPLATE_TOLERANCE_QUANTILE")  # Desviación 1.0 = este cuantil del dataset
+    
+    # /ml/predict/video: clip de video analizado por segmentos de letras
+    VIDEO_MAX_BYTES: int = Field(default=209715200, env="VIDEO_MAX_BYTES")  # 200MB por clip
+    VIDEO_SAMPLE_FPS: float = Field(default=10.0, env="VIDEO_SAMPLE_FPS")  # Frames analizados por segundo de video (0 = todos)
+    VIDEO_MAX_IN_FLIGHT: int = Field(default=8, env="VIDEO_MAX_IN_FLIGHT")  # Frames decodificados en análisis por clip
+    VIDEO_MIN_SEGMENT_FRAMES: int = Field(default=3, env="VIDEO_MIN_SEGMENT_FRAMES")  # Frames seguidos para emitir una letra
+    
+    # Control de admisión de /ml/predict (límites por worker: con WEB_WORKERS=N el nodo admite N veces más)
+    MAX_INFERENCE_SESSIONS: int = Field(default=200, env="MAX_INFERENCE_SESSIONS")  # Sesiones WebSocket por worker (0 = sin límite)
+    MAX_SESSIONS_PER_IP: int = Field(default=4, env="MAX_SESSIONS_PER_IP")  # 0 = sin límite por IP
+    FRAME_RATE_PER_CONNECTION: float = Field(default=15.0, env="FRAME_RATE_PER_CONNECTION")  # Frames/s sostenidos (0 = sin límite)
+    FRAME_BURST_PER_CONNECTION: float = Field(default=30.0, env="FRAME_BURST_PER_CONNECTION")
+    FRAME_RATE_PER_IP: float = Field(default=30.0, env="FRAME_RATE_PER_IP")  # Compartido por las conexiones de la IP
+    FRAME_BURST_PER_IP: float = Field(default=60.0, env="FRAME_BURST_PER_IP")
+    ADMISSION_RETRY_AFTER_S: float = Field(default=5.0, env="ADMISSION_RETRY_AFTER_S")  # Sugerido al rechazar sesiones
+    
+    # Degradación de calidad según la carga (espera en la cola del planificador)
+    DEGRADE_ENABLED: bool = Field(default=True, env="DEGRADE_ENABLED")
+    DEGRADE_INTERVAL_S: float = Field(default=1.0, env="DEGRADE_INTERVAL_S")  # Cada cuánto se mide la carga
+    DEGRADE_WAIT_HIGH_MS: float = Field(default=150.0, env="DEGRADE_WAIT_HIGH_MS")  # p95 de espera para bajar calidad
+    DEGRADE_WAIT_LOW_MS: float = Field(default=30.0, env="DEGRADE_WAIT_LOW_MS")  # p95 de espera para recuperar
+    DEGRADE_QUEUE_HIGH: int = Field(default=8, env="DEGRADE_QUEUE_HIGH")  # Frames en cola para bajar calidad
+    DEGRADE_RECOVER_S: float = Field(default=10.0, env="DEGRADE_RECOVER_S")  # Carga baja sostenida por escalón
+    DEGRADE_MAX_SIDE: int = Field(default=320, env="DEGRADE_MAX_SIDE")  # Lado mayor en "reduced" y "minimal"
+    DEGRADE_MIN_FPS: float = Field(default=5.0, env="DEGRADE_MIN_FPS")  # Frames/s por sesión en "minimal"
+    
+    # Evaluación en sombra de modelos candidatos
+    SHADOW_SAMPLE_RATE: float = Field(default=0.1, env="SHADOW_SAMPLE_RATE")  # Fracción de frames evaluados
+    SHADOW_CPU_BUDGET: float = Field(default=0.25, env="SHADOW_CPU_BUDGET")  # Segundos de inferencia por segundo
+    SHADOW_QUEUE_SIZE: int = Field(default=64, env="SHADOW_QUEUE_SIZE")  # Muestras pendientes antes de descartar
+    
+    # Instrumentación de base de datos
+    DB_ROUND_TRIPS_WARN: int = Field(default=8, env="DB_ROUND_TRIPS_WARN")  # Round-trips por request antes de advertir
+    DB_REPEATED_QUERY_WARN: int = Field(default=3, env="DB_REPEATED_QUERY_WARN")  # Misma tabla+operación repetida (N+1)
+    
+    # Profiler
+    PROFILER_MAX_SECONDS: int = Field(default=60, env="PROFILER_MAX_SECONDS")
+    PROFILER_DEFAULT_INTERVAL_MS: float = Field(default=10.0, env="PROFILER_DEFAULT_INTERVAL_MS")
     
     # Development Settings
     DEBUG: bool = Field(default=False, env="DEBUG")
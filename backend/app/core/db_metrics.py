@@ -0,0 +1,214 @@
+"""
+Conteo y tiempo de round-trips a la base de datos por request
+
+Cada llamada a execute() sobre el cliente de Supabase (o el backend de
+almacenamiento activo) se registra en el QueryStats del contexto actual
+(request HTTP o mensaje WebSocket) y en los agregados globales.
+
+En tests se puede acotar el número de consultas de un flujo:
+
+    with track_queries() as stats:
+        await service.end_game_session(session_id, 80)
+    assert stats.count <= 6
+
+o, para endpoints HTTP, leer el header X-DB-Round-Trips de la respuesta.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import register_metrics
+
+logger = logging.getLogger(__name__)
+
+# Operaciones que definen el tipo de consulta en el query builder
+QUERY_OPERATIONS = frozenset({"select", "insert", "update", "upsert", "delete"})
+
+
+class QueryStats:
+    """
+    Round-trips realizados dentro de un request o mensaje
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.calls: Counter = Counter()
+
+    def record(self, table: str, operation: str, elapsed_ms: float) -> None:
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.calls[(table, operation)] += 1
+
+    def repeated(self, min_count: int) -> List[Tuple[str, str, int]]:
+        """
+        Consultas (tabla, operación) repetidas al menos min_count veces (sospecha de N+1)
+        """
+        return [
+            (table, operation, count)
+            for (table, operation), count in self.calls.most_common()
+            if count >= min_count
+        ]
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("db_query_stats", default=None)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """
+    Contar los round-trips realizados dentro del bloque
+    """
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+class DBMetrics:
+    """
+    Agregados globales de round-trips por tabla/operación y por endpoint
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total_round_trips = 0
+        self.total_ms = 0.0
+        self.by_query: Dict[Tuple[str, str], List[float]] = {}
+        self.by_endpoint: Dict[str, Dict[str, float]] = {}
+        self.n_plus_one_warnings = 0
+
+    def record_query(self, table: str, operation: str, elapsed_ms: float) -> None:
+        with self._lock:
+            self.total_round_trips += 1
+            self.total_ms += elapsed_ms
+            entry = self.by_query.setdefault((table, operation), [0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed_ms
+
+    def observe_request(self, endpoint: str, stats: QueryStats) -> bool:
+        """
+        Acumular los round-trips de un request y detectar patrones N+1
+        """
+        repeated = stats.repeated(settings.DB_REPEATED_QUERY_WARN)
+        n_plus_one = stats.count > settings.DB_ROUND_TRIPS_WARN or bool(repeated)
+        if n_plus_one:
+            logger.warning(
+                f"Posible N+1 en {endpoint}: {stats.count} round-trips, repetidas: {repeated}"
+            )
+
+        with self._lock:
+            entry = self.by_endpoint.setdefault(endpoint, {
+                "requests": 0, "round_trips": 0, "max_round_trips": 0, "db_time_ms": 0.0
+            })
+            entry["requests"] += 1
+            entry["round_trips"] += stats.count
+            entry["max_round_trips"] = max(entry["max_round_trips"], stats.count)
+            entry["db_time_ms"] += stats.total_ms
+            if n_plus_one:
+                self.n_plus_one_warnings += 1
+
+        return n_plus_one
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "total_round_trips": self.total_round_trips,
+                "total_db_time_ms": round(self.total_ms, 2),
+                "n_plus_one_warnings": self.n_plus_one_warnings,
+                "queries": {
+                    f"{table}.{operation}": {"count": count, "avg_ms": round(total / count, 3)}
+                    for (table, operation), (count, total) in self.by_query.items()
+                },
+                "endpoints": {
+                    endpoint: {
+                        "requests": e["requests"],
+                        "avg_round_trips": round(e["round_trips"] / e["requests"], 2),
+                        "max_round_trips": e["max_round_trips"],
+                        "avg_db_time_ms": round(e["db_time_ms"] / e["requests"], 2),
+                    }
+                    for endpoint, e in self.by_endpoint.items()
+                },
+            }
+
+
+db_metrics = DBMetrics()
+register_metrics("db", db_metrics.summary)
+
+
+def record_query(table: str, operation: str, elapsed_ms: float) -> None:
+    """
+    Registrar un round-trip en el contexto actual y en los agregados
+    """
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(table, operation, elapsed_ms)
+    db_metrics.record_query(table, operation, elapsed_ms)
+
+
+# ==============================================
+# 🔌 CLIENTE INSTRUMENTADO
+# ==============================================
+
+class TracedQuery:
+    """
+    Envuelve un query builder de postgrest y mide su execute()
+    """
+
+    __slots__ = ("_builder", "_table", "_operation")
+
+    def __init__(self, builder: Any, table: str, operation: Optional[str] = None):
+        self._builder = builder
+        self._table = table
+        self._operation = operation
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if hasattr(result, "execute"):
+                operation = self._operation or (name if name in QUERY_OPERATIONS else None)
+                return TracedQuery(result, self._table, operation)
+            return result
+
+        return call
+
+    def execute(self) -> Any:
+        start = time.perf_counter()
+        try:
+            return self._builder.execute()
+        finally:
+            record_query(self._table, self._operation or "query",
+                         (time.perf_counter() - start) * 1000)
+
+
+class TracedClient:
+    """
+    Envuelve el cliente de Supabase para contar cada round-trip
+    """
+
+    def __init__(self, client: Any):
+        self._client = client
+
+    def table(self, table_name: str) -> TracedQuery:
+        return TracedQuery(self._client.table(table_name), table_name)
+
+    def from_(self, table_name: str) -> TracedQuery:
+        return TracedQuery(self._client.from_(table_name), table_name)
+
+    def rpc(self, fn: str, params: Optional[Dict] = None) -> TracedQuery:
+        return TracedQuery(self._client.rpc(fn, params or {}), f"rpc:{fn}", "rpc")
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
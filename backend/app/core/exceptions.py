@@ -36,6 +36,13 @@ class ModelError(ComsignsException):
     pass
 
 
+class DeadlineExceededError(ModelError):
+    """
+    Trabajo de inferencia descartado porque venció su plazo en la cola
+    """
+    pass
+
+
 class ValidationError(ComsignsException):
     """
     Error de validación de datos
@@ -43,6 +50,20 @@ class ValidationError(ComsignsException):
     pass
 
 
+class PayloadTooLargeError(ValidationError):
+    """
+    Cuerpo o archivo mayor que el máximo permitido
+    """
+    pass
+
+
+class UnsupportedMediaError(ValidationError):
+    """
+    Contenido de un tipo que no se acepta (p. ej. un archivo que no es imagen)
+    """
+    pass
+
+
 class DatabaseError(ComsignsException):
     """
     Error de base de datos
@@ -0,0 +1,31 @@
+"""
+Registro central de métricas expuestas en /metrics
+"""
+
+import logging
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+_providers: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def register_metrics(name: str, provider: Callable[[], Dict[str, Any]]) -> None:
+    """
+    Registrar una función que devuelve el resumen de métricas de un componente
+    """
+    _providers[name] = provider
+
+
+def collect_metrics() -> Dict[str, Any]:
+    """
+    Recolectar las métricas de todos los componentes registrados
+    """
+    collected = {}
+    for name, provider in _providers.items():
+        try:
+            collected[name] = provider()
+        except Exception as e:
+            logger.error(f"Error recolectando métricas de {name}: {str(e)}")
+            collected[name] = {"error": str(e)}
+    return collected
@@ -9,6 +9,8 @@ from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 from loguru import logger
 
+from app.core.db_metrics import track_queries, db_metrics
+
 
 class LoggingMiddleware(BaseHTTPMiddleware):
     """
@@ -89,3 +91,27 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
         response.headers["Content-Security-Policy"] = "default-src 'self'"
         
         return response
+
+
+class DBRoundTripMiddleware(BaseHTTPMiddleware):
+    """
+    Middleware que cuenta los round-trips a la base de datos por request
+
+    Agrega los headers X-DB-Round-Trips y X-DB-Time-Ms, acumula métricas por
+    endpoint y advierte cuando un request parece tener un patrón N+1.
+    """
+    
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        with track_queries() as stats:
+            response = await call_next(request)
+        
+        # Usar la plantilla de la ruta para no mezclar IDs en las métricas
+        route = request.scope.get("route")
+        endpoint = f"{request.method} {getattr(route, 'path', request.url.path)}"
+        
+        db_metrics.observe_request(endpoint, stats)
+        
+        response.headers["X-DB-Round-Trips"] = str(stats.count)
+        response.headers["X-DB-Time-Ms"] = f"{stats.total_ms:.2f}"
+        
+        return response
@@ -0,0 +1,144 @@
+"""
+Profiler estadístico en proceso basado en muestreo de stacks
+
+Toma muestras periódicas de todos los hilos con sys._current_frames()
+y agrega los stacks en formato "collapsed" (compatible con flamegraph.pl,
+speedscope e inferno). No instala hooks de tracing: mientras no hay un
+perfilado en curso no existe ningún hilo ni costo adicional.
+"""
+
+import concurrent.futures.thread
+import os
+import queue
+import selectors
+import socket
+import ssl
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+
+# Funciones hoja (módulo, nombre) en las que un hilo está bloqueado esperando (sin
+# consumir CPU): la espera en sí es código C, así que la hoja es la función de la
+# biblioteca estándar que la llama. Se compara también el archivo para no contar
+# como idle una función de la aplicación que se llame igual (p. ej. ModelRegistry.get)
+IDLE_LEAF_FUNCTIONS = {
+    threading: ("wait", "_wait_for_tstate_lock"),
+    queue: ("get",),
+    selectors: ("select",),
+    socket: ("accept", "readinto"),
+    ssl: ("read", "recv", "recv_into"),
+    concurrent.futures.thread: ("_worker",),
+}
+_IDLE_LEAVES = frozenset(
+    (module.__file__, name) for module, names in IDLE_LEAF_FUNCTIONS.items() for name in names
+)
+
+
+class ProfilerBusyError(RuntimeError):
+    """
+    Ya hay un perfilado en curso en este proceso
+    """
+    pass
+
+
+class SamplingProfiler:
+    """
+    Profiler de muestreo sobre todos los hilos del proceso
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def is_running(self) -> bool:
+        return self._lock.locked()
+
+    def profile(self, duration_s: float, interval_s: float,
+                include_idle: bool = False) -> Dict[str, object]:
+        """
+        Muestrear todos los hilos durante duration_s segundos.
+
+        Bloquea el hilo que lo invoca (debe ejecutarse fuera del event loop).
+        Solo se permite un perfilado simultáneo por proceso.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("Ya hay un perfilado en curso")
+
+        try:
+            return self._sample(duration_s, interval_s, include_idle)
+        finally:
+            self._lock.release()
+
+    def _sample(self, duration_s: float, interval_s: float,
+                include_idle: bool) -> Dict[str, object]:
+        own_ident = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        idle_samples = 0
+        started = time.perf_counter()
+        deadline = started + duration_s
+        cpu_start = time.process_time()
+
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+
+            thread_names = {t.ident: t.name for t in threading.enumerate()}
+            frames = sys._current_frames()
+            frame = None
+            try:
+                for ident, frame in frames.items():
+                    if ident == own_ident:
+                        continue
+
+                    if not include_idle and (frame.f_code.co_filename, frame.f_code.co_name) in _IDLE_LEAVES:
+                        idle_samples += 1
+                        continue
+
+                    stacks[self._collapse(frame, thread_names.get(ident, f"thread-{ident}"))] += 1
+                    samples += 1
+            finally:
+                # No retener frames de otros hilos entre muestras
+                del frames, frame
+
+            # Dormir libera el GIL para que los hilos muestreados avancen
+            time.sleep(max(0.0, min(interval_s, deadline - time.perf_counter())))
+
+        return {
+            "stacks": stacks,
+            "samples": samples,
+            "idle_samples": idle_samples,
+            "duration_s": round(time.perf_counter() - started, 3),
+            "interval_ms": interval_s * 1000,
+            "process_cpu_s": round(time.process_time() - cpu_start, 3),
+        }
+
+    @staticmethod
+    def _collapse(frame, thread_name: str) -> str:
+        """
+        Convertir un frame en una línea de stack colapsado (raíz primero)
+        """
+        parts = []
+        current: Optional[object] = frame
+        while current is not None:
+            code = current.f_code
+            parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{current.f_lineno})")
+            current = current.f_back
+        parts.append(thread_name)
+        parts.reverse()
+        # ';' es el separador de frames del formato collapsed
+        return ";".join(part.replace(";", ":") for part in parts)
+
+    @staticmethod
+    def to_collapsed(stacks: Counter) -> str:
+        """
+        Serializar stacks en formato collapsed: "frame;frame;frame count"
+        """
+        return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+
+# Instancia global del profiler
+sampling_profiler = SamplingProfiler()
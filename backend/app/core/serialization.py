@@ -0,0 +1,43 @@
+"""
+Serialización JSON con orjson para WebSocket y respuestas HTTP
+
+Un solo lugar para codificar y decodificar JSON en el camino crítico:
+los mensajes del WebSocket de predicción, la respuesta por defecto de
+FastAPI (ORJSONResponse) y los mensajes del sidecar de inferencia.
+orjson acepta escalares y arreglos de numpy, así que los resultados del
+modelo no necesitan convertirse a float/list antes de enviarse.
+"""
+
+from typing import Any, Union
+
+import orjson
+from fastapi.responses import ORJSONResponse
+
+# Mismas opciones que ORJSONResponse: claves no str y tipos de numpy
+DUMPS_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+# Subclase de json.JSONDecodeError: los except existentes siguen funcionando
+JSONDecodeError = orjson.JSONDecodeError
+
+__all__ = ["DUMPS_OPTIONS", "JSONDecodeError", "ORJSONResponse", "dumps", "dumps_text", "loads"]
+
+
+def dumps(data: Any) -> bytes:
+    """
+    Codificar a JSON en bytes UTF-8
+    """
+    return orjson.dumps(data, option=DUMPS_OPTIONS)
+
+
+def dumps_text(data: Any) -> str:
+    """
+    Codificar a JSON como str (frames de texto del WebSocket)
+    """
+    return orjson.dumps(data, option=DUMPS_OPTIONS).decode()
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """
+    Decodificar JSON; lanza JSONDecodeError si no es válido
+    """
+    return orjson.loads(data)
@@ -0,0 +1,487 @@
+"""
+Backend de almacenamiento local sobre SQLite
+
+Implementa el subconjunto del query builder de Supabase/postgrest que usa
+SupabaseService (table().select/insert/update/upsert/delete, filtros,
+order, limit, recursos embebidos como "achievements(*)" y execute()), de
+modo que toda la lógica de SupabaseService funciona sin cambios contra un
+archivo SQLite local.
+
+La base usa WAL y agrupa las escrituras en transacciones: cada escritura
+se aplica de inmediato (las lecturas posteriores la ven) pero el commit
+se hace cada SQLITE_BATCH_SIZE escrituras o SQLITE_BATCH_INTERVAL_MS.
+"""
+
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Esquema equivalente a supabase_schema_simple.sql (sin RLS ni triggers)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS auth_users (
+    id TEXT PRIMARY KEY,
+    email TEXT,
+    email_confirmed_at TEXT,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+    updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS letters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    letter TEXT UNIQUE NOT NULL,
+    description TEXT
+);
+
+CREATE TABLE IF NOT EXISTS achievements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    description TEXT,
+    icon TEXT,
+    points_required INTEGER DEFAULT 0,
+    type TEXT
+);
+
+CREATE TABLE IF NOT EXISTS user_profiles (
+    id TEXT PRIMARY KEY,
+    username TEXT UNIQUE,
+    full_name TEXT,
+    experience_level TEXT DEFAULT 'beginner',
+    avatar_url TEXT,
+    total_points INTEGER DEFAULT 0,
+    current_level INTEGER DEFAULT 1,
+    games_played INTEGER DEFAULT 0,
+    accuracy_percentage REAL DEFAULT 0.0,
+    longest_streak INTEGER DEFAULT 0,
+    current_streak INTEGER DEFAULT 0,
+    is_active INTEGER DEFAULT 1,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+    updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS game_sessions (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    level INTEGER DEFAULT 1,
+    total_score INTEGER DEFAULT 0,
+    words_completed INTEGER DEFAULT 0,
+    total_words INTEGER DEFAULT 10,
+    lives_remaining INTEGER DEFAULT 5,
+    status TEXT DEFAULT 'active',
+    started_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+    completed_at TEXT,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+    updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS game_attempts (
+    id TEXT PRIMARY KEY,
+    game_session_id TEXT NOT NULL REFERENCES game_sessions(id) ON DELETE CASCADE,
+    user_id TEXT NOT NULL,
+    target_word TEXT NOT NULL,
+    predicted_word TEXT,
+    word_index INTEGER NOT NULL,
+    predicted_letters TEXT,
+    is_correct INTEGER NOT NULL,
+    time_taken_seconds REAL NOT NULL,
+    points_earned INTEGER DEFAULT 0,
+    confidence_score REAL,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS ml_predictions (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    game_session_id TEXT REFERENCES game_sessions(id) ON DELETE CASCADE,
+    target_letter TEXT NOT NULL,
+    predicted_letter TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    is_correct INTEGER NOT NULL,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS user_achievements (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    achievement_id INTEGER NOT NULL REFERENCES achievements(id) ON DELETE CASCADE,
+    earned_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+    UNIQUE(user_id, achievement_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_profiles_points ON user_profiles(total_points DESC);
+CREATE INDEX IF NOT EXISTS idx_game_sessions_user ON game_sessions(user_id, status);
+CREATE INDEX IF NOT EXISTS idx_game_attempts_session ON game_attempts(game_session_id);
+CREATE INDEX IF NOT EXISTS idx_ml_predictions_session ON ml_predictions(game_session_id);
+CREATE INDEX IF NOT EXISTS idx_user_achievements_user ON user_achievements(user_id);
+"""
+
+# Datos iniciales (mismos que supabase_schema_simple.sql)
+SEED_LETTERS = "ABCDEFGHIKLMNOPQRSTUVWXY"
+SEED_ACHIEVEMENTS = [
+    ("Primera Letra", "Reconoce tu primera letra correctamente", "🎯", 0, "first"),
+    ("Racha de 5", "Consigue 5 aciertos seguidos", "🔥", 0, "streak"),
+    ("100 Puntos", "Alcanza 100 puntos", "💯", 100, "points"),
+    ("Velocista", "Completa una palabra en menos de 3 segundos", "⚡", 0, "speed"),
+    ("Dedicado", "Juega 5 días seguidos", "📅", 0, "daily"),
+]
+
+# Tablas con UUID generado en la aplicación (gen_random_uuid() en Postgres)
+UUID_TABLES = frozenset({"game_sessions", "game_attempts", "ml_predictions", "user_achievements"})
+
+# Columnas que se convierten al leer/escribir
+BOOLEAN_COLUMNS = frozenset({"is_active", "is_correct"})
+JSON_COLUMNS = frozenset({"predicted_letters"})
+
+# Relaciones para recursos embebidos: (tabla, recurso) -> (columna local, columna remota)
+FOREIGN_KEYS = {
+    ("user_achievements", "achievements"): ("achievement_id", "id"),
+    ("game_attempts", "game_sessions"): ("game_session_id", "id"),
+    ("ml_predictions", "game_sessions"): ("game_session_id", "id"),
+}
+
+# Los nombres con esquema de Supabase se mapean a tablas planas
+TABLE_ALIASES = {"auth.users": "auth_users"}
+
+
+class SQLiteResponse:
+    """
+    Respuesta compatible con APIResponse de postgrest
+    """
+
+    def __init__(self, data: List[Dict[str, Any]]):
+        self.data = data
+        self.count = len(data)
+
+
+class SQLiteQuery:
+    """
+    Query builder encadenable al estilo postgrest sobre SQLite
+    """
+
+    def __init__(self, storage: "SQLiteStorage", table: str):
+        self._storage = storage
+        self._table = TABLE_ALIASES.get(table, table)
+        self._operation = "select"
+        self._columns = "*"
+        self._payload: Union[Dict, List[Dict], None] = None
+        self._filters: List[Tuple[str, str, Any]] = []
+        self._order: List[Tuple[str, bool]] = []
+        self._limit: Optional[int] = None
+
+    # Operaciones
+    def select(self, columns: str = "*", **kwargs) -> "SQLiteQuery":
+        self._operation = "select"
+        self._columns = columns
+        return self
+
+    def insert(self, payload: Union[Dict, List[Dict]], **kwargs) -> "SQLiteQuery":
+        self._operation = "insert"
+        self._payload = payload
+        return self
+
+    def upsert(self, payload: Union[Dict, List[Dict]], **kwargs) -> "SQLiteQuery":
+        self._operation = "upsert"
+        self._payload = payload
+        return self
+
+    def update(self, payload: Dict, **kwargs) -> "SQLiteQuery":
+        self._operation = "update"
+        self._payload = payload
+        return self
+
+    def delete(self, **kwargs) -> "SQLiteQuery":
+        self._operation = "delete"
+        return self
+
+    # Filtros y modificadores
+    def _filter(self, column: str, operator: str, value: Any) -> "SQLiteQuery":
+        self._filters.append((column, operator, value))
+        return self
+
+    def eq(self, column: str, value: Any) -> "SQLiteQuery":
+        return self._filter(column, "=", value)
+
+    def neq(self, column: str, value: Any) -> "SQLiteQuery":
+        return self._filter(column, "!=", value)
+
+    def gt(self, column: str, value: Any) -> "SQLiteQuery":
+        return self._filter(column, ">", value)
+
+    def gte(self, column: str, value: Any) -> "SQLiteQuery":
+        return self._filter(column, ">=", value)
+
+    def lt(self, column: str, value: Any) -> "SQLiteQuery":
+        return self._filter(column, "<", value)
+
+    def lte(self, column: str, value: Any) -> "SQLiteQuery":
+        return self._filter(column, "<=", value)
+
+    def in_(self, column: str, values: List[Any]) -> "SQLiteQuery":
+        return self._filter(column, "IN", list(values))
+
+    def order(self, column: str, desc: bool = False, **kwargs) -> "SQLiteQuery":
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size: int, **kwargs) -> "SQLiteQuery":
+        self._limit = size
+        return self
+
+    def execute(self) -> SQLiteResponse:
+        return self._storage.execute(self)
+
+
+class SQLiteStorage:
+    """
+    Cliente de almacenamiento SQLite con la interfaz table() de Supabase
+    """
+
+    def __init__(self, path: str, batch_size: int = 50, batch_interval_ms: float = 200):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_interval_s = batch_interval_ms / 1000
+        self._lock = threading.RLock()
+        self._pending_writes = 0
+        self._first_pending_at = 0.0
+        self._columns: Dict[str, List[str]] = {}
+
+        # isolation_level=None: las transacciones se controlan explícitamente
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        self._seed()
+        self._load_columns()
+
+        # Commit periódico de escrituras pendientes aunque no lleguen más
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="sqlite-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+        logger.info(f"Almacenamiento SQLite inicializado en {path} (WAL, lotes de {batch_size})")
+
+    def _seed(self):
+        with self._lock:
+            if not self._conn.execute("SELECT 1 FROM letters LIMIT 1").fetchone():
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO letters (letter, description) VALUES (?, ?)",
+                    [(letter, f"Letra {letter}") for letter in SEED_LETTERS]
+                )
+            if not self._conn.execute("SELECT 1 FROM achievements LIMIT 1").fetchone():
+                self._conn.executemany(
+                    "INSERT INTO achievements (name, description, icon, points_required, type) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    SEED_ACHIEVEMENTS
+                )
+
+    def _load_columns(self):
+        tables = [row[0] for row in self._conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+        )]
+        for table in tables:
+            self._columns[table] = [row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")]
+
+    def table(self, table_name: str) -> SQLiteQuery:
+        return SQLiteQuery(self, table_name)
+
+    def from_(self, table_name: str) -> SQLiteQuery:
+        return self.table(table_name)
+
+    # ==============================================
+    # 🔁 TRANSACCIONES POR LOTES
+    # ==============================================
+
+    def _begin_write(self):
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN")
+            self._first_pending_at = time.monotonic()
+
+    def _end_write(self, rows: int):
+        self._pending_writes += max(rows, 1)
+        if (self._pending_writes >= self.batch_size
+                or time.monotonic() - self._first_pending_at >= self.batch_interval_s):
+            self._commit()
+
+    def _commit(self):
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+        self._pending_writes = 0
+
+    def flush(self):
+        """
+        Confirmar inmediatamente las escrituras pendientes
+        """
+        with self._lock:
+            self._commit()
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.batch_interval_s):
+            with self._lock:
+                if self._pending_writes and \
+                        time.monotonic() - self._first_pending_at >= self.batch_interval_s:
+                    self._commit()
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        with self._lock:
+            self._commit()
+            self._conn.close()
+
+    # ==============================================
+    # ⚙️ EJECUCIÓN
+    # ==============================================
+
+    def execute(self, query: SQLiteQuery) -> SQLiteResponse:
+        columns = self._columns.get(query._table)
+        if columns is None:
+            raise sqlite3.OperationalError(f"Tabla desconocida: {query._table}")
+
+        with self._lock:
+            if query._operation == "select":
+                return SQLiteResponse(self._select(query, columns))
+
+            self._begin_write()
+            try:
+                if query._operation in ("insert", "upsert"):
+                    data = self._insert(query, columns, upsert=query._operation == "upsert")
+                elif query._operation == "update":
+                    data = self._update(query, columns)
+                else:
+                    data = self._delete(query)
+            except Exception:
+                # Un error no debe perder las escrituras válidas del lote
+                self._commit()
+                raise
+            self._end_write(len(data))
+            return SQLiteResponse(data)
+
+    def _where(self, filters: List[Tuple[str, str, Any]]) -> Tuple[str, List[Any]]:
+        if not filters:
+            return "", []
+        clauses, params = [], []
+        for column, operator, value in filters:
+            if operator == "IN":
+                clauses.append(f'"{column}" IN ({", ".join("?" for _ in value)})')
+                params.extend(self._to_db(column, v) for v in value)
+            else:
+                clauses.append(f'"{column}" {operator} ?')
+                params.append(self._to_db(column, value))
+        return " WHERE " + " AND ".join(clauses), params
+
+    def _select(self, query: SQLiteQuery, columns: List[str]) -> List[Dict[str, Any]]:
+        plain, embedded = self._parse_columns(query._columns)
+        selected = "*" if "*" in plain or not plain else ", ".join(f'"{c}"' for c in plain)
+
+        where, params = self._where(query._filters)
+        sql = f'SELECT {selected} FROM "{query._table}"{where}'
+        if query._order:
+            sql += " ORDER BY " + ", ".join(f'"{c}" {"DESC" if d else "ASC"}' for c, d in query._order)
+        if query._limit is not None:
+            sql += f" LIMIT {int(query._limit)}"
+
+        rows = [self._from_db(row) for row in self._conn.execute(sql, params)]
+
+        for resource in embedded:
+            local, remote = FOREIGN_KEYS[(query._table, resource)]
+            for row in rows:
+                related = self._conn.execute(
+                    f'SELECT * FROM "{resource}" WHERE "{remote}" = ?', (row.get(local),)
+                ).fetchone()
+                row[resource] = self._from_db(related) if related else None
+
+        return rows
+
+    def _insert(self, query: SQLiteQuery, columns: List[str], upsert: bool) -> List[Dict[str, Any]]:
+        payloads = query._payload if isinstance(query._payload, list) else [query._payload]
+        inserted = []
+        for payload in payloads:
+            row = dict(payload)
+            if query._table in UUID_TABLES and not row.get("id"):
+                row["id"] = str(uuid.uuid4())
+
+            names = ", ".join(f'"{c}"' for c in row)
+            placeholders = ", ".join("?" for _ in row)
+            sql = f'INSERT INTO "{query._table}" ({names}) VALUES ({placeholders})'
+            if upsert:
+                updates = ", ".join(f'"{c}" = excluded."{c}"' for c in row if c != "id")
+                sql += f' ON CONFLICT("id") DO UPDATE SET {updates}' if updates else ' ON CONFLICT("id") DO NOTHING'
+            sql += " RETURNING *"
+
+            returned = self._conn.execute(sql, [self._to_db(c, v) for c, v in row.items()]).fetchone()
+            if returned:
+                inserted.append(self._from_db(returned))
+        return inserted
+
+    def _update(self, query: SQLiteQuery, columns: List[str]) -> List[Dict[str, Any]]:
+        updates = dict(query._payload)
+        # Equivalente al trigger update_updated_at_column
+        if "updated_at" in columns:
+            updates.setdefault("updated_at", datetime.now().isoformat())
+        if not updates:
+            return []
+
+        assignments = ", ".join(f'"{c}" = ?' for c in updates)
+        where, params = self._where(query._filters)
+        sql = f'UPDATE "{query._table}" SET {assignments}{where} RETURNING *'
+        values = [self._to_db(c, v) for c, v in updates.items()] + params
+        return [self._from_db(row) for row in self._conn.execute(sql, values).fetchall()]
+
+    def _delete(self, query: SQLiteQuery) -> List[Dict[str, Any]]:
+        where, params = self._where(query._filters)
+        sql = f'DELETE FROM "{query._table}"{where} RETURNING *'
+        return [self._from_db(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    # ==============================================
+    # 🔄 CONVERSIONES
+    # ==============================================
+
+    @staticmethod
+    def _parse_columns(columns: str) -> Tuple[List[str], List[str]]:
+        """
+        Separar columnas simples de recursos embebidos ("*, achievements(*)")
+        """
+        plain, embedded = [], []
+        for token in columns.replace("\n", " ").split(","):
+            token = token.strip()
+            if not token:
+                continue
+            if "(" in token:
+                embedded.append(token.split("(", 1)[0].strip())
+            else:
+                plain.append(token)
+        return plain, embedded
+
+    @staticmethod
+    def _to_db(column: str, value: Any) -> Any:
+        if column in JSON_COLUMNS and value is not None:
+            return json.dumps(value)
+        if isinstance(value, bool):
+            return int(value)
+        return value
+
+    @staticmethod
+    def _from_db(row: sqlite3.Row) -> Dict[str, Any]:
+        data = dict(row)
+        for column in BOOLEAN_COLUMNS.intersection(data):
+            if data[column] is not None:
+                data[column] = bool(data[column])
+        for column in JSON_COLUMNS.intersection(data):
+            if data[column] is not None:
+                data[column] = json.loads(data[column])
+        return data
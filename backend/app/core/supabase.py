@@ -9,11 +9,15 @@ from typing import Dict, List, Optional, Any
 from datetime import datetime
 from supabase import create_client, Client
 
+from app.core.db_metrics import TracedClient
+
 logger = logging.getLogger(__name__)
 
 class SupabaseService:
-    def __init__(self, url: str, key: str):
-        self.supabase: Client = create_client(url, key)
+    def __init__(self, url: str = None, key: str = None, client: Any = None):
+        # client permite usar otro backend con la misma interfaz table() (p. ej. SQLite)
+        # Cliente instrumentado: cada execute() cuenta como un round-trip
+        self.supabase: Client = TracedClient(client or create_client(url, key))
         self._connected = False
         self._test_connection()
 
@@ -819,8 +823,16 @@ def get_supabase_service() -> SupabaseService:
         # Obtener credenciales desde config
         from .config import get_settings
         settings = get_settings()
-        supabase_service = SupabaseService(
-            url=settings.SUPABASE_URL,
-            key=settings.SUPABASE_ANON_KEY
-        )
+        if settings.STORAGE_BACKEND == "sqlite":
+            from .sqlite_storage import SQLiteStorage
+            supabase_service = SupabaseService(client=SQLiteStorage(
+                settings.SQLITE_PATH,
+                batch_size=settings.SQLITE_BATCH_SIZE,
+                batch_interval_ms=settings.SQLITE_BATCH_INTERVAL_MS
+            ))
+        else:
+            supabase_service = SupabaseService(
+                url=settings.SUPABASE_URL,
+                key=settings.SUPABASE_ANON_KEY
+            )
     return supabase_service
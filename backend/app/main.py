@@ -8,7 +8,9 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 
 from app.core.config import settings
-from app.core.middleware import LoggingMiddleware
+from app.core.middleware import LoggingMiddleware, DBRoundTripMiddleware
+from app.core.metrics import collect_metrics
+from app.core.serialization import ORJSONResponse
 from app.api.v1.api import api_router
 
 # Crear aplicación FastAPI
@@ -19,6 +21,7 @@ app = FastAPI(
     openapi_url=None if settings.ENVIRONMENT == "production" else f"{settings.API_V1_STR}/openapi.json",
     docs_url=None if settings.ENVIRONMENT == "production" else "/docs",
     redoc_url=None if settings.ENVIRONMENT == "production" else "/redoc",
+    default_response_class=ORJSONResponse,
 )
 
 # Configurar contenedor de dependencias
@@ -40,6 +43,7 @@ app.add_middleware(
 )
 
 # Middleware personalizado
+app.add_middleware(DBRoundTripMiddleware)
 app.add_middleware(LoggingMiddleware)
 
 # Incluir routers
@@ -70,22 +74,42 @@ async def health_check():
         "version": settings.VERSION
     }
 
+@app.on_event("startup")
+async def start_inference_backend():
+    """
+    Iniciar el backend de inferencia configurado (INFERENCE_BACKEND)
+    """
+    from app.modules.ml.services import ml_service
+    from app.modules.ml.knn import knn_service
+    from app.modules.ml.motion import motion_recognizer
+    from app.modules.ml.templates import load_templates
+    from app.modules.ml.words import load_lexicon
+    await ml_service.start_inference_backend()
+    # Léxico, modelo de movimiento, índice k-NN y plantillas: una vez por proceso, antes de la primera conexión
+    if settings.WORD_DECODER_ENABLED:
+        load_lexicon()
+    if settings.MOTION_ENABLED:
+        motion_recognizer.load()
+    if settings.KNN_ENABLED:
+        knn_service.load(ml_service.letters)
+    if settings.TEMPLATES_ENABLED:
+        load_templates(ml_service.letters)
+
+@app.on_event("shutdown")
+async def stop_inference_backend():
+    from app.modules.ml.knn import knn_service
+    from app.modules.ml.motion import motion_recognizer
+    from app.modules.ml.services import ml_service
+    await knn_service.stop()
+    await motion_recognizer.stop()
+    await ml_service.stop_inference_backend()
+
 @app.get("/metrics")
 async def get_metrics():
     """
     Endpoint para métricas de performance
     """
-    # Obtener middleware de performance
-    performance_middleware = None
-    for middleware in app.user_middleware:
-        if isinstance(middleware.cls, type) and issubclass(middleware.cls):
-            performance_middleware = middleware.cls
-            break
-    
-    if performance_middleware and hasattr(performance_middleware, 'get_metrics_summary'):
-        return performance_middleware.get_metrics_summary()
-    
-    return {"message": "Performance metrics not available"}
+    return collect_metrics()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,3 @@
+"""
+Admin module for COMSIGNS
+"""
@@ -0,0 +1,172 @@
+"""
+Rutas administrativas (diagnóstico y operación)
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+
+from app.core.auth import require_admin
+from app.core.config import settings
+from app.core.exceptions import ModelError, ValidationError
+from app.core.profiler import sampling_profiler, ProfilerBusyError
+from app.modules.ml.registry import model_registry
+from app.modules.ml.services import ml_service
+from app.modules.ml.shadow import shadow_evaluator
+from app.modules.ml.schemas import MLModelCreate, MLModelResponse, ModelRegistryResponse
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/profile")
+async def profile_process(
+    seconds: float = Query(default=10.0, gt=0),
+    interval_ms: Optional[float] = Query(default=None, gt=0),
+    include_idle: bool = False,
+    output_format: str = Query(default="collapsed", alias="format", pattern="^(collapsed|json)$"),
+):
+    """
+    Perfilar todos los hilos del worker durante N segundos.
+
+    Devuelve stacks colapsados (flamegraph.pl / speedscope) o un JSON
+    con los stacks más frecuentes. El muestreo corre en un hilo del
+    threadpool, por lo que el event loop sigue atendiendo tráfico.
+    """
+    if seconds > settings.PROFILER_MAX_SECONDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"La duración máxima es {settings.PROFILER_MAX_SECONDS} segundos"
+        )
+
+    interval_s = (interval_ms or settings.PROFILER_DEFAULT_INTERVAL_MS) / 1000
+
+    try:
+        result = await run_in_threadpool(
+            sampling_profiler.profile, seconds, interval_s, include_idle
+        )
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    headers = {
+        "X-Profile-Samples": str(result["samples"]),
+        "X-Profile-Duration": str(result["duration_s"]),
+    }
+
+    if output_format == "json":
+        return {
+            "samples": result["samples"],
+            "idle_samples": result["idle_samples"],
+            "duration_s": result["duration_s"],
+            "interval_ms": result["interval_ms"],
+            "process_cpu_s": result["process_cpu_s"],
+            "top_stacks": [
+                {"stack": stack.split(";"), "count": count}
+                for stack, count in result["stacks"].most_common(50)
+            ],
+        }
+
+    return PlainTextResponse(
+        sampling_profiler.to_collapsed(result["stacks"]),
+        headers=headers
+    )
+
+
+def _registry_response() -> ModelRegistryResponse:
+    summary = model_registry.summary()
+    return ModelRegistryResponse(
+        active_version=summary["active_version"],
+        models=[MLModelResponse(**model) for model in model_registry.list_versions()],
+        stats=summary["versions"]
+    )
+
+
+@router.get("/models", response_model=ModelRegistryResponse)
+async def list_models():
+    """
+    Versiones cargadas del modelo con sus contadores de latencia y precisión
+    """
+    return _registry_response()
+
+
+@router.post("/models", response_model=MLModelResponse)
+async def load_model_version(model: MLModelCreate, activate: bool = True):
+    """
+    Cargar una versión nueva del modelo sin reiniciar el worker.
+
+    La carga y el warm-up corren en el threadpool; las conexiones
+    WebSocket siguen atendidas con la versión activa hasta el swap.
+    """
+    try:
+        version = await run_in_threadpool(model_registry.load, model, activate)
+    except ValidationError as e:
+        raise HTTPException(status_code=409, detail=e.message)
+    except ModelError as e:
+        raise HTTPException(status_code=422, detail=e.message)
+
+    return MLModelResponse(**version.to_dict(model_registry.active is version))
+
+
+@router.get("/models/shadow")
+async def get_shadow_report():
+    """
+    Resultado de la evaluación en sombra en curso
+    """
+    return shadow_evaluator.summary()
+
+
+@router.post("/models/{version}/shadow")
+async def start_shadow_evaluation(
+    version: str,
+    sample_rate: Optional[float] = Query(default=None, gt=0, le=1),
+):
+    """
+    Evaluar en sombra una versión cargada (no activa) sobre el tráfico real.
+
+    La candidata corre en un hilo aparte, dentro de SHADOW_CPU_BUDGET,
+    y nunca retrasa la respuesta del modelo activo.
+    """
+    try:
+        candidate = model_registry.get(version)
+    except ValidationError as e:
+        raise HTTPException(status_code=404, detail=e.message)
+    if candidate is model_registry.active:
+        raise HTTPException(status_code=409, detail="La versión activa no se puede evaluar en sombra")
+
+    shadow_evaluator.start(candidate, ml_service.letters, sample_rate or settings.SHADOW_SAMPLE_RATE)
+    return shadow_evaluator.summary()
+
+
+@router.delete("/models/shadow")
+async def stop_shadow_evaluation():
+    """
+    Detener la evaluación en sombra
+    """
+    report = shadow_evaluator.summary()
+    shadow_evaluator.stop()
+    return report
+
+
+@router.post("/models/{version}/activate", response_model=ModelRegistryResponse)
+async def activate_model_version(version: str):
+    """
+    Activar una versión ya cargada
+    """
+    try:
+        model_registry.activate(version)
+    except ValidationError as e:
+        raise HTTPException(status_code=404, detail=e.message)
+    return _registry_response()
+
+
+@router.post("/models/rollback", response_model=ModelRegistryResponse)
+async def rollback_model():
+    """
+    Volver a la versión del modelo activada anteriormente
+    """
+    try:
+        model_registry.rollback()
+    except ValidationError as e:
+        raise HTTPException(status_code=409, detail=e.message)
+    return _registry_response()
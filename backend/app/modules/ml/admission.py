@@ -0,0 +1,208 @@
+"""
+Control de admisión y limitación de frames para /ml/predict
+
+Limita las sesiones de inferencia concurrentes del proceso y por IP, y el
+ritmo de frames con token buckets por conexión y por IP. Cuando un límite
+se alcanza el cliente recibe un mensaje "busy" con el tiempo sugerido de
+reintento en lugar de encolar trabajo que saturaría la inferencia.
+
+Los contadores viven en el proceso: con app.serve y N workers cada worker
+aplica sus propios límites, así que en el nodo valen hasta N veces los
+configurados (p. ej. MAX_INFERENCE_SESSIONS = 200 / N para 200 por nodo).
+No se comparten entre workers a propósito: un worker terminado con
+SIGKILL dejaría sus sesiones contadas en la memoria compartida.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import register_metrics
+
+# Estados por IP sin sesiones que se conservan antes de podar
+MAX_IDLE_IPS = 1024
+
+
+class TokenBucket:
+    """
+    Token bucket clásico: rate tokens por segundo, hasta burst acumulados
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> float:
+        """
+        Consumir un token; devuelve 0 si se pudo o los segundos hasta el próximo token
+        """
+        if self.rate <= 0:
+            return 0.0  # Sin límite
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def refund(self) -> None:
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    def is_full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.burst
+
+
+class _IPState:
+    def __init__(self):
+        self.sessions = 0
+        self.bucket = TokenBucket(settings.FRAME_RATE_PER_IP, settings.FRAME_BURST_PER_IP)
+
+
+class AdmissionTicket:
+    """
+    Sesión admitida: limita el ritmo de frames de una conexión
+    """
+
+    def __init__(self, controller: "AdmissionController", ip: str):
+        self.controller = controller
+        self.ip = ip
+        self.bucket = TokenBucket(settings.FRAME_RATE_PER_CONNECTION, settings.FRAME_BURST_PER_CONNECTION)
+        self._notified_until = 0.0
+        self._released = False
+
+    def check_frame(self) -> float:
+        """
+        0 si el frame puede procesarse; si no, segundos sugeridos de espera
+        """
+        return self.controller.check_frame(self)
+
+    def should_notify(self, retry_after_s: float) -> bool:
+        """
+        Enviar un solo aviso "busy" por ventana de espera, no uno por frame descartado
+        """
+        now = time.monotonic()
+        if now < self._notified_until:
+            return False
+        self._notified_until = now + retry_after_s
+        return True
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self.controller.release(self.ip)
+
+
+class AdmissionController:
+    """
+    Sesiones concurrentes del worker y por IP, y buckets de frames por IP (ver el docstring del módulo)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ips: Dict[str, _IPState] = {}
+        self.active_sessions = 0
+        self.peak_sessions = 0
+        self.admitted_sessions = 0
+        self.rejected_node = 0
+        self.rejected_ip = 0
+        self.frames_admitted = 0
+        self.throttled_connection = 0
+        self.throttled_ip = 0
+
+    def _ip_state(self, ip: str) -> _IPState:
+        state = self._ips.get(ip)
+        if state is None:
+            if len(self._ips) >= MAX_IDLE_IPS:
+                self._prune()
+            state = self._ips[ip] = _IPState()
+        return state
+
+    def _prune(self) -> None:
+        for ip in [ip for ip, s in self._ips.items() if s.sessions == 0 and s.bucket.is_full()]:
+            del self._ips[ip]
+
+    def admit(self, ip: str) -> Tuple[Optional[AdmissionTicket], Optional[str]]:
+        """
+        Admitir una sesión nueva; si el worker o la IP están al límite devuelve (None, motivo)
+        """
+        with self._lock:
+            if settings.MAX_INFERENCE_SESSIONS and self.active_sessions >= settings.MAX_INFERENCE_SESSIONS:
+                self.rejected_node += 1
+                return None, "node_capacity"
+            state = self._ip_state(ip)
+            if settings.MAX_SESSIONS_PER_IP and state.sessions >= settings.MAX_SESSIONS_PER_IP:
+                self.rejected_ip += 1
+                return None, "ip_limit"
+
+            state.sessions += 1
+            self.active_sessions += 1
+            self.admitted_sessions += 1
+            self.peak_sessions = max(self.peak_sessions, self.active_sessions)
+        return AdmissionTicket(self, ip), None
+
+    def release(self, ip: str) -> None:
+        with self._lock:
+            self.active_sessions -= 1
+            state = self._ips.get(ip)
+            if state is not None:
+                state.sessions -= 1
+
+    def check_frame(self, ticket: AdmissionTicket) -> float:
+        with self._lock:
+            wait = ticket.bucket.take()
+            if wait:
+                self.throttled_connection += 1
+                return wait
+
+            wait = self._ip_state(ticket.ip).bucket.take()
+            if wait:
+                ticket.bucket.refund()
+                self.throttled_ip += 1
+                return wait
+
+            self.frames_admitted += 1
+            return 0.0
+
+    def check_ip_frame(self, ip: str) -> float:
+        """
+        Limitar por IP un frame que no pertenece a una sesión WebSocket (p. ej. uploads)
+        """
+        with self._lock:
+            wait = self._ip_state(ip).bucket.take()
+            if wait:
+                self.throttled_ip += 1
+            else:
+                self.frames_admitted += 1
+            return wait
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                # Límites y contadores de este worker, no del nodo
+                "scope": "worker",
+                "pid": os.getpid(),
+                "active_sessions": self.active_sessions,
+                "peak_sessions": self.peak_sessions,
+                "max_sessions": settings.MAX_INFERENCE_SESSIONS,
+                "max_sessions_per_ip": settings.MAX_SESSIONS_PER_IP,
+                "admitted_sessions": self.admitted_sessions,
+                "rejected_sessions": {"node_capacity": self.rejected_node, "ip_limit": self.rejected_ip},
+                "frames_admitted": self.frames_admitted,
+                "frames_throttled": {"connection": self.throttled_connection, "ip": self.throttled_ip},
+                "frame_rate_per_connection": settings.FRAME_RATE_PER_CONNECTION,
+                "frame_rate_per_ip": settings.FRAME_RATE_PER_IP,
+                "tracked_ips": len(self._ips),
+            }
+
+
+# Instancia global del control de admisión
+admission_controller = AdmissionController()
+register_metrics("admission", admission_controller.summary)
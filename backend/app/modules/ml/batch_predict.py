@@ -0,0 +1,330 @@
+"""
+Predicción por lotes: /ml/predict/batch
+
+Una request con muchas imágenes o muchos vectores de landmarks, para
+herramientas offline (corrección, etiquetado de datasets, revisión
+docente). Fuentes aceptadas:
+
+    multipart/form-data    varios archivos; cada imagen entra a análisis en
+                           cuanto termina de llegar, sin esperar al resto
+    application/zip        archivo con imágenes (se lee completo, acotado
+                           por BATCH_MAX_BYTES)
+    application/json       {"items": [{"id": ..., "landmarks": [...63], "target": "A"}]}
+    application/x-ndjson   un item como el anterior por línea
+
+Las imágenes se analizan con prioridad batch (detrás del WebSocket y los
+uploads), con hasta BATCH_MAX_IN_FLIGHT por request: los landmarks se
+extraen en paralelo entre los procesos del pool y las predicciones se
+agrupan en pasadas del modelo de hasta BATCH_PREDICT_SIZE filas. Los
+resultados se devuelven como NDJSON a medida que terminan (cada línea
+lleva su index) y la última línea es un resumen.
+"""
+
+import asyncio
+import io
+import time
+import zipfile
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+
+from app.core.config import settings
+from app.core.exceptions import ComsignsException, PayloadTooLargeError, ValidationError
+from app.core.metrics import register_metrics
+from app.core.serialization import JSONDecodeError, dumps, loads
+from app.modules.ml.knn import knn_service
+from app.modules.ml.landmarks import FEATURE_SIZE
+from app.modules.ml.services import ml_service, parse_target_letter
+from app.modules.ml.upload import UploadBuffer, iter_multipart_images, sniff_image, upload_buffers
+
+# (nombre, imagen o None, buffer del pool a liberar o None, error o None)
+BatchImage = Tuple[str, Optional[Any], Optional[UploadBuffer], Optional[ValidationError]]
+
+
+class _BatchStats:
+    def __init__(self):
+        self.requests: Dict[str, int] = {"multipart": 0, "zip": 0, "landmarks": 0}
+        self.items = 0
+        self.errors = 0
+        self.no_hand = 0
+        self.truncated = 0
+        self.busy_s = 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "requests": dict(self.requests),
+            "items": self.items,
+            "errors": self.errors,
+            "no_hand_detected": self.no_hand,
+            "truncated_requests": self.truncated,
+            "items_per_s": round(self.items / self.busy_s, 1) if self.busy_s else 0.0,
+            "predictor": ml_service.batch_predictor.summary(),
+        }
+
+
+batch_stats = _BatchStats()
+register_metrics("batch_predict", batch_stats.summary)
+
+
+class NDJSONResponse(StreamingResponse):
+    """
+    StreamingResponse que no lee receive() mientras envía
+
+    StreamingResponse consume los mensajes de la request para detectar la
+    desconexión; aquí el cuerpo (multipart) se sigue leyendo mientras se
+    responden los primeros resultados. La desconexión se revisa en
+    ndjson_lines una vez leído todo el cuerpo.
+    """
+
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+# ==============================================
+# 📥 FUENTES
+# ==============================================
+
+def parse_landmark_items(body: bytes, ndjson: bool) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+    """
+    Matriz (n, 63) float32 relativa a la muñeca y la lista de items (id, target, error)
+
+    Acepta landmarks crudos de MediaPipe o ya relativos a la muñeca
+    (restar la muñeca de nuevo no los cambia), como 63 números o 21x3.
+    """
+    try:
+        if ndjson:
+            raw_items = [loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            payload = loads(body)
+            raw_items = payload.get("items") if isinstance(payload, dict) else None
+    except JSONDecodeError as e:
+        raise ValidationError(f"JSON inválido: {str(e)}")
+    if not isinstance(raw_items, list) or not raw_items:
+        raise ValidationError("Se esperaba una lista 'items' con landmarks")
+    if len(raw_items) > settings.BATCH_MAX_ITEMS:
+        raise PayloadTooLargeError(f"Máximo {settings.BATCH_MAX_ITEMS} items por request")
+
+    features = np.zeros((len(raw_items), FEATURE_SIZE), dtype=np.float32)
+    items = []
+    for index, raw in enumerate(raw_items):
+        raw = raw if isinstance(raw, dict) else {"landmarks": raw}
+        item = {"id": raw.get("id", index), "target": parse_target_letter(raw.get("target")), "error": None}
+        try:
+            row = np.asarray(raw.get("landmarks"), dtype=np.float32).reshape(FEATURE_SIZE)
+            features[index] = row
+        except (TypeError, ValueError):
+            item["error"] = f"Se esperaban {FEATURE_SIZE} valores (21 landmarks x, y, z)"
+        items.append(item)
+
+    # Normalizar landmarks (relativo al primer punto), en el lugar
+    points = features.reshape(len(items), 21, 3)
+    points -= points[:, :1, :].copy()
+    return features, items
+
+
+def zip_images(body: bytes) -> AsyncIterator[BatchImage]:
+    """
+    Imágenes de un zip; los miembros que no son imagen o superan MAX_UPLOAD_SIZE salen con error
+    """
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(body))
+    except zipfile.BadZipFile:
+        raise ValidationError("Archivo zip inválido")
+
+    def members() -> Iterator[BatchImage]:
+        with archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                if info.file_size > settings.MAX_UPLOAD_SIZE:
+                    yield info.filename, None, None, PayloadTooLargeError(
+                        f"La imagen supera el máximo de {settings.MAX_UPLOAD_SIZE} bytes")
+                    continue
+                # file_size acota la descompresión (zipfile no lee más allá)
+                data = archive.read(info)
+                if sniff_image(data[:12]) is None:
+                    yield info.filename, None, None, ValidationError("No es una imagen JPEG, PNG, WebP o BMP")
+                    continue
+                yield info.filename, data, None, None
+    return _from_sync(members())
+
+
+async def multipart_images(request: Request) -> AsyncIterator[BatchImage]:
+    """
+    Imágenes de un multipart/form-data en streaming (ver upload.iter_multipart_images)
+    """
+    async for filename, buffer, error in iter_multipart_images(request, settings.BATCH_MAX_BYTES):
+        yield filename, None, buffer, error
+    request.state.batch_body_read = True
+
+
+async def _from_sync(images: Iterator[BatchImage]) -> AsyncIterator[BatchImage]:
+    # Descomprimir fuera del event loop
+    done = object()
+    while True:
+        image = await asyncio.to_thread(next, images, done)
+        if image is done:
+            return
+        yield image
+
+
+# ==============================================
+# ⚙️ PROCESAMIENTO
+# ==============================================
+
+def _result_line(index: int, name: Any, landmarks: Optional[np.ndarray], result: Optional[Dict[str, Any]],
+                 second_opinion: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    if landmarks is None:
+        batch_stats.no_hand += 1
+        return {
+            "index": index, "id": name, "letter": "", "confidence": 0.0,
+            "status": "no_hand_detected", "landmarks_detected": False
+        }
+    line = {
+        "index": index, "id": name, "letter": result["letter"], "confidence": result["confidence"],
+        "status": result["status"], "landmarks_detected": True, "model_version": result["model_version"],
+        "processing_time_ms": result["processing_time_ms"]
+    }
+    if second_opinion is not None:
+        line["second_opinion"] = second_opinion
+    return line
+
+
+def _error_line(index: Optional[int], name: Any, message: str) -> Dict[str, Any]:
+    batch_stats.errors += 1
+    return {"index": index, "id": name, "status": "error", "error": message}
+
+
+async def stream_image_results(images: AsyncIterator[BatchImage]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Analizar imágenes a medida que llegan; resultados en el orden en que terminan
+    """
+    results: asyncio.Queue = asyncio.Queue()
+    slots = asyncio.Semaphore(max(1, settings.BATCH_MAX_IN_FLIGHT))
+    tasks = set()
+    finished = object()
+
+    async def analyze(index: int, name: str, data: Any, buffer: Optional[UploadBuffer]) -> None:
+        reusable = False
+        try:
+            landmarks, result = await ml_service.analyze_batch_item(data)
+            second_opinion = None
+            if result is not None and result["status"] == "low_confidence":
+                second_opinion = await knn_service.opinion(landmarks)
+            results.put_nowait(_result_line(index, name, landmarks, result, second_opinion))
+            reusable = True
+        except ComsignsException as e:
+            reusable = True
+            results.put_nowait(_error_line(index, name, e.message))
+        except Exception as e:
+            reusable = True
+            results.put_nowait(_error_line(index, name, f"Error interno: {str(e)}"))
+        finally:
+            slots.release()
+            if buffer is not None:
+                # Si se canceló, el hilo de inferencia podría seguir leyendo el buffer
+                upload_buffers.release(buffer, reusable=reusable)
+
+    async def produce() -> None:
+        index = 0
+        try:
+            async for name, data, buffer, error in images:
+                if index >= settings.BATCH_MAX_ITEMS:
+                    if buffer is not None:
+                        upload_buffers.release(buffer)
+                    batch_stats.truncated += 1
+                    results.put_nowait(_error_line(None, None, f"Máximo {settings.BATCH_MAX_ITEMS} items por request"))
+                    break
+                if error is not None:
+                    results.put_nowait(_error_line(index, name, error.message))
+                else:
+                    # Sin lugar libre se deja de leer la request (contrapresión)
+                    await slots.acquire()
+                    task = asyncio.create_task(analyze(index, name, buffer.finish() if buffer else data, buffer))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                index += 1
+        except ValidationError as e:
+            results.put_nowait(_error_line(None, None, e.message))
+        finally:
+            await images.aclose()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            results.put_nowait(finished)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            line = await results.get()
+            if line is finished:
+                break
+            yield line
+    finally:
+        producer.cancel()
+        for task in list(tasks):
+            task.cancel()
+
+
+async def stream_landmark_results(features: np.ndarray,
+                                  items: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Predecir la matriz de landmarks en pasadas de BATCH_PREDICT_SIZE filas (vistas, sin copias)
+    """
+    for index, item in enumerate(items):
+        if item["error"] is not None:
+            yield _error_line(index, item["id"], item["error"])
+
+    valid = [index for index, item in enumerate(items) if item["error"] is None]
+    size = max(1, settings.BATCH_PREDICT_SIZE)
+    for start in range(0, len(valid), size):
+        rows = valid[start:start + size]
+        # Filas contiguas: vista de la matriz; si hubo items inválidos en medio, se copian
+        contiguous = rows[-1] - rows[0] + 1 == len(rows)
+        chunk = features[rows[0]:rows[-1] + 1] if contiguous else features[rows]
+        try:
+            results = await ml_service.predict_landmarks_batch(chunk, [items[i]["target"] for i in rows])
+        except ComsignsException as e:
+            for index in rows:
+                yield _error_line(index, items[index]["id"], e.message)
+            continue
+        # Segunda opinión k-NN de las filas low_confidence del lote, en una sola consulta
+        opinions: Dict[int, Dict[str, Any]] = {}
+        uncertain = [index for index, result in zip(rows, results) if result["status"] == "low_confidence"]
+        if uncertain and knn_service.index is not None:
+            answers = await asyncio.to_thread(knn_service.query, features[uncertain])
+            opinions = dict(zip(uncertain, answers))
+        for index, result in zip(rows, results):
+            yield _result_line(index, items[index]["id"], features[index], result, opinions.get(index))
+
+
+async def ndjson_lines(request: Request, source: str, results: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """
+    Codificar resultados como NDJSON y cerrar con una línea de resumen
+    """
+    batch_stats.requests[source] += 1
+    started = time.perf_counter()
+    counts = {"items": 0, "errors": 0, "no_hand_detected": 0}
+    try:
+        async for line in results:
+            if line.get("index") is not None:
+                counts["items"] += 1
+                batch_stats.items += 1
+            if line["status"] == "error":
+                counts["errors"] += 1
+            elif line["status"] == "no_hand_detected":
+                counts["no_hand_detected"] += 1
+            yield dumps(line) + b"\n"
+            # Con el cuerpo ya leído, receive() solo puede traer la desconexión
+            if getattr(request.state, "batch_body_read", False) and await request.is_disconnected():
+                return
+        elapsed_s = time.perf_counter() - started
+        yield dumps({"summary": dict(counts, elapsed_ms=round(elapsed_s * 1000, 1))}) + b"\n"
+    finally:
+        batch_stats.busy_s += time.perf_counter() - started
+        await results.aclose()
@@ -0,0 +1,137 @@
+"""
+Micro-batching de llamadas concurrentes
+
+Agrupa los elementos que llegan dentro de una ventana corta (max_wait_ms)
+o hasta max_batch, y los procesa en una sola llamada en un executor.
+Cada llamador recibe su resultado individual; si la función de lote
+devuelve una excepción en la posición de un elemento, solo ese llamador
+la recibe.
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+from app.core.exceptions import ModelError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Cola asyncio que entrega lotes a una función síncrona
+    """
+
+    def __init__(self, process_batch: Callable[[List[T]], List[Any]], max_batch: int,
+                 max_wait_ms: float, executor: Optional[Executor] = None, name: str = "batcher"):
+        self.process_batch = process_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait_s = max_wait_ms / 1000
+        self.name = name
+        # Un solo hilo: los lotes se procesan en orden y sin concurrencia
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Lote en proceso (sus llamadores siguen esperando)
+        self._current: List[Tuple[T, asyncio.Future]] = []
+
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+        self.busy_s = 0.0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Detener el procesamiento; los llamadores pendientes reciben ModelError
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        pending = self._current
+        self._current = []
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(ModelError(f"{self.name} detenido"))
+
+    async def submit(self, item: T) -> R:
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[T, asyncio.Future]]:
+        # Lo que se va sacando de la cola queda en _current, para que stop() lo encuentre
+        batch = self._current = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch:
+            # Lo que ya está en cola entra sin esperar
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Llamadores que se fueron (timeout/desconexión) no ocupan lugar en el lote
+            batch = self._current = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self.process_batch, [item for item, _ in batch]
+                )
+            except Exception as e:
+                logger.error(f"Error procesando lote de {len(batch)} en {self.name}: {str(e)}")
+                results = [e] * len(batch)
+            self.busy_s += time.perf_counter() - started
+
+            self.batches += 1
+            self.items += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            self._current = []
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "pending": self._queue.qsize() if self._queue else 0,
+            "busy_s": round(self.busy_s, 3),
+        }
@@ -0,0 +1,78 @@
+"""
+Dataset de landmarks de entrenamiento (backend/dataset/hand_data.npy, hand_labels.npy)
+
+Se carga una sola vez por proceso y lo comparten el índice k-NN
+(app.modules.ml.knn) y las plantillas por letra (app.modules.ml.templates).
+Cada fila son los 63 valores (21 landmarks x, y, z) relativos a la muñeca,
+igual que la entrada del modelo; las etiquetas son índices en
+MLService.letters.
+"""
+
+import logging
+import os
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.modules.ml.landmarks import FEATURE_SIZE, LANDMARK_COUNT
+
+logger = logging.getLogger(__name__)
+
+
+class LandmarkDataset:
+    """
+    Matriz (n, 63) float32 contigua con sus etiquetas
+    """
+
+    def __init__(self, features: np.ndarray, labels: np.ndarray, letters: List[str]):
+        if features.ndim != 2 or features.shape[1] != FEATURE_SIZE or len(features) != len(labels):
+            raise ValueError(f"Se esperaban (n, {FEATURE_SIZE}) features y n etiquetas")
+        self.features = np.ascontiguousarray(features, dtype=np.float32)
+        # Relativo a la muñeca, como extract_landmarks (no cambia filas ya normalizadas)
+        points = self.features.reshape(-1, LANDMARK_COUNT, 3)
+        points -= points[:, :1, :].copy()
+        self.labels = labels.astype(np.intp)
+        self.letters = list(letters)
+        if self.labels.min() < 0 or self.labels.max() >= len(self.letters):
+            raise ValueError("Etiquetas fuera del rango de letras")
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def class_rows(self, label: int) -> np.ndarray:
+        return np.flatnonzero(self.labels == label)
+
+
+_dataset: Optional[LandmarkDataset] = None
+_dataset_loaded = False
+_dataset_lock = threading.Lock()
+
+
+def load_dataset(letters: List[str]) -> Optional[LandmarkDataset]:
+    """
+    Dataset de DATASET_PATH / DATASET_LABELS_PATH, cargado una sola vez; None si no está
+    """
+    global _dataset, _dataset_loaded
+    if _dataset_loaded:
+        return _dataset
+    with _dataset_lock:
+        if not _dataset_loaded:
+            if os.path.exists(settings.DATASET_PATH) and os.path.exists(settings.DATASET_LABELS_PATH):
+                try:
+                    _dataset = LandmarkDataset(
+                        np.load(settings.DATASET_PATH), np.load(settings.DATASET_LABELS_PATH), letters
+                    )
+                    logger.info(f"Dataset de landmarks cargado: {len(_dataset)} muestras")
+                except (OSError, ValueError) as e:
+                    logger.error(f"Error cargando el dataset de landmarks: {str(e)}")
+            elif settings.KNN_ENABLED or settings.TEMPLATES_ENABLED:
+                logger.warning(
+                    f"Dataset de landmarks no encontrado en {settings.DATASET_PATH}: "
+                    f"la segunda opinión k-NN y las plantillas por letra quedan desactivadas"
+                )
+            else:
+                logger.info(f"Dataset de landmarks no encontrado en {settings.DATASET_PATH}")
+            _dataset_loaded = True
+    return _dataset
@@ -0,0 +1,152 @@
+"""
+Degradación de calidad según la carga
+
+Un controlador por worker mide cada DEGRADE_INTERVAL_S la espera en la
+cola del planificador (p95 del intervalo) y los frames en cola. Si superan
+los umbrales sube un escalón; si se mantienen bajo DEGRADE_WAIT_LOW_MS
+durante DEGRADE_RECOVER_S baja uno. Los escalones abaratan el frame:
+
+    full      MediaPipe model_complexity=1, resolución original
+    lite      model_complexity=0
+    reduced   model_complexity=0, lado mayor reducido a DEGRADE_MAX_SIDE
+    minimal   lo anterior y como máximo DEGRADE_MIN_FPS frames/s por sesión
+
+El escalón activo viaja con cada frame a los backends (hilo local, pool o
+sidecar) y se informa a los clientes en cada predicción.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import register_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class QualityTier:
+    """
+    Configuración de procesamiento de un escalón
+    """
+
+    def __init__(self, level: int, name: str, model_complexity: int, max_side: int, max_fps: float):
+        self.level = level
+        self.name = name
+        self.model_complexity = model_complexity
+        self.max_side = max_side  # 0 = resolución original
+        self.max_fps = max_fps  # 0 = sin límite propio (solo el de admisión)
+
+    @property
+    def min_interval_s(self) -> float:
+        return 1 / self.max_fps if self.max_fps else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "level": self.level,
+            "name": self.name,
+            "model_complexity": self.model_complexity,
+            "max_side": self.max_side,
+            "max_fps": self.max_fps,
+        }
+
+
+def build_tiers() -> List[QualityTier]:
+    return [
+        QualityTier(0, "full", 1, 0, 0.0),
+        QualityTier(1, "lite", 0, 0, 0.0),
+        QualityTier(2, "reduced", 0, settings.DEGRADE_MAX_SIDE, 0.0),
+        QualityTier(3, "minimal", 0, settings.DEGRADE_MAX_SIDE, settings.DEGRADE_MIN_FPS),
+    ]
+
+
+class DegradationController:
+    """
+    Escalón de calidad activo con histéresis entre subir y bajar
+    """
+
+    def __init__(self):
+        self.tiers = build_tiers()
+        self.level = 0
+        self.changes = 0
+        self.last_sample: Dict[str, Any] = {}
+        self._calm_since: Optional[float] = None
+        self._entered = time.monotonic()
+        self._time_in_tier = [0.0] * len(self.tiers)
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def current(self) -> QualityTier:
+        return self.tiers[self.level]
+
+    def _set_level(self, level: int, reason: str) -> None:
+        now = time.monotonic()
+        self._time_in_tier[self.level] += now - self._entered
+        self._entered = now
+        previous = self.tiers[self.level].name
+        self.level = level
+        self.changes += 1
+        logger.warning(f"Calidad de inferencia: {previous} -> {self.current.name} ({reason})")
+
+    def evaluate(self, wait_p95_ms: float, queued: int) -> QualityTier:
+        """
+        Ajustar el escalón con una muestra de carga
+        """
+        now = time.monotonic()
+        self.last_sample = {"wait_p95_ms": round(wait_p95_ms, 3), "queued": queued}
+
+        overloaded = wait_p95_ms > settings.DEGRADE_WAIT_HIGH_MS or queued > settings.DEGRADE_QUEUE_HIGH
+        if overloaded:
+            self._calm_since = None
+            if self.level < len(self.tiers) - 1:
+                self._set_level(self.level + 1, f"espera p95 {wait_p95_ms:.0f}ms, {queued} en cola")
+            return self.current
+
+        if wait_p95_ms < settings.DEGRADE_WAIT_LOW_MS and queued == 0:
+            if self._calm_since is None:
+                self._calm_since = now
+            elif self.level > 0 and now - self._calm_since >= settings.DEGRADE_RECOVER_S:
+                self._set_level(self.level - 1, "carga normalizada")
+                self._calm_since = now  # Un escalón por ventana de recuperación
+        else:
+            self._calm_since = None
+        return self.current
+
+    def start(self, sample: Callable[[], Tuple[float, int]]) -> None:
+        """
+        Evaluar periódicamente con sample() -> (espera p95 en ms, frames en cola)
+        """
+        if not settings.DEGRADE_ENABLED or self._task is not None:
+            return
+
+        async def run():
+            while True:
+                await asyncio.sleep(settings.DEGRADE_INTERVAL_S)
+                try:
+                    self.evaluate(*sample())
+                except Exception as e:
+                    logger.error(f"Error evaluando la carga de inferencia: {str(e)}")
+
+        self._task = asyncio.get_running_loop().create_task(run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def summary(self) -> Dict[str, Any]:
+        time_in_tier = list(self._time_in_tier)
+        time_in_tier[self.level] += time.monotonic() - self._entered
+        return {
+            "enabled": settings.DEGRADE_ENABLED,
+            "tier": self.current.to_dict(),
+            "changes": self.changes,
+            "last_sample": self.last_sample,
+            "seconds_in_tier": {tier.name: round(seconds, 1) for tier, seconds in zip(self.tiers, time_in_tier)},
+        }
+
+
+# Instancia global del controlador de calidad
+degradation_controller = DegradationController()
+register_metrics("quality", degradation_controller.summary)
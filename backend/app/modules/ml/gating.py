@@ -0,0 +1,129 @@
+"""
+Filtro de frames duplicados o sin movimiento antes de decodificar
+
+Cuando el usuario se queda quieto o sale de cuadro el cliente sigue
+enviando JPEGs casi idénticos. Antes de pasar un frame por imdecode,
+MediaPipe y el modelo, FrameGate lo compara con el último frame analizado
+de la conexión:
+
+    duplicate    mismo hash de los bytes comprimidos
+    low_motion   miniatura en escala de grises (decodificación JPEG reducida
+                 a 1/8) con diferencia media menor a FRAME_GATE_MOTION_THRESHOLD
+
+Los frames filtrados reutilizan el resultado del frame de referencia (si
+ese frame terminó en error o busy, se analizan normalmente).
+Cada FRAME_GATE_MAX_REUSE frames reutilizados se fuerza un análisis.
+"""
+
+import hashlib
+import time
+from typing import Any, Dict, Optional
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import register_metrics
+
+THUMBNAIL_SIZE = (32, 24)
+
+
+def thumbnail(image_data: bytes) -> Optional[np.ndarray]:
+    """
+    Miniatura en grises; el decodificador JPEG escala en la DCT, sin decodificar a tamaño completo
+    """
+    small = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if small is None:
+        return None
+    return cv2.resize(small, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+class _GateStats:
+    def __init__(self):
+        self.frames = 0
+        self.duplicate = 0
+        self.low_motion = 0
+        self.gate_ms = 0.0
+        self.saved_ms = 0.0
+        # Promedio móvil del costo de analizar un frame (para estimar lo ahorrado)
+        self.analysis_ms = 0.0
+
+    def observe_analysis(self, elapsed_ms: float) -> None:
+        self.analysis_ms = elapsed_ms if not self.analysis_ms else 0.9 * self.analysis_ms + 0.1 * elapsed_ms
+
+    def observe_skip(self, reason: str) -> None:
+        setattr(self, reason, getattr(self, reason) + 1)
+        self.saved_ms += self.analysis_ms
+
+    def summary(self) -> Dict[str, Any]:
+        skipped = self.duplicate + self.low_motion
+        return {
+            "enabled": settings.FRAME_GATE_ENABLED,
+            "frames": self.frames,
+            "skipped": {"duplicate": self.duplicate, "low_motion": self.low_motion},
+            "skip_rate": round(skipped / self.frames, 4) if self.frames else 0.0,
+            "gate_ms_per_frame": round(self.gate_ms / self.frames, 3) if self.frames else 0.0,
+            "analysis_ms_avg": round(self.analysis_ms, 3),
+            "saved_ms_estimate": round(self.saved_ms - self.gate_ms, 1),
+        }
+
+
+gate_stats = _GateStats()
+register_metrics("frame_gate", gate_stats.summary)
+
+
+class FrameGate:
+    """
+    Estado del filtro de una conexión: el último frame analizado
+    """
+
+    def __init__(self):
+        self._hash: Optional[bytes] = None
+        self._thumbnail: Optional[np.ndarray] = None
+        self._target: Optional[str] = None
+        self._reused = 0
+        self.reference: Any = None  # Resultado (o future) del frame de referencia
+
+    def check(self, image_data: bytes, target: Optional[str]) -> Optional[str]:
+        """
+        Motivo para reutilizar el resultado de referencia, o None si hay que analizar el frame
+        """
+        gate_stats.frames += 1
+        if not settings.FRAME_GATE_ENABLED:
+            return None
+
+        started = time.perf_counter()
+        try:
+            digest = hashlib.blake2b(image_data, digest_size=16).digest()
+            usable = (
+                self.reference is not None
+                and target == self._target
+                and self._reused < settings.FRAME_GATE_MAX_REUSE
+            )
+            if usable and digest == self._hash:
+                return self._skip("duplicate")
+
+            small = thumbnail(image_data)
+            if usable and small is not None and self._thumbnail is not None:
+                motion = float(np.abs(small - self._thumbnail).mean())
+                if motion < settings.FRAME_GATE_MOTION_THRESHOLD:
+                    return self._skip("low_motion")
+
+            # Este frame pasa a ser la nueva referencia
+            self._hash, self._thumbnail, self._target = digest, small, target
+            self._reused = 0
+            self.reference = None
+            return None
+        finally:
+            gate_stats.gate_ms += (time.perf_counter() - started) * 1000
+
+    def _skip(self, reason: str) -> str:
+        self._reused += 1
+        return reason
+
+    def invalidate(self) -> None:
+        """
+        El frame de referencia no tuvo un resultado reutilizable
+        """
+        self._hash = self._thumbnail = None
+        self.reference = None
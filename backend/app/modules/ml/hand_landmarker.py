@@ -0,0 +1,248 @@
+"""
+Extracción de landmarks con MediaPipe Tasks (HandLandmarker)
+
+Alternativa a mp.solutions.hands (LANDMARK_EXTRACTOR=tasks) para el
+backend local. Cada sesión WebSocket tiene su propio HandLandmarker con
+timestamps propios, así el seguimiento entre frames no mezcla sesiones:
+
+    video        detect_for_video síncrono en el hilo de inferencia
+    live_stream  detect_async; el resultado llega por callback desde el hilo
+                 de MediaPipe y se entrega al event loop. Si MediaPipe está
+                 ocupado descarta frames por su cuenta: los frames sin
+                 resultado anteriores al último resuelto, o que siguen sin
+                 resultado cuando el grafo quedó libre, fallan con
+                 DeadlineExceededError
+
+Requiere el modelo hand_landmarker.task (HAND_LANDMARKER_MODEL_PATH).
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Any, Dict, Optional, Union
+
+import mediapipe as mp
+import numpy as np
+
+from app.core.config import settings
+from app.core.exceptions import DeadlineExceededError, ModelError
+from app.core.metrics import register_metrics
+from app.modules.ml.landmarks import decode_rgb, relative_landmarks
+
+RUNNING_MODES = ("image", "video", "live_stream")
+
+# Espera extra, en latencias promedio, antes de dar por descartado un frame sin resultado
+DROP_GRACE_LATENCIES = 3
+
+
+def create_hand_landmarker(running_mode: str, result_callback=None):
+    """
+    Crear un HandLandmarker para una sola mano con los umbrales de create_hands
+    """
+    vision = mp.tasks.vision
+    mode = {
+        "image": vision.RunningMode.IMAGE,
+        "video": vision.RunningMode.VIDEO,
+        "live_stream": vision.RunningMode.LIVE_STREAM,
+    }[running_mode]
+
+    options = dict(
+        base_options=mp.tasks.BaseOptions(model_asset_path=settings.HAND_LANDMARKER_MODEL_PATH),
+        running_mode=mode,
+        num_hands=1,
+        min_hand_detection_confidence=0.7,
+        min_hand_presence_confidence=0.5,
+        min_tracking_confidence=0.5,
+    )
+    if running_mode == "live_stream":
+        options["result_callback"] = result_callback
+    try:
+        return vision.HandLandmarker.create_from_options(vision.HandLandmarkerOptions(**options))
+    except Exception as e:
+        raise ModelError(f"Error creando HandLandmarker ({settings.HAND_LANDMARKER_MODEL_PATH}): {str(e)}")
+
+
+def landmarks_from_result(result) -> Optional[np.ndarray]:
+    if result.hand_landmarks:
+        return relative_landmarks(result.hand_landmarks[0])
+    return None
+
+
+def to_mp_image(rgb_image: np.ndarray) -> mp.Image:
+    return mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_image)
+
+
+class SessionHandLandmarker:
+    """
+    HandLandmarker de una sesión con su propio reloj de timestamps
+    """
+
+    def __init__(self, running_mode: str):
+        self.running_mode = running_mode
+        self.frames = 0
+        self.dropped = 0
+        self._started = time.monotonic()
+        self._last_timestamp = -1
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._submitted: Dict[int, float] = {}
+        self._latency_s = 0.05  # Promedio móvil del envío al callback
+        self._results = 0
+        callback = self._on_result if running_mode == "live_stream" else None
+        self._landmarker = create_hand_landmarker(running_mode, callback)
+
+    @property
+    def live(self) -> bool:
+        return self.running_mode == "live_stream"
+
+    def _next_timestamp(self) -> int:
+        # MediaPipe exige timestamps estrictamente crecientes por instancia
+        timestamp = max(self._last_timestamp + 1, int((time.monotonic() - self._started) * 1000))
+        self._last_timestamp = timestamp
+        return timestamp
+
+    def detect_video(self, image_data: Union[bytes, memoryview], max_side: int = 0) -> Optional[np.ndarray]:
+        """
+        Modo video: corre en el hilo de inferencia
+        """
+        rgb_image = decode_rgb(image_data, max_side)
+        if rgb_image is None:
+            return None
+        self.frames += 1
+        result = self._landmarker.detect_for_video(to_mp_image(rgb_image), self._next_timestamp())
+        return landmarks_from_result(result)
+
+    async def detect_live(self, image_data: Union[bytes, memoryview], max_side: int,
+                          executor: Executor) -> Optional[np.ndarray]:
+        """
+        Modo live_stream: decodifica en el executor y espera el callback de MediaPipe
+        """
+        self._loop = asyncio.get_running_loop()
+        rgb_image = await self._loop.run_in_executor(executor, decode_rgb, image_data, max_side)
+        if rgb_image is None:
+            return None
+
+        self.frames += 1
+        timestamp = self._next_timestamp()
+        future = self._loop.create_future()
+        self._pending[timestamp] = future
+        self._submitted[timestamp] = time.monotonic()
+        self._landmarker.detect_async(to_mp_image(rgb_image), timestamp)
+        try:
+            return await asyncio.wait_for(future, settings.INFERENCE_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            raise ModelError("Tiempo de inferencia agotado")
+        finally:
+            self._pending.pop(timestamp, None)
+            self._submitted.pop(timestamp, None)
+
+    def _on_result(self, result, output_image, timestamp_ms: int) -> None:
+        # Hilo de MediaPipe: solo pasar el resultado al event loop
+        landmarks = landmarks_from_result(result)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._resolve, timestamp_ms, landmarks)
+
+    def _resolve(self, timestamp_ms: int, landmarks: Optional[np.ndarray]) -> None:
+        submitted = self._submitted.get(timestamp_ms)
+        if submitted is not None:
+            self._latency_s = 0.8 * self._latency_s + 0.2 * (time.monotonic() - submitted)
+        self._results += 1
+
+        for timestamp in [t for t in self._pending if t <= timestamp_ms]:
+            future = self._pending.pop(timestamp)
+            if future.done():
+                continue
+            if timestamp == timestamp_ms:
+                future.set_result(landmarks)
+            else:
+                self._drop(future)
+
+        if self._pending:
+            # Si no llega ningún resultado más, los frames restantes fueron descartados
+            self._loop.call_later(self._latency_s * DROP_GRACE_LATENCIES, self._expire, self._results)
+
+    def _expire(self, results: int) -> None:
+        if results != self._results:
+            return  # El grafo siguió entregando resultados
+        grace = self._latency_s * DROP_GRACE_LATENCIES
+        now = time.monotonic()
+        for timestamp in list(self._pending):
+            if now - self._submitted.get(timestamp, now) >= grace:
+                self._drop(self._pending.pop(timestamp))
+        if self._pending:
+            self._loop.call_later(grace, self._expire, results)
+
+    def _drop(self, future: asyncio.Future) -> None:
+        # MediaPipe descartó este frame para seguir al ritmo de la sesión
+        if not future.done():
+            self.dropped += 1
+            future.set_exception(DeadlineExceededError("Frame descartado por MediaPipe (live_stream)"))
+
+    def close(self) -> None:
+        for future in self._pending.values():
+            if not future.done():
+                future.cancel()
+        self._pending.clear()
+        self._landmarker.close()
+
+
+class SessionLandmarkers:
+    """
+    Un SessionHandLandmarker por conexión (stream_id), acotado a MAX_INFERENCE_SESSIONS
+    """
+
+    def __init__(self):
+        self._sessions: "OrderedDict[str, SessionHandLandmarker]" = OrderedDict()
+        self.created = 0
+        self.evicted = 0
+        # Totales de sesiones ya cerradas
+        self._closed_frames = 0
+        self._closed_dropped = 0
+
+    def get(self, stream_id: str) -> SessionHandLandmarker:
+        landmarker = self._sessions.get(stream_id)
+        if landmarker is not None:
+            self._sessions.move_to_end(stream_id)
+            return landmarker
+
+        landmarker = SessionHandLandmarker(settings.HAND_LANDMARKER_MODE)
+        self._sessions[stream_id] = landmarker
+        self.created += 1
+        while settings.MAX_INFERENCE_SESSIONS and len(self._sessions) > settings.MAX_INFERENCE_SESSIONS:
+            _, oldest = self._sessions.popitem(last=False)
+            self._close(oldest)
+            self.evicted += 1
+        return landmarker
+
+    def release(self, stream_id: str) -> None:
+        landmarker = self._sessions.pop(stream_id, None)
+        if landmarker is not None:
+            self._close(landmarker)
+
+    def _close(self, landmarker: SessionHandLandmarker) -> None:
+        self._closed_frames += landmarker.frames
+        self._closed_dropped += landmarker.dropped
+        landmarker.close()
+
+    def close_all(self) -> None:
+        for stream_id in list(self._sessions):
+            self.release(stream_id)
+
+    def summary(self) -> Dict[str, Any]:
+        frames = self._closed_frames + sum(l.frames for l in self._sessions.values())
+        dropped = self._closed_dropped + sum(l.dropped for l in self._sessions.values())
+        return {
+            "extractor": settings.LANDMARK_EXTRACTOR,
+            "mode": settings.HAND_LANDMARKER_MODE,
+            "active_sessions": len(self._sessions),
+            "created": self.created,
+            "evicted": self.evicted,
+            "frames": frames,
+            "dropped_by_mediapipe": dropped,
+        }
+
+
+# Landmarkers por sesión del backend local (LANDMARK_EXTRACTOR=tasks)
+session_landmarkers = SessionLandmarkers()
+register_metrics("hand_landmarker", session_landmarkers.summary)
@@ -0,0 +1,214 @@
+"""
+Índice de vecinos más cercanos sobre el dataset de entrenamiento
+
+Cuando el modelo responde low_confidence el usuario no recibe nada útil.
+El índice da una segunda opinión sin otra pasada de red: las k muestras
+de entrenamiento más parecidas al frame, el voto por letra de esos
+vecinos y la muestra más cercana como ejemplo a imitar.
+
+Los vectores (63 landmarks relativos a la muñeca) se normalizan a norma 1,
+así que la similitud es el coseno y no depende del tamaño de la mano en la
+imagen. Buscar es un producto de matrices (consultas x muestras) y un
+top-k con argpartition: con el dataset completo (~7000 muestras) una
+consulta toma decenas de microsegundos, y las consultas de varias
+conexiones se agrupan en un lote (KNN_BATCH_SIZE / KNN_BATCH_WAIT_MS).
+Con KNN_PROTOTYPES_PER_CLASS > 0 el índice guarda solo esa cantidad de
+muestras representativas por letra (k-means esférico por clase, quedándose
+con la muestra real más cercana a cada centro).
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import register_metrics
+from app.modules.ml.batching import MicroBatcher
+from app.modules.ml.dataset import LandmarkDataset, load_dataset
+
+logger = logging.getLogger(__name__)
+
+# Letras con más votos incluidas en cada respuesta
+REPORTED_VOTES = 3
+
+
+def normalize_rows(features: np.ndarray) -> np.ndarray:
+    """
+    Filas a norma 1 (float32); las filas nulas quedan en cero
+    """
+    features = np.asarray(features, dtype=np.float32)
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    return features / np.maximum(norms, 1e-8)
+
+
+def select_prototypes(normalized: np.ndarray, labels: np.ndarray, per_class: int,
+                      iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    Índices de hasta per_class muestras representativas por clase
+    """
+    rng = np.random.default_rng(seed)
+    selected = []
+    for label in np.unique(labels):
+        rows = np.flatnonzero(labels == label)
+        if len(rows) <= per_class:
+            selected.append(rows)
+            continue
+        samples = normalized[rows]
+        centers = samples[rng.choice(len(rows), per_class, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(samples @ centers.T, axis=1)
+            for center in range(per_class):
+                members = samples[assignment == center]
+                if len(members):
+                    mean = members.sum(axis=0)
+                    centers[center] = mean / max(float(np.linalg.norm(mean)), 1e-8)
+        # La muestra real más cercana a cada centro (un ejemplo que se puede mostrar)
+        medoids = np.unique(np.argmax(samples @ centers.T, axis=0))
+        selected.append(rows[medoids])
+    return np.sort(np.concatenate(selected))
+
+
+class KnnIndex:
+    """
+    Matriz de muestras normalizadas con sus etiquetas; query() acepta un lote de consultas
+    """
+
+    def __init__(self, dataset: LandmarkDataset, k: int, prototypes_per_class: int = 0):
+        normalized = normalize_rows(dataset.features)
+        rows = np.arange(len(dataset))
+        if prototypes_per_class > 0:
+            rows = select_prototypes(normalized, dataset.labels, prototypes_per_class)
+        self.rows = rows
+        self.matrix = np.ascontiguousarray(normalized[rows])
+        self.labels = dataset.labels[rows]
+        self.examples = dataset.features[rows]
+        self.letters = dataset.letters
+        self.k = max(1, min(k, len(rows)))
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def query(self, features: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        Vecinos, votos y ejemplo más cercano para cada fila de features (n, 63) o (21, 3) para una
+        """
+        queries = normalize_rows(np.reshape(features, (-1, self.matrix.shape[1])))
+        similarities = queries @ self.matrix.T
+        if self.k < len(self.rows):
+            top = np.argpartition(similarities, -self.k, axis=1)[:, -self.k:]
+        else:
+            top = np.broadcast_to(np.arange(len(self.rows)), (len(queries), len(self.rows)))
+        top_similarities = np.take_along_axis(similarities, top, axis=1)
+        order = np.argsort(-top_similarities, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_similarities = np.take_along_axis(top_similarities, order, axis=1)
+
+        # Voto ponderado por similitud (las negativas no votan)
+        top_labels = self.labels[top]
+        votes = np.zeros((len(queries), len(self.letters)), dtype=np.float32)
+        np.add.at(votes, (np.arange(len(queries))[:, None], top_labels), np.maximum(top_similarities, 0.0))
+        totals = votes.sum(axis=1, keepdims=True)
+        shares = votes / np.maximum(totals, 1e-8)
+
+        results = []
+        for row in range(len(queries)):
+            ranked = np.argsort(-shares[row])[:REPORTED_VOTES]
+            best = int(ranked[0])
+            results.append({
+                "letter": self.letters[best],
+                "agreement": round(float(shares[row, best]), 4),
+                "votes": {self.letters[int(label)]: round(float(shares[row, label]), 4)
+                          for label in ranked if shares[row, label] > 0},
+                "neighbors": [
+                    {"index": int(self.rows[sample]), "letter": self.letters[int(label)],
+                     "similarity": round(float(similarity), 4)}
+                    for sample, label, similarity in zip(top[row], top_labels[row], top_similarities[row])
+                ],
+                # Muestra más cercana (21 x 3, relativa a la muñeca) para mostrarla como referencia
+                "example": self.examples[top[row, 0]].reshape(21, 3).tolist(),
+            })
+        return results
+
+
+class _KnnStats:
+    def __init__(self):
+        self.queries = 0
+        self.query_s = 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        index = knn_service.index
+        return {
+            "enabled": index is not None,
+            "samples": len(index) if index is not None else 0,
+            "k": index.k if index is not None else 0,
+            "queries": self.queries,
+            "us_per_query": round(self.query_s / self.queries * 1e6, 1) if self.queries else 0.0,
+            "batcher": knn_service.batcher.summary(),
+        }
+
+
+knn_stats = _KnnStats()
+
+
+class KnnService:
+    """
+    Índice compartido por el proceso y lotes de consultas entre conexiones
+    """
+
+    def __init__(self):
+        self.index: Optional[KnnIndex] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.batcher = MicroBatcher(
+            self._query_batch, settings.KNN_BATCH_SIZE, settings.KNN_BATCH_WAIT_MS, name="knn"
+        )
+
+    def load(self, letters: List[str]) -> Optional[KnnIndex]:
+        """
+        Construir el índice una sola vez; None si no hay dataset
+        """
+        if self._loaded:
+            return self.index
+        with self._lock:
+            if not self._loaded:
+                dataset = load_dataset(letters)
+                if dataset is not None:
+                    started = time.perf_counter()
+                    self.index = KnnIndex(dataset, settings.KNN_K, settings.KNN_PROTOTYPES_PER_CLASS)
+                    logger.info(
+                        f"Índice k-NN: {len(self.index)} muestras de {len(dataset)} "
+                        f"en {(time.perf_counter() - started) * 1000:.0f}ms"
+                    )
+                self._loaded = True
+        return self.index
+
+    def query(self, features: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        Consulta síncrona de un lote (n, 63); usar fuera del event loop para lotes grandes
+        """
+        started = time.perf_counter()
+        results = self.index.query(features)
+        knn_stats.queries += len(results)
+        knn_stats.query_s += time.perf_counter() - started
+        return results
+
+    def _query_batch(self, items: List[np.ndarray]) -> List[Dict[str, Any]]:
+        return self.query(np.stack([landmarks.reshape(-1) for landmarks in items]))
+
+    async def opinion(self, landmarks: np.ndarray) -> Optional[Dict[str, Any]]:
+        """
+        Segunda opinión para un frame, agrupada con las consultas de otras conexiones
+        """
+        if self.index is None:
+            return None
+        return await self.batcher.submit(landmarks)
+
+    async def stop(self) -> None:
+        await self.batcher.stop()
+
+
+knn_service = KnnService()
+register_metrics("knn", knn_stats.summary)
@@ -0,0 +1,136 @@
+"""
+Extracción de landmarks de la mano con MediaPipe
+
+Funciones sin estado global para que puedan usarse tanto desde MLService
+como desde los procesos del pool de inferencia (cada uno con su Hands).
+
+Los landmarks se escriben directamente como float32 (el dtype del modelo)
+en un arreglo (21, 3): nuevo por frame, o una fila de un FeatureBuffer
+preasignado cuando el llamador controla cuánto vive el resultado.
+"""
+
+from typing import Optional, Union
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+LANDMARK_COUNT = 21
+FEATURE_SIZE = LANDMARK_COUNT * 3
+
+
+class FeatureBuffer:
+    """
+    Matriz float32 (filas, 63) preasignada; cada fila son los features de un frame
+
+    Las filas consecutivas ya forman el lote del modelo: features[:n] se
+    pasa a predict sin np.stack ni conversión de tipo. El contenido de una
+    fila se sobrescribe al reutilizarla.
+    """
+
+    def __init__(self, rows: int = 1):
+        self.features = np.zeros((rows, FEATURE_SIZE), dtype=np.float32)
+        self._points = self.features.reshape(rows, LANDMARK_COUNT, 3)
+
+    def row(self, index: int = 0) -> np.ndarray:
+        """
+        Vista (21, 3) de la fila index, para usar como destino de relative_landmarks
+        """
+        return self._points[index]
+
+    def batch(self, rows: int) -> np.ndarray:
+        return self.features[:rows]
+
+
+def create_hands(model_complexity: int = 1):
+    """
+    Crear un detector MediaPipe Hands configurado para una sola mano
+
+    model_complexity=0 usa el modelo de landmarks liviano (más rápido,
+    algo menos preciso); ver app.modules.ml.degradation.
+    """
+    return mp.solutions.hands.Hands(
+        max_num_hands=1,
+        model_complexity=model_complexity,
+        min_detection_confidence=0.7,
+        min_tracking_confidence=0.5
+    )
+
+
+def decode_rgb(image_data: Union[bytes, memoryview], max_side: int = 0) -> Optional[np.ndarray]:
+    """
+    Decodificar la imagen a RGB, reducida a max_side de lado mayor si max_side > 0
+
+    Los landmarks son coordenadas normalizadas, así que reducir la imagen
+    no cambia su escala.
+    """
+    # Convertir bytes a imagen (sin copiar si image_data es un memoryview)
+    nparr = np.frombuffer(image_data, np.uint8)
+    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+    if image is None:
+        return None
+    return to_rgb(image, max_side)
+
+
+def to_rgb(image: np.ndarray, max_side: int = 0) -> np.ndarray:
+    """
+    Imagen BGR ya decodificada (imdecode, VideoCapture) a RGB, reducida a max_side si max_side > 0
+    """
+    height, width = image.shape[:2]
+    if max_side and max(height, width) > max_side:
+        scale = max_side / max(height, width)
+        image = cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+    # Convertir BGR a RGB
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+def relative_landmarks(points, out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+    """
+    21 landmarks (objetos con x, y, z) relativos a la muñeca, en float32
+
+    Se escriben en out (21, 3) si se indica; si no, en un arreglo nuevo.
+    La resta de la muñeca se hace al escribir: sin arreglos intermedios.
+    """
+    if len(points) != LANDMARK_COUNT:
+        return None
+
+    landmarks = np.empty((LANDMARK_COUNT, 3), dtype=np.float32) if out is None else out
+    # Escribir por el buffer plano: sin listas ni escalares de numpy por coordenada
+    flat = memoryview(landmarks).cast("B").cast("f")
+    wrist = points[0]
+    wrist_x, wrist_y, wrist_z = wrist.x, wrist.y, wrist.z
+    index = 0
+    for lm in points:
+        # Normalizar landmarks (relativo al primer punto)
+        flat[index] = lm.x - wrist_x
+        flat[index + 1] = lm.y - wrist_y
+        flat[index + 2] = lm.z - wrist_z
+        index += 3
+    return landmarks
+
+
+def extract_landmarks(hands, image_data: Union[bytes, memoryview], max_side: int = 0,
+                      out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+    """
+    Decodificar la imagen y devolver los 21 landmarks relativos a la muñeca (en out si se indica)
+    """
+    rgb_image = decode_rgb(image_data, max_side)
+    if rgb_image is None:
+        return None
+    return landmarks_from_rgb(hands, rgb_image, out)
+
+
+def landmarks_from_rgb(hands, rgb_image: np.ndarray, out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+    """
+    Landmarks de una imagen RGB ya decodificada (p. ej. un frame de video)
+    """
+    # Procesar con MediaPipe
+    results = hands.process(rgb_image)
+
+    if results.multi_hand_landmarks:
+        # Obtener landmarks de la primera mano detectada
+        return relative_landmarks(results.multi_hand_landmarks[0].landmark, out)
+
+    return None
@@ -0,0 +1,322 @@
+"""
+Letras con movimiento (J, Z) con un modelo temporal en streaming
+
+El clasificador estático ve un frame a la vez y no distingue la J de la I
+ni la Z de la D: la diferencia es el trazo. Este módulo corre, junto al
+modelo estático, una red causal pequeña sobre los últimos frames de cada
+conexión:
+
+    Conv1D causal (k1) -> ReLU -> Conv1D causal (k2) -> ReLU
+    -> promedio de las últimas `window` salidas -> Dense softmax
+
+La entrada de cada frame son los 63 landmarks relativos a la muñeca más
+su diferencia con el frame anterior. Cada conexión guarda anillos con las
+últimas k1 entradas, las últimas k2 salidas de la primera capa y las
+últimas `window` de la segunda, más la suma de estas: un frame nuevo
+calcula una sola columna por capa y actualiza la suma, en lugar de
+recorrer otra vez la ventana. Los pasos de todas las conexiones se agrupan
+con un MicroBatcher: una multiplicación de matrices por capa y por lote.
+
+Los landmarks son relativos a la muñeca, así que el modelo ve el cambio
+de forma y la rotación de la mano, no su traslación en la imagen.
+
+El modelo se carga de MOTION_MODEL_PATH: un .npz con conv1_kernel
+(k1, 126, c1), conv1_bias, conv2_kernel (k2, c1, c2), conv2_bias,
+dense_kernel (c2, clases), dense_bias, classes (p. ej. ["J", "Z", "-"],
+"-" = ninguna) y window; o un modelo Keras (.h5/.keras) con esas capas
+(el promedio es un GlobalAveragePooling1D sobre la entrada de `window`
+frames), cuyas clases salen de MOTION_CLASSES. Las formas se validan al
+cargar: un modelo que no encaja deja la función desactivada. Sin archivo, la función queda
+desactivada.
+"""
+
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.exceptions import ModelError
+from app.core.metrics import register_metrics
+from app.modules.ml.batching import MicroBatcher
+from app.modules.ml.landmarks import FEATURE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Clase "ninguna letra con movimiento"
+REST_CLASS = "-"
+# Capas de Keras que no cambian la inferencia
+KERAS_IGNORED_LAYERS = ("InputLayer", "Dropout")
+
+
+class MotionModel:
+    """
+    Pesos de la red temporal, con las convoluciones como matrices (taps x entrada, salida)
+    """
+
+    def __init__(self, conv1_kernel: np.ndarray, conv1_bias: np.ndarray, conv2_kernel: np.ndarray,
+                 conv2_bias: np.ndarray, dense_kernel: np.ndarray, dense_bias: np.ndarray,
+                 classes: List[str], window: int):
+        if conv1_kernel.ndim != 3 or conv2_kernel.ndim != 3 or dense_kernel.ndim != 2:
+            raise ModelError("Los kernels del modelo de movimiento deben ser (k, entrada, salida) y (entrada, clases)")
+        self.k1, self.features, self.c1 = conv1_kernel.shape
+        self.k2, c1, self.c2 = conv2_kernel.shape
+        if self.features not in (FEATURE_SIZE, 2 * FEATURE_SIZE):
+            raise ModelError(f"El modelo de movimiento espera {self.features} features por frame")
+        if dense_kernel.shape[1] != len(classes) or not [c for c in classes if c != REST_CLASS]:
+            raise ModelError("Las clases no coinciden con la salida del modelo de movimiento")
+        # Cada capa tiene que encajar con la anterior: si no, cada frame fallaría en el batcher
+        expected = {
+            "conv2_kernel": (c1, self.c1), "dense_kernel": (dense_kernel.shape[0], self.c2),
+            "conv1_bias": (conv1_bias.shape, (self.c1,)), "conv2_bias": (conv2_bias.shape, (self.c2,)),
+            "dense_bias": (dense_bias.shape, (len(classes),)),
+        }
+        for name, (actual, wanted) in expected.items():
+            if actual != wanted:
+                raise ModelError(f"Forma inválida en {name} del modelo de movimiento: {actual}, se esperaba {wanted}")
+        if int(window) < 1:
+            raise ModelError("La ventana del modelo de movimiento debe ser de al menos un frame")
+        # Ventana ordenada de la más vieja a la más nueva: coincide con el kernel aplanado
+        self.w1 = np.ascontiguousarray(conv1_kernel.reshape(self.k1 * self.features, self.c1), dtype=np.float32)
+        self.b1 = conv1_bias.astype(np.float32)
+        self.w2 = np.ascontiguousarray(conv2_kernel.reshape(self.k2 * self.c1, self.c2), dtype=np.float32)
+        self.b2 = conv2_bias.astype(np.float32)
+        self.wd = dense_kernel.astype(np.float32)
+        self.bd = dense_bias.astype(np.float32)
+        self.classes = list(classes)
+        self.window = int(window)
+
+    @classmethod
+    def from_file(cls, path: str) -> "MotionModel":
+        if path.endswith((".h5", ".keras")):
+            from app.modules.ml.registry import _load_keras_model
+            return cls.from_keras(_load_keras_model(path), settings.MOTION_CLASSES.split(","))
+        with np.load(path) as weights:
+            return cls(
+                weights["conv1_kernel"], weights["conv1_bias"], weights["conv2_kernel"], weights["conv2_bias"],
+                weights["dense_kernel"], weights["dense_bias"],
+                [str(c) for c in weights["classes"]], int(weights["window"])
+            )
+
+    @classmethod
+    def from_keras(cls, model: Any, classes: List[str]) -> "MotionModel":
+        kinds = [type(layer).__name__ for layer in model.layers if type(layer).__name__ not in KERAS_IGNORED_LAYERS]
+        if kinds != ["Conv1D", "Conv1D", "GlobalAveragePooling1D", "Dense"]:
+            raise ModelError(
+                f"El modelo de movimiento debe ser Conv1D, Conv1D, GlobalAveragePooling1D y Dense; tiene {kinds}"
+            )
+        convs = [layer for layer in model.layers if type(layer).__name__ == "Conv1D"]
+        dense = [layer for layer in model.layers if type(layer).__name__ == "Dense"]
+        for layer in convs:
+            config = layer.get_config()
+            if config["padding"] != "causal" or config["activation"] != "relu" or tuple(config["dilation_rate"]) != (1,):
+                raise ModelError("Las Conv1D del modelo de movimiento deben ser causales, ReLU y sin dilatación")
+        (k1, b1), (k2, b2), (wd, bd) = convs[0].get_weights(), convs[1].get_weights(), dense[0].get_weights()
+        window = model.input_shape[1]
+        if not isinstance(window, int):
+            raise ModelError("El modelo de movimiento debe tener una ventana de frames fija")
+        return cls(k1, b1, k2, b2, wd, bd, classes, window)
+
+    def step(self, states: List["MotionState"], landmarks: np.ndarray) -> np.ndarray:
+        """
+        Avanzar un frame en cada estado; devuelve las probabilidades (lote, clases)
+        """
+        batch = len(states)
+        inputs = np.stack([state.push_input(frame) for state, frame in zip(states, landmarks)])
+        hidden = np.maximum(inputs.reshape(batch, -1) @ self.w1 + self.b1, 0.0)
+        windows = np.stack([state.push_hidden(row) for state, row in zip(states, hidden)])
+        outputs = np.maximum(windows.reshape(batch, -1) @ self.w2 + self.b2, 0.0)
+        pooled = np.stack([state.push_output(row) for state, row in zip(states, outputs)])
+        logits = pooled @ self.wd + self.bd
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        return probabilities
+
+
+class _Ring:
+    """
+    Últimas n filas en un arreglo de 2n: la ventana ordenada siempre es una vista contigua
+    """
+
+    def __init__(self, rows: int, columns: int):
+        self.rows = rows
+        self._data = np.zeros((2 * rows, columns), dtype=np.float32)
+        self._next = 0
+
+    def push(self, row: np.ndarray) -> np.ndarray:
+        self._data[self._next] = row
+        self._data[self._next + self.rows] = row
+        self._next = (self._next + 1) % self.rows
+        return self._data[self._next:self._next + self.rows]
+
+    def oldest(self) -> np.ndarray:
+        # La fila que sale de la ventana en el próximo push
+        return self._data[self._next]
+
+
+class MotionState:
+    """
+    Estado de la red temporal de una conexión
+    """
+
+    def __init__(self, model: MotionModel):
+        self.model = model
+        self.frames = 0
+        self._inputs = _Ring(model.k1, model.features)
+        self._hidden = _Ring(model.k2, model.c1)
+        self._outputs = _Ring(model.window, model.c2)
+        self._sum = np.zeros(model.c2, dtype=np.float64)
+        self._previous: Optional[np.ndarray] = None
+        self._frame = np.zeros(model.features, dtype=np.float32)
+
+    def push_input(self, landmarks: np.ndarray) -> np.ndarray:
+        positions = landmarks.reshape(FEATURE_SIZE)
+        self._frame[:FEATURE_SIZE] = positions
+        if self.model.features > FEATURE_SIZE:
+            # Velocidad: diferencia con el frame anterior (cero en el primero)
+            previous = positions if self._previous is None else self._previous
+            np.subtract(positions, previous, out=self._frame[FEATURE_SIZE:])
+        self._previous = positions.copy()
+        self.frames += 1
+        return self._inputs.push(self._frame)
+
+    def push_hidden(self, row: np.ndarray) -> np.ndarray:
+        return self._hidden.push(row)
+
+    def push_output(self, row: np.ndarray) -> np.ndarray:
+        # Promedio móvil de la ventana: sumar la columna nueva y restar la que sale
+        self._sum -= self._outputs.oldest()
+        self._sum += row
+        self._outputs.push(row)
+        return (self._sum / min(self.frames, self.model.window)).astype(np.float32)
+
+
+class _MotionStats:
+    def __init__(self):
+        self.frames = 0
+        self.detections: Dict[str, int] = {}
+
+    def summary(self) -> Dict[str, Any]:
+        model = motion_recognizer.model
+        return {
+            "enabled": model is not None,
+            "classes": model.classes if model else [],
+            "window": model.window if model else 0,
+            "frames": self.frames,
+            "detections": dict(self.detections),
+            "batcher": motion_recognizer.batcher.summary(),
+        }
+
+
+motion_stats = _MotionStats()
+
+
+class MotionRecognizer:
+    """
+    Modelo temporal compartido y lotes entre conexiones
+    """
+
+    def __init__(self):
+        self.model: Optional[MotionModel] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.batcher = MicroBatcher(
+            self._step_batch, settings.MOTION_BATCH_SIZE, settings.MOTION_BATCH_WAIT_MS, name="motion"
+        )
+
+    def load(self) -> Optional[MotionModel]:
+        """
+        Cargar MOTION_MODEL_PATH una sola vez; None si no existe
+        """
+        if self._loaded:
+            return self.model
+        with self._lock:
+            if not self._loaded:
+                path = settings.MOTION_MODEL_PATH
+                if os.path.exists(path):
+                    try:
+                        self.model = MotionModel.from_file(path)
+                        logger.info(f"Modelo de movimiento cargado: {self.model.classes}, ventana {self.model.window}")
+                    except Exception as e:
+                        logger.error(f"Error cargando el modelo de movimiento: {str(e)}")
+                else:
+                    logger.info(f"Sin modelo de movimiento en {path}: J y Z desactivadas")
+                self._loaded = True
+        return self.model
+
+    @property
+    def letters(self) -> List[str]:
+        """
+        Letras que agrega el modelo temporal al alfabeto del estático
+        """
+        return [c for c in self.model.classes if c != REST_CLASS] if self.model else []
+
+    def tracker(self) -> Optional["MotionTracker"]:
+        return MotionTracker(self) if self.model is not None else None
+
+    def _step_batch(self, items: List[Tuple[MotionState, np.ndarray]]) -> List[np.ndarray]:
+        probabilities = self.model.step([state for state, _ in items], np.stack([lm for _, lm in items]))
+        motion_stats.frames += len(items)
+        return list(probabilities)
+
+    async def stop(self) -> None:
+        await self.batcher.stop()
+
+
+class MotionTracker:
+    """
+    Estado de una conexión; push() se llama con los frames en orden de llegada
+    """
+
+    def __init__(self, recognizer: MotionRecognizer):
+        self.recognizer = recognizer
+        self.model = recognizer.model
+        self.state = MotionState(self.model)
+        self._letters = [(index, c) for index, c in enumerate(self.model.classes) if c != REST_CLASS]
+        self._rest = self.model.classes.index(REST_CLASS) if REST_CLASS in self.model.classes else None
+
+    def reset(self) -> None:
+        """
+        Mano fuera de cuadro: el trazo siguiente empieza de cero
+        """
+        if self.state.frames:
+            self.state = MotionState(self.model)
+
+    async def push(self, landmarks: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Probabilidades por clase con este frame, o None mientras la ventana tenga pocos frames
+        """
+        probabilities = await self.recognizer.batcher.submit((self.state, landmarks))
+        if self.state.frames < min(settings.MOTION_MIN_FRAMES, self.model.window):
+            return None
+        return probabilities
+
+    def detect(self, probabilities: np.ndarray) -> Optional[Tuple[str, float]]:
+        """
+        (letra, confianza) si una letra con movimiento supera MOTION_CONFIDENCE_THRESHOLD
+        """
+        index, letter = max(self._letters, key=lambda item: probabilities[item[0]])
+        confidence = float(probabilities[index])
+        if confidence < settings.MOTION_CONFIDENCE_THRESHOLD:
+            return None
+        motion_stats.detections[letter] = motion_stats.detections.get(letter, 0) + 1
+        return letter, confidence
+
+    def combine(self, static: np.ndarray, probabilities: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Vector sobre letras estáticas + letras con movimiento (para el decodificador de palabras)
+        """
+        dynamic = np.zeros(len(self._letters), dtype=np.float32)
+        if probabilities is None:
+            return np.concatenate([static, dynamic])
+        for column, (index, _) in enumerate(self._letters):
+            dynamic[column] = probabilities[index]
+        rest = float(probabilities[self._rest]) if self._rest is not None else 1.0 - float(dynamic.sum())
+        return np.concatenate([static * rest, dynamic])
+
+
+motion_recognizer = MotionRecognizer()
+register_metrics("motion", motion_stats.summary)
@@ -0,0 +1,117 @@
+"""
+Pipeline ordenado de frames por conexión
+
+Separa la recepción, el análisis y la entrega de los frames de una
+conexión WebSocket: mientras se recibe el frame N+1 el frame N se analiza
+(landmarks + modelo) y el N-1 se persiste y responde. Como máximo `depth`
+frames están en vuelo; si se llega al límite, submit() espera y la
+recepción deja de leer del socket. Los resultados se entregan siempre en
+el orden en que llegaron los frames.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Generic, Optional, Set, TypeVar
+
+from app.core.metrics import register_metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class _PipelineStats:
+    def __init__(self):
+        self.connections = 0
+        self.frames = 0
+        self.peak_in_flight = 0
+        # Frames entregados que ya estaban listos mientras se entregaba el anterior
+        self.overlapped = 0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "connections": self.connections,
+            "frames": self.frames,
+            "peak_in_flight": self.peak_in_flight,
+            "overlapped_frames": self.overlapped,
+        }
+
+
+pipeline_stats = _PipelineStats()
+register_metrics("ws_pipeline", pipeline_stats.summary)
+
+
+class OrderedPipeline(Generic[T, R]):
+    """
+    process(item) corre concurrente; deliver(item, resultado, error) en orden de llegada
+    """
+
+    def __init__(self, process: Callable[[T], Awaitable[R]],
+                 deliver: Callable[[T, Optional[R], Optional[BaseException]], Awaitable[None]],
+                 depth: int):
+        self.process = process
+        self.deliver = deliver
+        self.depth = max(1, depth)
+        self._slots = asyncio.Semaphore(self.depth)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: Set[asyncio.Task] = set()
+        self._deliverer: Optional[asyncio.Task] = None
+        self.in_flight = 0
+
+    def start(self) -> None:
+        pipeline_stats.connections += 1
+        self._deliverer = asyncio.get_running_loop().create_task(self._deliver_loop())
+
+    async def submit(self, item: T) -> None:
+        """
+        Encolar un elemento; espera si ya hay `depth` en vuelo
+        """
+        await self._slots.acquire()
+        self.in_flight += 1
+        pipeline_stats.peak_in_flight = max(pipeline_stats.peak_in_flight, self.in_flight)
+
+        task = asyncio.get_running_loop().create_task(self.process(item))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self._queue.put_nowait((item, task))
+
+    async def _deliver_loop(self) -> None:
+        while True:
+            item, task = await self._queue.get()
+            if task.done():
+                pipeline_stats.overlapped += 1
+            try:
+                result, error = await task, None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                result, error = None, e
+
+            try:
+                await self.deliver(item, result, error)
+            except Exception as e:
+                logger.error(f"Error entregando resultado del pipeline: {str(e)}")
+            finally:
+                pipeline_stats.frames += 1
+                self.in_flight -= 1
+                self._slots.release()
+
+    async def close(self) -> None:
+        """
+        Cancelar lo que queda en vuelo (la conexión ya no puede recibirlo)
+        """
+        for task in list(self._tasks):
+            task.cancel()
+        if self._deliverer is not None:
+            self._deliverer.cancel()
+            try:
+                await self._deliverer
+            except asyncio.CancelledError:
+                pass
+            self._deliverer = None
+        # Marcar como leídos los errores de lo que ya no se va a entregar
+        while not self._queue.empty():
+            _, task = self._queue.get_nowait()
+            if task.done() and not task.cancelled():
+                task.exception()
@@ -0,0 +1,325 @@
+"""
+Pool de procesos de inferencia con transporte de frames por memoria compartida
+
+Cada proceso tiene su propio MediaPipe Hands y su propia copia del modelo,
+así que la decodificación, MediaPipe y la inferencia escalan con los
+núcleos en lugar de competir por el GIL del worker de uvicorn.
+
+Cada proceso tiene un anillo de slots en multiprocessing.shared_memory:
+el proceso principal copia la imagen en un slot libre y envía solo
+(job, slot, longitud, versión) por la cola de tareas; el proceso la lee
+directamente del slot sin deserializar bytes. Los resultados (landmarks
+y predicción, unos cientos de bytes) vuelven por una cola compartida.
+Los frames que no caben en un slot viajan en línea por la cola.
+"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing as mp
+import threading
+import time
+from collections import deque
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.exceptions import ModelError
+from app.core.metrics import register_metrics
+from app.modules.ml.degradation import QualityTier
+from app.modules.ml.registry import ModelVersion
+
+logger = logging.getLogger(__name__)
+
+# Modelos cargados por proceso (activo + anterior, para swaps y rollbacks)
+WORKER_MODEL_CACHE = 2
+
+
+# ==============================================
+# 🧠 PROCESO DE INFERENCIA
+# ==============================================
+
+def _worker_main(index: int, shm_name: str, slot_bytes: int, letters: List[str],
+                 tasks, results) -> None:
+    """
+    Bucle de un proceso del pool: leer frames del anillo y responder por la cola
+    """
+    # Importar aquí: solo los procesos hijos necesitan MediaPipe y TensorFlow
+    from app.modules.ml.landmarks import FeatureBuffer, create_hands, extract_landmarks
+    from app.modules.ml.registry import _load_keras_model, decode_prediction
+
+    shm = SharedMemory(name=shm_name)
+    # Un detector por model_complexity (escalones de calidad, ver degradation)
+    hands_by_complexity: Dict[int, Any] = {}
+    models: Dict[str, Any] = {}
+    # Features del frame en curso: se reescriben en cada frame (el resultado viaja serializado)
+    buffer = FeatureBuffer(1)
+
+    def get_hands(model_complexity: int):
+        hands = hands_by_complexity.get(model_complexity)
+        if hands is None:
+            hands = hands_by_complexity[model_complexity] = create_hands(model_complexity)
+        return hands
+
+    def get_model(key: str, file_path: str):
+        model = models.get(key)
+        if model is None:
+            model = _load_keras_model(file_path)
+            model.predict(np.zeros((1, 63), dtype=np.float32), verbose=0)  # warm-up
+            models[key] = model
+            while len(models) > WORKER_MODEL_CACHE:
+                models.pop(next(iter(models)))
+        return model
+
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+
+            if task[0] == "load":
+                _, key, file_path = task
+                try:
+                    get_model(key, file_path)
+                except Exception as e:
+                    print(f"⚠️  Worker {index}: error cargando modelo {file_path}: {e}")
+                continue
+
+            _, job_id, slot, length, inline, model, (model_complexity, max_side) = task
+            try:
+                hands = get_hands(model_complexity)
+                if inline is not None:
+                    landmarks = extract_landmarks(hands, inline, max_side, buffer.row())
+                else:
+                    offset = slot * slot_bytes
+                    frame = shm.buf[offset:offset + length]
+                    try:
+                        landmarks = extract_landmarks(hands, frame, max_side, buffer.row())
+                    finally:
+                        frame.release()
+
+                prediction = None
+                if landmarks is not None and model is not None:
+                    key, file_path, threshold = model
+                    started = time.perf_counter()
+                    output = get_model(key, file_path).predict(buffer.batch(1), verbose=0)
+                    letter, confidence, status = decode_prediction(output, letters, threshold)
+                    prediction = {
+                        "letter": letter,
+                        "confidence": confidence,
+                        "processing_time_ms": (time.perf_counter() - started) * 1000,
+                        "status": status,
+                        "probabilities": output[0, :len(letters)],
+                    }
+                results.put((job_id, index, slot, landmarks, prediction, None))
+            except Exception as e:
+                results.put((job_id, index, slot, None, None, f"{type(e).__name__}: {e}"))
+    finally:
+        shm.close()
+
+
+# ==============================================
+# 🔀 POOL
+# ==============================================
+
+class _Worker:
+    """
+    Estado en el proceso principal de un proceso del pool
+    """
+
+    def __init__(self, index: int, slots: int, slot_bytes: int):
+        self.index = index
+        self.shm = SharedMemory(create=True, size=slots * slot_bytes)
+        self.free: Deque[int] = deque(range(slots))
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.process: Optional[mp.Process] = None
+        self.tasks = None
+        self.completed = 0
+
+
+class InferencePool:
+    """
+    Procesos de inferencia con un anillo de memoria compartida por proceso
+    """
+
+    def __init__(self, workers: int, letters: List[str],
+                 slots: int = None, slot_bytes: int = None):
+        self.size = max(1, workers)
+        self.letters = list(letters)
+        self.slots = slots or settings.INFERENCE_RING_SLOTS
+        self.slot_bytes = slot_bytes or settings.INFERENCE_SLOT_BYTES
+        self._ctx = mp.get_context("spawn")  # Sin heredar el estado de TensorFlow del padre
+        self._workers: List[_Worker] = []
+        self._results = None
+        self._reader: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots_available: Optional[asyncio.Semaphore] = None
+        self._job_ids = itertools.count()
+        self.inline_frames = 0
+        self.restarts = 0
+
+    def start(self, preload: Optional[ModelVersion] = None) -> None:
+        """
+        Crear los procesos y los anillos; debe llamarse desde el event loop
+        """
+        self._loop = asyncio.get_running_loop()
+        self._slots_available = asyncio.Semaphore(self.size * self.slots)
+        self._results = self._ctx.SimpleQueue()
+
+        for index in range(self.size):
+            worker = _Worker(index, self.slots, self.slot_bytes)
+            self._workers.append(worker)
+            self._spawn(worker)
+
+        if preload is not None:
+            self.preload(preload)
+
+        self._reader = threading.Thread(target=self._read_results, name="inference-results", daemon=True)
+        self._reader.start()
+        logger.info(f"Pool de inferencia iniciado: {self.size} procesos x {self.slots} slots")
+
+    def _spawn(self, worker: _Worker) -> None:
+        worker.tasks = self._ctx.SimpleQueue()
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.index, worker.shm.name, self.slot_bytes, self.letters,
+                  worker.tasks, self._results),
+            name=f"inference-{worker.index}",
+            daemon=True,
+        )
+        worker.process.start()
+
+    def preload(self, version: ModelVersion) -> None:
+        """
+        Cargar una versión en todos los procesos antes de que lleguen sus frames
+        """
+        for worker in self._workers:
+            worker.tasks.put(("load", self._model_key(version), version.spec.file_path))
+
+    @staticmethod
+    def _model_key(version: ModelVersion) -> str:
+        return f"{version.id}:{version.version}"
+
+    def stop(self) -> None:
+        for worker in self._workers:
+            if worker.process and worker.process.is_alive():
+                worker.tasks.put(None)
+        for worker in self._workers:
+            if worker.process:
+                worker.process.join(timeout=5)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+            worker.shm.close()
+            worker.shm.unlink()
+        if self._results is not None:
+            self._results.put(None)
+        self._workers = []
+
+    async def analyze(self, image_data: bytes, version: Optional[ModelVersion],
+                      tier: Optional[QualityTier] = None) -> Tuple[Optional[np.ndarray], Optional[Dict[str, Any]]]:
+        """
+        Extraer landmarks y predecir en un proceso del pool.
+
+        Devuelve (landmarks, predicción); la predicción es None si no hay
+        mano o no hay versión de modelo.
+        """
+        quality = (tier.model_complexity, tier.max_side) if tier is not None else (1, 0)
+        await self._slots_available.acquire()
+
+        # El proceso con más slots libres es el menos cargado
+        worker = max(self._workers, key=lambda w: len(w.free))
+        slot = worker.free.popleft()
+        length = len(image_data)
+        inline = None
+        if length <= self.slot_bytes:
+            offset = slot * self.slot_bytes
+            worker.shm.buf[offset:offset + length] = image_data
+        else:
+            inline = bytes(image_data)  # Va por la cola (pickle): sin memoryview
+            self.inline_frames += 1
+
+        model = None
+        if version is not None:
+            model = (self._model_key(version), version.spec.file_path, version.spec.confidence_threshold)
+
+        job_id = next(self._job_ids)
+        future = self._loop.create_future()
+        worker.pending[job_id] = future
+        worker.tasks.put(("frame", job_id, slot, length, inline, model, quality))
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), settings.INFERENCE_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            future.cancel()  # El slot se libera cuando llegue (o se descarte) el resultado
+            self._check_workers()
+            raise ModelError("Tiempo de inferencia agotado")
+
+    def _read_results(self) -> None:
+        while True:
+            message = self._results.get()
+            if message is None:
+                break
+            self._loop.call_soon_threadsafe(self._resolve, message)
+
+    def _resolve(self, message) -> None:
+        job_id, index, slot, landmarks, prediction, error = message
+        worker = self._workers[index] if index < len(self._workers) else None
+        if worker is None:
+            return
+        future = worker.pending.pop(job_id, None)
+        if future is None:
+            return  # Job descartado al reiniciar el proceso
+
+        worker.free.append(slot)
+        worker.completed += 1
+        self._slots_available.release()
+        if future.done():
+            return
+        if error:
+            future.set_exception(ModelError(f"Error en proceso de inferencia: {error}"))
+        else:
+            future.set_result((landmarks, prediction))
+
+    def _check_workers(self) -> None:
+        """
+        Reiniciar procesos caídos y fallar sus frames pendientes
+        """
+        for worker in self._workers:
+            if worker.process.is_alive():
+                continue
+
+            logger.error(f"Proceso de inferencia {worker.index} terminó (código {worker.process.exitcode}); reiniciando")
+            for future in worker.pending.values():
+                self._slots_available.release()
+                if not future.done():
+                    future.set_exception(ModelError("Proceso de inferencia reiniciado"))
+            worker.pending.clear()
+            worker.free = deque(range(self.slots))
+            self.restarts += 1
+            self._spawn(worker)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "processes": self.size,
+            "slots_per_process": self.slots,
+            "slot_bytes": self.slot_bytes,
+            "inline_frames": self.inline_frames,
+            "restarts": self.restarts,
+            "workers": [
+                {
+                    "pid": w.process.pid if w.process else None,
+                    "alive": bool(w.process and w.process.is_alive()),
+                    "pending": len(w.pending),
+                    "completed": w.completed,
+                }
+                for w in self._workers
+            ],
+        }
+
+
+def create_inference_pool(letters: List[str]) -> InferencePool:
+    pool = InferencePool(settings.INFERENCE_WORKERS or mp.cpu_count(), letters)
+    register_metrics("inference_pool", pool.summary)
+    return pool
@@ -0,0 +1,309 @@
+"""
+Registro de versiones del modelo con recarga en caliente
+
+Cada versión se carga y se calienta (inferencias con entradas vacías) fuera
+del event loop antes de quedar disponible. La activación solo cambia la
+referencia a la versión activa: los frames nuevos usan la versión nueva y
+los que ya tomaron la anterior terminan con ella. Las versiones previas
+permanecen cargadas (hasta MODEL_REGISTRY_KEEP) para permitir rollback
+inmediato.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.exceptions import ModelError, ValidationError
+from app.core.metrics import register_metrics
+from app.modules.ml.schemas import MLModelCreate
+
+logger = logging.getLogger(__name__)
+
+# 21 landmarks x 3 coordenadas
+FEATURE_SIZE = 63
+
+# Latencias recientes por versión usadas para los percentiles
+LATENCY_WINDOW = 1000
+
+
+def decode_prediction(prediction: np.ndarray, letters: List[str],
+                      confidence_threshold: float) -> Tuple[str, float, str]:
+    """
+    Convertir la salida del modelo en (letra, confianza, estado)
+    """
+    predicted_class = int(np.argmax(prediction, axis=1)[0])
+    confidence = float(np.max(prediction))
+
+    # Verificar umbral de confianza y que la predicción esté en rango
+    if confidence < confidence_threshold:
+        return "", confidence, "low_confidence"
+    if predicted_class >= len(letters):
+        return "", confidence, "out_of_range"
+    return letters[predicted_class], confidence, "success"
+
+
+class ModelVersion:
+    """
+    Una versión cargada del modelo con sus contadores de uso
+    """
+
+    def __init__(self, id: int, spec: MLModelCreate, model: Any):
+        self.id = id
+        self.spec = spec
+        self.model = model
+        self.created_at = datetime.now()
+        self.activated_at: Optional[datetime] = None
+
+        self.in_flight = 0
+        self.predictions = 0
+        self.total_ms = 0.0
+        self.latencies_ms: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.labeled = 0
+        self.correct = 0
+
+    @property
+    def version(self) -> str:
+        return self.spec.version
+
+    def decode(self, prediction: np.ndarray, letters: List[str]) -> Tuple[str, float, str]:
+        return decode_prediction(prediction, letters, self.spec.confidence_threshold)
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies_ms)
+        return {
+            "in_flight": self.in_flight,
+            "predictions": self.predictions,
+            "avg_ms": round(self.total_ms / self.predictions, 3) if self.predictions else 0.0,
+            "p50_ms": round(latencies[len(latencies) // 2], 3) if latencies else 0.0,
+            "p95_ms": round(latencies[int(len(latencies) * 0.95)], 3) if latencies else 0.0,
+            "labeled": self.labeled,
+            "correct": self.correct,
+            "accuracy": round(self.correct / self.labeled, 4) if self.labeled else None,
+        }
+
+    def to_dict(self, is_active: bool) -> Dict[str, Any]:
+        """
+        Representación compatible con MLModelResponse
+        """
+        return {
+            "id": self.id,
+            "name": self.spec.name,
+            "version": self.spec.version,
+            "file_path": self.spec.file_path,
+            "accuracy": self.spec.accuracy,
+            "confidence_threshold": self.spec.confidence_threshold,
+            "language": self.spec.language,
+            "is_active": is_active,
+            "description": self.spec.description,
+            "created_at": self.created_at,
+            "updated_at": self.activated_at,
+        }
+
+
+class ModelRegistry:
+    """
+    Versiones cargadas del modelo y referencia a la versión activa
+    """
+
+    def __init__(self, loader: Callable[[str], Any]):
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._versions: Dict[str, ModelVersion] = {}
+        self._active: Optional[ModelVersion] = None
+        # Versiones activadas anteriormente, la más reciente al final
+        self._history: List[str] = []
+        self._loading: set = set()
+        self._next_id = 1
+        self._listeners: List[Callable[[ModelVersion], None]] = []
+
+    @property
+    def active(self) -> Optional[ModelVersion]:
+        return self._active
+
+    def add_listener(self, listener: Callable[[ModelVersion], None]) -> None:
+        """
+        Registrar una función llamada con la versión nueva en cada activación o rollback
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, version: ModelVersion) -> None:
+        for listener in self._listeners:
+            try:
+                listener(version)
+            except Exception as e:
+                logger.error(f"Error notificando activación de v{version.version}: {str(e)}")
+
+    def get(self, version: str) -> ModelVersion:
+        with self._lock:
+            found = self._versions.get(version)
+        if found is None:
+            raise ValidationError(f"La versión {version} no está cargada")
+        return found
+
+    def load(self, spec: MLModelCreate, activate: bool = True) -> ModelVersion:
+        """
+        Cargar y calentar una versión; opcionalmente activarla.
+
+        Bloquea el hilo que lo invoca (debe ejecutarse fuera del event loop).
+        """
+        with self._lock:
+            if spec.version in self._versions or spec.version in self._loading:
+                raise ValidationError(f"La versión {spec.version} ya está registrada")
+            self._loading.add(spec.version)
+
+        try:
+            started = time.perf_counter()
+            try:
+                model = self._loader(spec.file_path)
+            except Exception as e:
+                raise ModelError(f"Error cargando modelo {spec.file_path}: {str(e)}")
+            self._warm_up(model)
+            logger.info(
+                f"Modelo {spec.name} v{spec.version} cargado y calentado en "
+                f"{(time.perf_counter() - started) * 1000:.0f} ms"
+            )
+
+            with self._lock:
+                version = ModelVersion(self._next_id, spec, model)
+                self._next_id += 1
+                self._versions[spec.version] = version
+        finally:
+            with self._lock:
+                self._loading.discard(spec.version)
+
+        if activate:
+            self.activate(spec.version)
+        return version
+
+    def _warm_up(self, model: Any) -> None:
+        """
+        Ejecutar inferencias de prueba para inicializar el grafo antes del swap
+        """
+        dummy = np.zeros((1, FEATURE_SIZE), dtype=np.float32)
+        for _ in range(max(1, settings.MODEL_WARMUP_RUNS)):
+            try:
+                output = model.predict(dummy, verbose=0)
+            except Exception as e:
+                raise ModelError(f"Error en warm-up del modelo: {str(e)}")
+
+        if np.ndim(output) != 2 or np.shape(output)[0] != 1:
+            raise ModelError(f"Salida inesperada del modelo: {np.shape(output)}")
+
+    def activate(self, version: str) -> ModelVersion:
+        """
+        Activar una versión cargada para los frames nuevos
+        """
+        with self._lock:
+            target = self._versions.get(version)
+            if target is None:
+                raise ValidationError(f"La versión {version} no está cargada")
+            if target is self._active:
+                return target
+
+            if self._active is not None:
+                self._history.append(self._active.version)
+            target.activated_at = datetime.now()
+            self._active = target
+            self._evict_locked()
+
+        logger.info(f"Modelo activo: v{version}")
+        self._notify(target)
+        return target
+
+    def rollback(self) -> ModelVersion:
+        """
+        Volver a la versión activada anteriormente
+        """
+        with self._lock:
+            while self._history and self._history[-1] not in self._versions:
+                self._history.pop()
+            if not self._history:
+                raise ValidationError("No hay una versión anterior para rollback")
+
+            previous = self._versions[self._history.pop()]
+            previous.activated_at = datetime.now()
+            self._active = previous
+
+        logger.info(f"Rollback del modelo a v{previous.version}")
+        self._notify(previous)
+        return previous
+
+    def _evict_locked(self) -> None:
+        """
+        Descargar las versiones inactivas más antiguas por encima de MODEL_REGISTRY_KEEP
+        """
+        keep = max(2, settings.MODEL_REGISTRY_KEEP)
+        for version in list(self._versions):
+            if len(self._versions) <= keep:
+                break
+            candidate = self._versions[version]
+            if candidate is self._active or candidate.in_flight:
+                continue
+            del self._versions[version]
+            logger.info(f"Modelo v{version} descargado del registro")
+
+    @contextmanager
+    def acquire(self, required: bool = True) -> Iterator[Optional[ModelVersion]]:
+        """
+        Tomar la versión activa durante una inferencia.
+
+        Un swap concurrente no afecta a quien ya la tomó. Con required=False
+        devuelve None si no hay modelo en lugar de fallar.
+        """
+        with self._lock:
+            version = self._active
+            if version is None:
+                if required:
+                    raise ModelError("Modelo no cargado")
+            else:
+                version.in_flight += 1
+        try:
+            yield version
+        finally:
+            if version is not None:
+                with self._lock:
+                    version.in_flight -= 1
+
+    def record(self, version: ModelVersion, elapsed_ms: float,
+               predicted: str, target: Optional[str] = None) -> None:
+        """
+        Registrar la latencia de una predicción y, si hay etiqueta, su acierto
+        """
+        with self._lock:
+            version.predictions += 1
+            version.total_ms += elapsed_ms
+            version.latencies_ms.append(elapsed_ms)
+            if target:
+                version.labeled += 1
+                if predicted == target.upper():
+                    version.correct += 1
+
+    def list_versions(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [v.to_dict(v is self._active) for v in self._versions.values()]
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "active_version": self._active.version if self._active else None,
+                "loaded_versions": len(self._versions),
+                "rollback_available": any(v in self._versions for v in self._history),
+                "versions": {v.version: v.stats() for v in self._versions.values()},
+            }
+
+
+def _load_keras_model(path: str) -> Any:
+    from tensorflow.keras.models import load_model
+    return load_model(path)
+
+
+# Instancia global del registro
+model_registry = ModelRegistry(_load_keras_model)
+register_metrics("models", model_registry.summary)
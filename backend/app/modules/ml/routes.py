@@ -2,11 +2,18 @@
 Rutas del módulo ML
 """
 
+import asyncio
 import base64
-import json
+import itertools
+import logging
+import math
+import time
 import uuid
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, WebSocket
+from typing import List, Optional, Tuple
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi import WebSocketDisconnect  # añadido para manejar desconexiones
 from websockets.exceptions import ConnectionClosedError  # añadido para manejar errores de conexión
 
@@ -24,7 +31,25 @@ def validate_uuid(uuid_string: str) -> str:
 
 from app.core.supabase import get_supabase_service as get_supabase_service_import
 from app.core.config import settings
-from app.modules.ml.services import ml_service, tutorial_service, practice_service
+from app.core.exceptions import (
+    DeadlineExceededError, PayloadTooLargeError, UnsupportedMediaError, ValidationError
+)
+from app.core.db_metrics import track_queries, db_metrics
+from app.core.serialization import JSONDecodeError, dumps_text, loads
+from app.modules.ml.admission import AdmissionTicket, admission_controller
+from app.modules.ml.batch_predict import (
+    NDJSONResponse, multipart_images, ndjson_lines, parse_landmark_items,
+    stream_image_results, stream_landmark_results, zip_images
+)
+from app.modules.ml.gating import FrameGate, gate_stats
+from app.modules.ml.knn import knn_service
+from app.modules.ml.motion import MotionTracker, motion_recognizer
+from app.modules.ml.pipeline import OrderedPipeline
+from app.modules.ml.scheduler import PRIORITY_UPLOAD
+from app.modules.ml.services import ml_service, parse_target_letter, tutorial_service, practice_service
+from app.modules.ml.upload import read_body, read_image_upload, upload_buffers
+from app.modules.ml.video import discard_video, open_video, save_video_upload, stream_video_segments
+from app.modules.ml.words import WordDecoder, load_lexicon
 from app.modules.ml.schemas import (
     PredictionRequest, PredictionResponse, ModelInfoResponse,
     TutorialStepResponse, TutorialOverviewResponse,
@@ -34,12 +59,13 @@ from app.modules.ml.schemas import (
 )
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # Helper function para envío seguro de WebSocket
 async def safe_websocket_send(websocket: WebSocket, data: dict) -> bool:
     """Envía datos por WebSocket de forma segura, manejando desconexiones"""
     try:
-        await websocket.send_json(data)  # 🔧 CORREGIDO: era self-recursive
+        await websocket.send_text(dumps_text(data))  # orjson (ver app.core.serialization)
         return True
     except (WebSocketDisconnect, ConnectionClosedError, RuntimeError) as e:
         print(f"🔌 WebSocket desconectado durante envío: {type(e).__name__}: {e}")
@@ -48,6 +74,33 @@ async def safe_websocket_send(websocket: WebSocket, data: dict) -> bool:
         print(f"❌ Error inesperado en WebSocket: {type(e).__name__}: {e}")
         return False
 
+def busy_message(reason: str, retry_after_s: float, session_id: str) -> dict:
+    """
+    Mensaje "busy": el servidor no acepta más trabajo de este cliente por ahora
+    """
+    return {
+        "type": "busy",
+        "reason": reason,
+        "retry_after_ms": int(math.ceil(retry_after_s * 1000)),
+        "session_id": session_id
+    }
+
+def decode_image_payload(b64_image: str) -> bytes:
+    """
+    Decodificar la imagen de un mensaje "frame" (data URL o base64 plano)
+    """
+    # Remover encabezado data URL si existe
+    if b64_image.startswith("data:"):
+        parts = b64_image.split(",", 1)
+        if len(parts) != 2:
+            raise ValidationError("Formato data URL inválido")
+        b64_image = parts[1]
+
+    try:
+        return base64.b64decode(b64_image)
+    except Exception:
+        raise ValidationError("Imagen base64 inválida")
+
 # Función para obtener el servicio Supabase
 def get_supabase_service():
     """Obtener servicio Supabase"""
@@ -88,6 +141,223 @@ async def get_model_info():
         raise HTTPException(status_code=500, detail=f"Error obteniendo información del modelo: {str(e)}")
 
 
+class FrameJob:
+    """
+    Frame de una conexión en el pipeline (ver app.modules.ml.pipeline)
+    """
+
+    def __init__(self, seq: int, payload: dict):
+        self.seq = seq
+        self.payload = payload
+
+
+async def analyze_frame_message(session_id: str, payload: dict, stream_id: str = None,
+                                gate: Optional[FrameGate] = None) -> Tuple[dict, Optional[dict]]:
+    """
+    Procesar un mensaje "frame": decodificar y predecir
+
+    Devuelve (respuesta para el cliente, datos a persistir o None).
+    stream_id identifica la conexión (estado de MediaPipe por conexión);
+    con gate, los frames duplicados o sin movimiento reutilizan el resultado anterior.
+    """
+    # Obtener imagen base64
+    b64_image = payload.get("image")
+    if not b64_image:
+        return {
+            "type": "error",
+            "error": "Campo 'image' requerido",
+            "session_id": session_id
+        }, None
+
+    # Decodificar (data URL o base64 plano)
+    try:
+        image_data = decode_image_payload(b64_image)
+    except ValidationError as e:
+        return {
+            "type": "error",
+            "error": e.message,
+            "session_id": session_id
+        }, None
+
+    # Una sola letra; cualquier otro valor se ignora (no llega al registro, al sidecar ni al filtro)
+    target = parse_target_letter(payload.get("target"))
+    if gate is None:
+        return await predict_frame_message(session_id, image_data, target, stream_id)
+
+    # Filtro previo a la decodificación: reutilizar el resultado del frame de referencia
+    reason = gate.check(image_data, target)
+    if reason is not None:
+        reference = await asyncio.shield(gate.reference)
+        if reference is not None:
+            gate_stats.observe_skip(reason)
+            return dict(reference, reused=True, skip_reason=reason, session_id=session_id), None
+
+    # Este frame es la nueva referencia de la conexión
+    reference = asyncio.get_running_loop().create_future()
+    gate.reference = reference
+    message = None
+    started = time.perf_counter()
+    try:
+        message, record = await predict_frame_message(session_id, image_data, target, stream_id)
+        gate_stats.observe_analysis((time.perf_counter() - started) * 1000)
+        return message, record
+    finally:
+        reusable = message is not None and message["type"] == "prediction"
+        reference.set_result(dict(message) if reusable else None)
+        if not reusable and gate.reference is reference:
+            gate.invalidate()
+
+
+async def predict_frame_message(session_id: str, image_data: bytes, target: Optional[str],
+                                stream_id: Optional[str]) -> Tuple[dict, Optional[dict]]:
+    """
+    Landmarks y predicción de un frame ya decodificado de base64
+    """
+    # Procesar landmarks y predecir ("target" opcional: letra esperada, alimenta la precisión por versión)
+    try:
+        landmarks, result = await ml_service.analyze_frame(
+            image_data, target_letter=target, stream_id=stream_id
+        )
+    except DeadlineExceededError:
+        # El frame esperó más que su plazo: el cliente ya envió uno más reciente
+        return busy_message("deadline_exceeded", 0, session_id), None
+
+    if landmarks is None:
+        # Sin mano: se guarda como intento fallido
+        return {
+            "type": "prediction",
+            "letter": "",
+            "confidence": 0.0,
+            "processing_time_ms": 0.0,
+            "status": "no_hand_detected",
+            "landmarks_detected": False,
+            "quality_tier": ml_service.quality.current.name,
+            "session_id": session_id
+        }, {
+            "prediction_data": {
+                "predicted_letter": "",
+                "status": "no_hand_detected",
+                "processing_time_ms": 0.0,
+                "landmarks_data": []
+            },
+            "confidence": 0.0
+        }
+
+    message = {
+        "type": "prediction",
+        "letter": result["letter"],
+        "confidence": result["confidence"],
+        "processing_time_ms": result["processing_time_ms"],
+        "status": result["status"],
+        "landmarks_detected": True,
+        "model_version": result["model_version"],
+        "quality_tier": ml_service.quality.current.name,
+        "session_id": session_id,
+        # Para el decodificador de palabras y el modelo de movimiento; se quitan antes de enviar
+        "probabilities": result.get("probabilities"),
+        "landmarks": landmarks
+    }
+    if result["status"] == "low_confidence":
+        # Sin letra del modelo: voto de las muestras de entrenamiento más parecidas
+        second_opinion = await knn_service.opinion(landmarks)
+        if second_opinion is not None:
+            message["second_opinion"] = second_opinion
+    if target:
+        # Tutorial / práctica: qué dedo se aleja de la plantilla de la letra esperada
+        feedback = tutorial_service.finger_feedback(target, landmarks)
+        if feedback is not None:
+            message["finger_feedback"] = feedback
+    return message, {
+        "prediction_data": {
+            "predicted_letter": result["letter"],
+            "status": result["status"],
+            "processing_time_ms": result["processing_time_ms"],
+            "landmarks_data": landmarks.tolist()
+        },
+        "confidence": result["confidence"]
+    }
+
+
+async def deliver_frame_result(websocket: WebSocket, session_id: str, job: FrameJob,
+                               outcome: Optional[Tuple[dict, Optional[dict]]],
+                               error: Optional[BaseException], decoder: Optional[WordDecoder] = None,
+                               tracker: Optional[MotionTracker] = None) -> None:
+    """
+    Persistir y responder un frame analizado (en orden de llegada)
+
+    Con tracker, los landmarks avanzan el modelo de movimiento de la
+    conexión, que puede reemplazar la letra por J o Z. Con decoder, el frame
+    alimenta la palabra en curso y, si esta cambió, se envía además un
+    mensaje "word" con las hipótesis.
+    """
+    if error is not None:
+        message, record = {
+            "type": "error",
+            "error": f"Error interno: {str(error)}",
+            "session_id": session_id
+        }, None
+    else:
+        message, record = outcome
+
+    probabilities = message.pop("probabilities", None)
+    landmarks = message.pop("landmarks", None)
+    motion = None
+    if tracker is not None and message["type"] == "prediction":
+        motion = await apply_motion(tracker, message, record, landmarks)
+
+    # Persistir contando los round-trips a la base de datos
+    with track_queries() as db_stats:
+        supabase_service = get_supabase_service()
+        if record is not None and supabase_service.is_connected():
+            await supabase_service.save_ml_prediction(
+                session_id=session_id,
+                user_id=validate_uuid(DEV_USER_UUID),  # Usuario validado
+                prediction_data=record["prediction_data"],
+                confidence=record["confidence"]
+            )
+    db_metrics.observe_request("WS /ml/predict frame", db_stats)
+
+    message["seq"] = job.seq
+    if not await safe_websocket_send(websocket, message) or decoder is None or message["type"] != "prediction":
+        return
+
+    # Sin mano cuenta como hueco entre palabras
+    if not message["landmarks_detected"]:
+        word = decoder.push(None)
+    elif probabilities is not None:
+        word = decoder.push(tracker.combine(probabilities, motion) if tracker is not None else probabilities)
+    else:
+        return
+    if word is not None:
+        word.update(seq=job.seq, session_id=session_id)
+        await safe_websocket_send(websocket, word)
+
+
+async def apply_motion(tracker: MotionTracker, message: dict, record: Optional[dict],
+                       landmarks: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """
+    Avanzar el modelo de movimiento con el frame; si detecta J o Z, reemplaza la letra
+
+    Devuelve las probabilidades del modelo temporal (None sin mano o con la ventana incompleta).
+    """
+    if landmarks is None:
+        tracker.reset()
+        return None
+    try:
+        motion = await tracker.push(landmarks)
+    except Exception as e:
+        logger.warning(f"Error en el modelo de movimiento: {str(e)}")
+        return None
+    detected = tracker.detect(motion) if motion is not None else None
+    if detected is not None:
+        letter, confidence = detected
+        message.update(letter=letter, confidence=confidence, status="success", motion=True)
+        if record is not None:
+            record["prediction_data"].update(predicted_letter=letter, status="success")
+            record["confidence"] = confidence
+    return motion
+
+
 @router.websocket("/predict")
 async def predict_letter(websocket: WebSocket):
     """
@@ -97,6 +367,31 @@ async def predict_letter(websocket: WebSocket):
     await websocket.accept()
     session_id = get_or_create_session_id_ws(websocket)
 
+    # Control de admisión: sesiones por worker y por IP
+    client_ip = str(websocket.client.host) if websocket.client else "unknown"
+    ticket, reason = admission_controller.admit(client_ip)
+    if ticket is None:
+        await safe_websocket_send(websocket, busy_message(reason, settings.ADMISSION_RETRY_AFTER_S, session_id))
+        try:
+            await websocket.close(code=1013)  # Try Again Later
+        except Exception:
+            pass
+        return
+
+    # El session_id lo puede repetir el cliente; el estado de inferencia es por conexión
+    stream_id = uuid.uuid4().hex
+    try:
+        await run_prediction_session(websocket, session_id, ticket, stream_id)
+    finally:
+        ticket.release()
+        ml_service.release_stream(stream_id)
+
+
+async def run_prediction_session(websocket: WebSocket, session_id: str, ticket: AdmissionTicket,
+                                 stream_id: str) -> None:
+    """
+    Bucle de mensajes de una sesión de predicción admitida
+    """
     # Crear sesión de usuario (si procede)
     supabase_service = get_supabase_service()
     if supabase_service.is_connected():
@@ -110,12 +405,27 @@ async def predict_letter(websocket: WebSocket):
     connection_active = await safe_websocket_send(websocket, {
         "type": "session",
         "session_id": session_id,
-        "message": "connected"
+        "message": "connected",
+        "quality_tier": ml_service.quality.current.name
     })
     
     if not connection_active:
         return  # Salir si la conexión ya está cerrada
 
+    # Recepción, análisis y entrega en etapas: hasta WS_PIPELINE_DEPTH frames en vuelo
+    gate = FrameGate()
+    tracker = motion_recognizer.tracker() if settings.MOTION_ENABLED else None
+    letters = ml_service.letters + (motion_recognizer.letters if tracker is not None else [])
+    decoder = WordDecoder(letters, load_lexicon()) if settings.WORD_DECODER_ENABLED else None
+    pipeline = OrderedPipeline(
+        lambda job: analyze_frame_message(session_id, job.payload, stream_id, gate),
+        lambda job, outcome, error: deliver_frame_result(websocket, session_id, job, outcome, error, decoder, tracker),
+        settings.WS_PIPELINE_DEPTH
+    )
+    pipeline.start()
+    sequence = itertools.count(1)
+
+    last_frame_at = 0.0
     try:
         while True:
             try:
@@ -125,8 +435,8 @@ async def predict_letter(websocket: WebSocket):
 
             # Intentar parsear JSON
             try:
-                payload = json.loads(raw_msg)
-            except json.JSONDecodeError:
+                payload = loads(raw_msg)
+            except JSONDecodeError:
                 await safe_websocket_send(websocket, {
                     "type": "error",
                     "error": "Formato JSON inválido",
@@ -151,96 +461,26 @@ async def predict_letter(websocket: WebSocket):
                 })
                 continue
 
-            # Obtener imagen base64
-            b64_image = payload.get("image")
-            if not b64_image:
-                await safe_websocket_send(websocket, {
-                    "type": "error",
-                    "error": "Campo 'image' requerido",
-                    "session_id": session_id
-                })
-                continue
-
-            # Remover encabezado data URL si existe
-            if b64_image.startswith("data:"):
-                try:
-                    b64_image = b64_image.split(",", 1)[1]
-                except Exception:
-                    await safe_websocket_send(websocket, {
-                        "type": "error",
-                        "error": "Formato data URL inválido",
-                        "session_id": session_id
-                    })
-                    continue
-
-            # Decodificar
-            try:
-                image_data = base64.b64decode(b64_image)
-            except Exception:
-                await safe_websocket_send(websocket, {
-                    "type": "error",
-                    "error": "Imagen base64 inválida",
-                    "session_id": session_id
-                })
+            # Token buckets por conexión y por IP: el frame excedente se descarta
+            retry_after_s = ticket.check_frame()
+            if retry_after_s:
+                if ticket.should_notify(retry_after_s):
+                    await safe_websocket_send(websocket, busy_message("rate_limited", retry_after_s, session_id))
                 continue
 
-            # Procesar landmarks
-            landmarks = ml_service.process_landmarks(image_data)
-
-            if landmarks is None:
-                # Guardar intento fallido
-                supabase_service = get_supabase_service()
-                if supabase_service.is_connected():
-                    await supabase_service.save_ml_prediction(
-                        session_id=session_id,
-                        user_id=validate_uuid(DEV_USER_UUID),  # Usuario validado
-                        prediction_data={
-                            "predicted_letter": "",
-                            "status": "no_hand_detected",
-                            "processing_time_ms": 0.0,
-                            "landmarks_data": []
-                        },
-                        confidence=0.0
-                    )
-
-                await safe_websocket_send(websocket, {
-                    "type": "prediction",
-                    "letter": "",
-                    "confidence": 0.0,
-                    "processing_time_ms": 0.0,
-                    "status": "no_hand_detected",
-                    "landmarks_detected": False,
-                    "session_id": session_id
-                })
+            # Escalón de calidad "minimal": menos frames procesados por sesión
+            min_interval_s = ml_service.quality.current.min_interval_s
+            now = time.monotonic()
+            if now - last_frame_at < min_interval_s:
+                retry_after_s = last_frame_at + min_interval_s - now
+                if ticket.should_notify(retry_after_s):
+                    await safe_websocket_send(websocket, busy_message("reduced_quality", retry_after_s, session_id))
                 continue
+            last_frame_at = now
 
-            # Predicción
-            result = ml_service.predict_letter(landmarks)
-
-            # Persistir predicción exitosa
-            supabase_service = get_supabase_service()
-            if supabase_service.is_connected():
-                await supabase_service.save_ml_prediction(
-                    session_id=session_id,
-                    user_id=validate_uuid(DEV_USER_UUID),  # Usuario validado
-                    prediction_data={
-                        "predicted_letter": result["letter"],
-                        "status": result["status"],
-                        "processing_time_ms": result["processing_time_ms"],
-                        "landmarks_data": landmarks.tolist()
-                    },
-                    confidence=result["confidence"]
-                )
-
-            await safe_websocket_send(websocket, {
-                "type": "prediction",
-                "letter": result["letter"],
-                "confidence": result["confidence"],
-                "processing_time_ms": result["processing_time_ms"],
-                "status": result["status"],
-                "landmarks_detected": True,
-                "session_id": session_id
-            })
+            # "seq" opcional del cliente; las respuestas lo devuelven en el mismo orden
+            seq = payload.get("seq")
+            await pipeline.submit(FrameJob(seq if isinstance(seq, int) else next(sequence), payload))
 
     except WebSocketDisconnect:
         # Desconexión normal
@@ -256,23 +496,62 @@ async def predict_letter(websocket: WebSocket):
             await websocket.close()
         except Exception:
             pass
+    finally:
+        await pipeline.close()
+
+
+# Cuerpo documentado a mano: la imagen se lee en streaming, sin UploadFile
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}}
+                }
+            },
+            "image/*": {"schema": {"type": "string", "format": "binary"}}
+        }
+    }
+}
 
 
-@router.post("/predict/upload", response_model=PredictionResponse)
-async def predict_letter_upload(file: UploadFile = File(...), session_id: str = None):
+@router.post("/predict/upload", response_model=PredictionResponse, openapi_extra=UPLOAD_OPENAPI)
+async def predict_letter_upload(http_request: Request, session_id: str = None):
     """
     Predecir letra basada en imagen subida
+
+    La imagen (campo "file" de multipart/form-data, o el cuerpo con
+    Content-Type image/*) se lee por chunks a un buffer acotado por
+    MAX_UPLOAD_SIZE; ver app.modules.ml.upload.
     """
+    client_ip = http_request.client.host if http_request.client else "unknown"
+    retry_after_s = admission_controller.check_ip_frame(client_ip)
+    if retry_after_s:
+        raise HTTPException(
+            status_code=429,
+            detail="Servidor ocupado, reintentar más tarde",
+            headers={"Retry-After": str(math.ceil(retry_after_s))}
+        )
+
+    buffer = upload_buffers.acquire()
+    completed = False
     try:
-        # Verificar tipo de archivo
-        if not file.content_type.startswith("image/"):
-            raise HTTPException(status_code=400, detail="El archivo debe ser una imagen")
-        
-        # Leer datos de la imagen
-        image_data = await file.read()
+        # Leer la imagen con tamaño y tipo verificados mientras llega
+        try:
+            image_data = await read_image_upload(http_request, buffer)
+        except PayloadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=e.message)
+        except UnsupportedMediaError as e:
+            raise HTTPException(status_code=415, detail=e.message)
+        except ValidationError as e:
+            raise HTTPException(status_code=400, detail=e.message)
         
-        # Procesar landmarks
-        landmarks = ml_service.process_landmarks(image_data)
+        # Procesar landmarks y predecir (detrás de los frames en vivo del WebSocket)
+        landmarks, result = await ml_service.analyze_frame(image_data, priority=PRIORITY_UPLOAD)
+        completed = True
         
         if landmarks is None:
             return PredictionResponse(
@@ -280,22 +559,174 @@ async def predict_letter_upload(file: UploadFile = File(...), session_id: str =
                 confidence=0.0,
                 processing_time_ms=0.0,
                 status="no_hand_detected",
-                landmarks_detected=False
+                landmarks_detected=False,
+                quality_tier=ml_service.quality.current.name
             )
         
-        # Hacer predicción
-        result = ml_service.predict_letter(landmarks)
+        second_opinion = None
+        if result["status"] == "low_confidence":
+            second_opinion = await knn_service.opinion(landmarks)
         
         return PredictionResponse(
             letter=result["letter"],
             confidence=result["confidence"],
             processing_time_ms=result["processing_time_ms"],
             status=result["status"],
-            landmarks_detected=True
+            landmarks_detected=True,
+            model_version=result["model_version"],
+            quality_tier=ml_service.quality.current.name,
+            second_opinion=second_opinion
         )
         
+    except HTTPException:
+        completed = True
+        raise
+    except DeadlineExceededError as e:
+        completed = True
+        raise HTTPException(status_code=503, detail=e.message, headers={"Retry-After": "1"})
     except Exception as e:
+        completed = True
         raise HTTPException(status_code=500, detail=f"Error en predicción: {str(e)}")
+    finally:
+        # Si la request se canceló, el hilo de inferencia podría seguir leyendo el buffer
+        upload_buffers.release(buffer, reusable=completed)
+
+
+# Cuerpo documentado a mano: las fuentes se leen en streaming o acotadas por BATCH_MAX_BYTES
+BATCH_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}}
+                }
+            },
+            "application/zip": {"schema": {"type": "string", "format": "binary"}},
+            "application/json": {
+                "schema": {
+                    "type": "object",
+                    "required": ["items"],
+                    "properties": {"items": {"type": "array", "items": {
+                        "type": "object",
+                        "required": ["landmarks"],
+                        "properties": {
+                            "id": {"type": "string"},
+                            "landmarks": {"type": "array", "items": {"type": "number"}},
+                            "target": {"type": "string"}
+                        }
+                    }}}
+                }
+            },
+            "application/x-ndjson": {"schema": {"type": "string"}}
+        }
+    },
+    "responses": {"200": {"content": {"application/x-ndjson": {}}}}
+}
+
+
+@router.post("/predict/batch", response_class=NDJSONResponse, openapi_extra=BATCH_OPENAPI)
+async def predict_letters_batch(http_request: Request):
+    """
+    Predecir muchas imágenes o vectores de landmarks en una request
+
+    Responde NDJSON: una línea por item a medida que termina (con su
+    index) y una línea final de resumen; ver app.modules.ml.batch_predict.
+    """
+    client_ip = http_request.client.host if http_request.client else "unknown"
+    retry_after_s = admission_controller.check_ip_frame(client_ip)
+    if retry_after_s:
+        raise HTTPException(
+            status_code=429,
+            detail="Servidor ocupado, reintentar más tarde",
+            headers={"Retry-After": str(math.ceil(retry_after_s))}
+        )
+
+    content_type = http_request.headers.get("content-type", "").split(";")[0].strip().lower()
+    try:
+        if content_type == "multipart/form-data":
+            source, results = "multipart", stream_image_results(multipart_images(http_request))
+        elif content_type in ("application/zip", "application/x-zip-compressed"):
+            body = await read_body(http_request, settings.BATCH_MAX_BYTES)
+            source, results = "zip", stream_image_results(zip_images(body))
+        elif content_type in ("application/json", "application/x-ndjson"):
+            body = await read_body(http_request, settings.BATCH_MAX_BYTES)
+            features, items = parse_landmark_items(body, ndjson=content_type == "application/x-ndjson")
+            source, results = "landmarks", stream_landmark_results(features, items)
+        else:
+            raise HTTPException(
+                status_code=415,
+                detail="Usar multipart/form-data, application/zip, application/json o application/x-ndjson"
+            )
+    except PayloadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=e.message)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=e.message)
+
+    http_request.state.batch_body_read = source != "multipart"
+    return NDJSONResponse(ndjson_lines(http_request, source, results))
+
+
+VIDEO_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}}
+                }
+            },
+            "video/*": {"schema": {"type": "string", "format": "binary"}}
+        }
+    },
+    "responses": {"200": {"content": {"application/x-ndjson": {}}}}
+}
+
+
+@router.post("/predict/video", openapi_extra=VIDEO_OPENAPI)
+async def predict_video(http_request: Request, sample_fps: Optional[float] = None):
+    """
+    Letras por segmento de un clip de video
+
+    El clip se guarda en un archivo temporal y se decodifica de a un frame,
+    analizando sample_fps frames por segundo de video (por defecto
+    VIDEO_SAMPLE_FPS). Responde NDJSON: un segmento por línea y un resumen
+    con el throughput; ver app.modules.ml.video.
+    """
+    client_ip = http_request.client.host if http_request.client else "unknown"
+    retry_after_s = admission_controller.check_ip_frame(client_ip)
+    if retry_after_s:
+        raise HTTPException(
+            status_code=429,
+            detail="Servidor ocupado, reintentar más tarde",
+            headers={"Retry-After": str(math.ceil(retry_after_s))}
+        )
+
+    if sample_fps is None:
+        sample_fps = settings.VIDEO_SAMPLE_FPS
+    if sample_fps < 0:
+        raise HTTPException(status_code=400, detail="sample_fps debe ser 0 (todos los frames) o positivo")
+
+    try:
+        path, _ = await save_video_upload(http_request)
+        frames = await open_video(path, sample_fps)
+    except PayloadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=e.message)
+    except UnsupportedMediaError as e:
+        raise HTTPException(status_code=415, detail=e.message)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=e.message)
+
+    # El cuerpo ya se leyó: StreamingResponse puede vigilar la desconexión. La tarea de fondo
+    # corre también si el cliente se va antes de que empiece el cuerpo (el generador no arranca)
+    return StreamingResponse(
+        stream_video_segments(path, frames),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(discard_video, path, frames)
+    )
 
 
 # Rutas del Tutorial
@@ -0,0 +1,167 @@
+"""
+Planificador de inferencia con clases de prioridad
+
+Todo el trabajo de inferencia de un worker pasa por aquí antes de llegar
+al backend (hilo local, pool o sidecar). Solo `capacity` trabajos corren a
+la vez; el resto espera en una cola ordenada por clase (interactivo >
+upload > batch) y, dentro de la clase, por plazo. Un trabajo cuyo plazo
+venció mientras esperaba se descarta con DeadlineExceededError en lugar de
+ocupar el backend con un frame que el cliente ya no necesita.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.exceptions import DeadlineExceededError
+from app.core.metrics import register_metrics
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_UPLOAD = 1
+PRIORITY_BATCH = 2
+
+PRIORITY_NAMES = ["interactive", "upload", "batch"]
+
+# Esperas recientes por clase usadas para los percentiles
+WAIT_WINDOW = 1000
+
+
+class _ClassStats:
+    def __init__(self):
+        self.submitted = 0
+        self.served = 0
+        self.expired = 0
+        self.waits_ms: Deque[float] = deque(maxlen=WAIT_WINDOW)
+
+    def to_dict(self, queued: int) -> Dict[str, Any]:
+        waits = sorted(self.waits_ms)
+        return {
+            "queued": queued,
+            "submitted": self.submitted,
+            "served": self.served,
+            "expired": self.expired,
+            "wait_p50_ms": round(waits[len(waits) // 2], 3) if waits else 0.0,
+            "wait_p95_ms": round(waits[int(len(waits) * 0.95)], 3) if waits else 0.0,
+            "wait_max_ms": round(waits[-1], 3) if waits else 0.0,
+        }
+
+
+def default_deadline_ms(priority: int) -> float:
+    """
+    Plazo configurado para una clase (0 = sin plazo)
+    """
+    return [
+        settings.SCHEDULER_DEADLINE_INTERACTIVE_MS,
+        settings.SCHEDULER_DEADLINE_UPLOAD_MS,
+        settings.SCHEDULER_DEADLINE_BATCH_MS,
+    ][priority]
+
+
+class InferenceScheduler:
+    """
+    Cola de prioridad con plazos delante del backend de inferencia
+    """
+
+    def __init__(self, capacity: int = 1):
+        self.capacity = max(1, capacity)
+        self.running = 0
+        # (prioridad, plazo, secuencia, encolado, future)
+        self._heap: List[Tuple[int, float, int, float, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._stats = [_ClassStats() for _ in PRIORITY_NAMES]
+        # Esperas desde la última muestra de carga (ver load_sample)
+        self._window: List[float] = []
+
+    def set_capacity(self, capacity: int) -> None:
+        self.capacity = max(1, capacity)
+
+    async def run(self, priority: int, job: Callable[[], Awaitable[Any]],
+                  deadline_ms: Optional[float] = None) -> Any:
+        """
+        Ejecutar job() cuando le toque según su clase y plazo
+        """
+        stats = self._stats[priority]
+        stats.submitted += 1
+        enqueued = time.monotonic()
+        if deadline_ms is None:
+            deadline_ms = default_deadline_ms(priority)
+        deadline = enqueued + deadline_ms / 1000 if deadline_ms else float("inf")
+
+        if self.running < self.capacity and not self._heap:
+            self.running += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._heap, (priority, deadline, next(self._sequence), enqueued, future))
+            try:
+                # Al resolverse, el lugar de ejecución ya fue transferido a este trabajo
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled() and future.exception() is None:
+                    self._release()
+                raise
+
+        wait_ms = (time.monotonic() - enqueued) * 1000
+        stats.served += 1
+        stats.waits_ms.append(wait_ms)
+        if priority < PRIORITY_BATCH:
+            self._window.append(wait_ms)
+        try:
+            return await job()
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        """
+        Pasar el lugar liberado al siguiente trabajo vigente de mayor prioridad
+        """
+        now = time.monotonic()
+        while self._heap:
+            priority, deadline, _, enqueued, future = heapq.heappop(self._heap)
+            if future.done():
+                continue  # El llamador se fue (desconexión)
+            if deadline < now:
+                self._stats[priority].expired += 1
+                if priority < PRIORITY_BATCH:
+                    self._window.append((now - enqueued) * 1000)
+                future.set_exception(DeadlineExceededError(
+                    f"Frame descartado: venció su plazo en la cola ({PRIORITY_NAMES[priority]})"
+                ))
+                continue
+            future.set_result(None)
+            return
+        self.running -= 1
+
+    def load_sample(self) -> Tuple[float, int]:
+        """
+        (p95 de la espera en cola desde la muestra anterior en ms, trabajos en cola)
+
+        El trabajo por lotes no cuenta: su cola puede ser larga a propósito
+        y no debe degradar la calidad de las sesiones en vivo.
+        """
+        waits = sorted(self._window)
+        self._window = []
+        queued = sum(1 for priority, *_, future in self._heap if priority < PRIORITY_BATCH and not future.done())
+        return (waits[int(len(waits) * 0.95)] if waits else 0.0), queued
+
+    def summary(self) -> Dict[str, Any]:
+        queued = [0] * len(PRIORITY_NAMES)
+        for priority, _, _, _, future in self._heap:
+            if not future.done():
+                queued[priority] += 1
+        return {
+            "capacity": self.capacity,
+            "running": self.running,
+            "classes": {
+                name: self._stats[priority].to_dict(queued[priority])
+                for priority, name in enumerate(PRIORITY_NAMES)
+            },
+        }
+
+
+# Instancia global del planificador (capacidad ajustada por MLService según el backend)
+inference_scheduler = InferenceScheduler()
+register_metrics("scheduler", inference_scheduler.summary)
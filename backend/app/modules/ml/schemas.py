@@ -24,6 +24,11 @@ class PredictionResponse(BaseModel):
     processing_time_ms: float = Field(..., description="Tiempo de procesamiento en ms")
     status: str = Field(..., description="Estado de la predicción")
     landmarks_detected: bool = Field(..., description="Si se detectaron landmarks")
+    model_version: Optional[str] = Field(None, description="Versión del modelo que hizo la predicción")
+    quality_tier: Optional[str] = Field(None, description="Escalón de calidad activo (full, lite, reduced, minimal)")
+    second_opinion: Optional[Dict[str, Any]] = Field(
+        None, description="Vecinos del dataset y voto por letra cuando status es low_confidence"
+    )
 
 
 class ModelInfoResponse(BaseModel):
@@ -49,6 +54,9 @@ class TutorialStepResponse(BaseModel):
     difficulty: str = Field(..., description="Dificultad del paso")
     tips: List[str] = Field(..., description="Consejos para la seña")
     progress: float = Field(..., description="Progreso en porcentaje")
+    reference_landmarks: Optional[List[List[float]]] = Field(
+        None, description="Pose de referencia de la letra (21 x 3, relativa a la muñeca)"
+    )
 
 
 class TutorialOverviewResponse(BaseModel):
@@ -157,6 +165,15 @@ class MLModelResponse(BaseModel):
         from_attributes = True
 
 
+class ModelRegistryResponse(BaseModel):
+    """
+    Schema de respuesta del registro de modelos
+    """
+    active_version: Optional[str]
+    models: List[MLModelResponse]
+    stats: Dict[str, Dict[str, Any]]
+
+
 class PredictionCreate(BaseModel):
     """
     Schema para crear predicción
@@ -5,15 +5,33 @@ Servicios del módulo ML - Lógica de negocio
 import os
 import json
 import time
+import asyncio
 import numpy as np
-from typing import List, Optional, Dict, Any
-from tensorflow.keras.models import load_model
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Tuple, Union
 import cv2
 import mediapipe as mp
 
 from app.core.config import settings
 from app.core.exceptions import ModelError
-from app.modules.ml.schemas import PredictionRequest, PredictionResponse
+from app.modules.ml.schemas import PredictionRequest, PredictionResponse, MLModelCreate
+from app.modules.ml.batching import MicroBatcher
+from app.modules.ml.degradation import QualityTier, degradation_controller
+from app.modules.ml.hand_landmarker import session_landmarkers
+from app.modules.ml.landmarks import FEATURE_SIZE, create_hands, extract_landmarks, landmarks_from_rgb, to_rgb
+from app.modules.ml.pool import InferencePool, create_inference_pool
+from app.modules.ml.registry import model_registry
+from app.modules.ml.scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE, inference_scheduler
+from app.modules.ml.sidecar import SidecarClient
+from app.modules.ml.shadow import shadow_evaluator
+from app.modules.ml.templates import finger_feedback, load_templates
+
+
+def parse_target_letter(value: Any) -> Optional[str]:
+    """
+    Letra esperada enviada por el cliente, en mayúsculas; None si no es un solo carácter
+    """
+    return value.upper() if isinstance(value, str) and len(value) == 1 else None
 
 
 class MLService:
@@ -22,38 +40,77 @@ class MLService:
     """
     
     def __init__(self):
-        self.model = None
-        self.mp_hands = mp.solutions.hands
-        self.hands = self.mp_hands.Hands(
-            max_num_hands=1, 
-            min_detection_confidence=0.7,
-            min_tracking_confidence=0.5
+        self.registry = model_registry
+        self.shadow = shadow_evaluator
+        self.scheduler = inference_scheduler
+        self.quality = degradation_controller
+        self.landmarkers = session_landmarkers
+        self.pool: Optional[InferencePool] = None
+        self.sidecar: Optional[SidecarClient] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ml-inference")
+        # Predicciones de /ml/predict/batch: una pasada del modelo por lote, en el hilo de inferencia
+        self.batch_predictor = MicroBatcher(
+            self._predict_batch_items, settings.BATCH_PREDICT_SIZE, settings.BATCH_PREDICT_WAIT_MS,
+            executor=self._executor, name="batch-predict"
         )
+        self.mp_hands = mp.solutions.hands
+        self.hands = None
+        self._hands_by_complexity: Dict[int, Any] = {}
         self.mp_drawing = mp.solutions.drawing_utils
+        self._initialized = False
         
         # Letras del alfabeto ecuatoriano (excluyendo J y Z)
         self.letters = [chr(i) for i in range(65, 91) if i not in (74, 90)]  # A-Y sin J y Z
         
+        # En el master pre-fork (app.serve) se difiere hasta después del fork:
+        # ni MediaPipe ni el runtime de TensorFlow sobreviven a un fork
+        # Con el sidecar este proceso no carga MediaPipe ni el modelo
+        if settings.ML_INIT_ON_IMPORT and settings.INFERENCE_BACKEND != "sidecar":
+            self.initialize()
+    
+    def initialize(self):
+        """
+        Crear el detector de manos y cargar el modelo (una vez por proceso)
+        """
+        if self._initialized:
+            return
+        self._initialized = True
+        self.hands = self._get_hands(1)
         self._load_model()
     
+    def _get_hands(self, model_complexity: int):
+        """
+        Detector por model_complexity; se crean a demanda al cambiar de escalón
+        """
+        hands = self._hands_by_complexity.get(model_complexity)
+        if hands is None:
+            hands = self._hands_by_complexity[model_complexity] = create_hands(model_complexity)
+        return hands
+    
+    @property
+    def model(self):
+        """
+        Modelo de la versión activa del registro
+        """
+        active = self.registry.active
+        return active.model if active else None
+
     def _load_model(self):
         """
-        Cargar modelo de TensorFlow
+        Cargar modelo de TensorFlow como versión inicial del registro
         """
         try:
-            # 1. Intentar cargar model.h5 en /app/models/
-            model_path = "/app/models/model.h5"
-            if os.path.exists(model_path):
-                self.model = load_model(model_path)
-                print(f"✅ Modelo cargado exitosamente desde: {model_path}")
-                return
-
-            # 2. Intentar cargar el modelo desde la configuración
-            config_model_path = settings.MODEL_PATH
-            if os.path.exists(config_model_path):
-                self.model = load_model(config_model_path)
-                print(f"✅ Modelo desde configuración cargado exitosamente desde: {config_model_path}")
-                return
+            # 1. Intentar cargar model.h5 en /app/models/, luego el de la configuración
+            for model_path in ("/app/models/model.h5", settings.MODEL_PATH):
+                if os.path.exists(model_path):
+                    self.registry.load(MLModelCreate(
+                        name=os.path.basename(model_path),
+                        version="1.0",
+                        file_path=model_path,
+                        confidence_threshold=settings.CONFIDENCE_THRESHOLD
+                    ))
+                    print(f"✅ Modelo cargado exitosamente desde: {model_path}")
+                    return
 
             raise ModelError("No se encontró ningún modelo disponible")
 
@@ -62,108 +119,324 @@ class MLService:
             if settings.is_development:
                 print(f"⚠️  Modelo no disponible en desarrollo: {str(e)}")
                 print("💡 Sugerencia: Verifica que model.h5 esté en /app/models/")
-                self.model = None
             else:
                 raise ModelError(f"Error cargando modelo: {str(e)}")
     
-    def process_landmarks(self, image_data: bytes) -> Optional[np.ndarray]:
+    def process_landmarks(self, image_data: bytes, tier: Optional[QualityTier] = None,
+                          out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
         """
-        Procesar imagen y extraer landmarks de la mano
+        Procesar imagen y extraer landmarks de la mano (con la calidad del escalón dado)
+
+        out (opcional) es la fila (21, 3) float32 donde escribirlos, p. ej. de un FeatureBuffer.
         """
         try:
-            # Convertir bytes a imagen
-            nparr = np.frombuffer(image_data, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if image is None:
-                return None
-            
-            # Convertir BGR a RGB
-            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            
-            # Procesar con MediaPipe
-            results = self.hands.process(rgb_image)
-            
-            if results.multi_hand_landmarks:
-                # Obtener landmarks de la primera mano detectada
-                hand_landmarks = results.multi_hand_landmarks[0]
-                landmarks = np.array([[lm.x, lm.y, lm.z] for lm in hand_landmarks.landmark])
-                
-                # Normalizar landmarks (relativo al primer punto)
-                if landmarks.shape[0] == 21:  # 21 landmarks de la mano
-                    landmarks = landmarks - landmarks[0]
-                    return landmarks
-            
-            return None
-            
+            if tier is None:
+                return extract_landmarks(self.hands, image_data, out=out)
+            return extract_landmarks(self._get_hands(tier.model_complexity), image_data, tier.max_side, out)
         except Exception as e:
             raise ModelError(f"Error procesando landmarks: {str(e)}")
     
-    def predict_letter(self, landmarks: np.ndarray) -> Dict[str, Any]:
+    def predict_letter(self, landmarks: np.ndarray, target_letter: Optional[str] = None) -> Dict[str, Any]:
         """
         Predecir letra basada en landmarks
+
+        target_letter (opcional) es la letra esperada; alimenta los
+        contadores de precisión de la versión del modelo.
         """
         try:
             start_time = time.time()
             
-            if self.model is None:
-                raise ModelError("Modelo no cargado")
-            
             if landmarks.shape[0] != 21:
                 raise ModelError(f"Se esperaban 21 landmarks, se recibieron {landmarks.shape[0]}")
             
-            # Preparar features para el modelo
-            features = landmarks.flatten()
-            features = np.expand_dims(features, axis=0)
+            # Features (1, 63) float32 para el modelo: una vista si los landmarks ya son float32
+            features = np.ascontiguousarray(landmarks, dtype=np.float32).reshape(1, FEATURE_SIZE)
             
-            # Hacer predicción
-            prediction = self.model.predict(features, verbose=0)
-            predicted_class = np.argmax(prediction, axis=1)[0]
-            confidence = float(np.max(prediction))
-            
-            processing_time = (time.time() - start_time) * 1000  # en ms
-            
-            # Verificar umbral de confianza
-            if confidence < settings.CONFIDENCE_THRESHOLD:
-                return {
-                    "letter": "",
-                    "confidence": confidence,
-                    "processing_time_ms": processing_time,
-                    "status": "low_confidence"
-                }
-            
-            # Verificar que la predicción esté en rango
-            if predicted_class >= len(self.letters):
-                return {
-                    "letter": "",
-                    "confidence": confidence,
-                    "processing_time_ms": processing_time,
-                    "status": "out_of_range"
-                }
+            # Hacer predicción con la versión activa (un swap concurrente no la afecta)
+            with self.registry.acquire() as version:
+                prediction = version.model.predict(features, verbose=0)
+                letter, confidence, status = version.decode(prediction, self.letters)
+                
+                processing_time = (time.time() - start_time) * 1000  # en ms
+                
+                self.registry.record(version, processing_time, letter, target_letter)
             
-            predicted_letter = self.letters[predicted_class]
+            # Evaluación en sombra del modelo candidato (muestreada, fuera de la respuesta)
+            self.shadow.submit(features, letter, confidence, processing_time)
             
             return {
-                "letter": predicted_letter,
+                "letter": letter,
                 "confidence": confidence,
                 "processing_time_ms": processing_time,
-                "status": "success"
+                "status": status,
+                "model_version": version.version,
+                # Probabilidad por letra (decodificador de palabras); vista de la salida del modelo
+                "probabilities": prediction[0, :len(self.letters)]
             }
             
         except Exception as e:
             raise ModelError(f"Error en predicción: {str(e)}")
     
+    def predict_batch(self, landmarks_list: Union[List[np.ndarray], np.ndarray],
+                      target_letters: Optional[List[Optional[str]]] = None) -> List[Dict[str, Any]]:
+        """
+        Predecir varias manos en una sola llamada al modelo
+
+        Acepta una lista de landmarks o una matriz (n, 63) float32 ya armada
+        (FeatureBuffer.batch), que se usa sin copiar. El tiempo de
+        procesamiento de cada elemento es el del lote completo.
+        """
+        targets = target_letters or [None] * len(landmarks_list)
+        if isinstance(landmarks_list, np.ndarray):
+            features = np.ascontiguousarray(landmarks_list, dtype=np.float32).reshape(-1, FEATURE_SIZE)
+        else:
+            features = np.stack([landmarks.reshape(-1) for landmarks in landmarks_list]).astype(np.float32, copy=False)
+        
+        start_time = time.time()
+        with self.registry.acquire() as version:
+            predictions = version.model.predict(features, verbose=0)
+            processing_time = (time.time() - start_time) * 1000  # en ms
+            
+            results = []
+            for row, target in enumerate(targets):
+                letter, confidence, status = version.decode(predictions[row:row + 1], self.letters)
+                self.registry.record(version, processing_time, letter, target)
+                self.shadow.submit(features[row:row + 1], letter, confidence, processing_time)
+                results.append({
+                    "letter": letter,
+                    "confidence": confidence,
+                    "processing_time_ms": processing_time,
+                    "status": status,
+                    "model_version": version.version,
+                    "probabilities": predictions[row, :len(self.letters)]
+                })
+        return results
+    
+    def _predict_batch_items(self, items: List[Tuple[np.ndarray, Optional[str]]]) -> List[Any]:
+        """
+        Función de lote de batch_predictor: (landmarks, letra esperada) -> resultado o excepción
+        """
+        try:
+            return self.predict_batch([landmarks for landmarks, _ in items], [target for _, target in items])
+        except ModelError as e:
+            return [e] * len(items)
+    
+    async def analyze_batch_item(self, image_data: Union[bytes, memoryview], target_letter: Optional[str] = None
+                                 ) -> Tuple[Optional[np.ndarray], Optional[Dict[str, Any]]]:
+        """
+        Analizar una imagen de un lote (prioridad batch, detrás de WebSocket y uploads)
+
+        Los landmarks se extraen por imagen (en paralelo entre los procesos
+        del pool si está activo) y la predicción se agrupa con las demás
+        imágenes en curso en una sola pasada del modelo. Con el sidecar,
+        que ya agrupa sus frames, se usa analyze_frame.
+        """
+        if self.sidecar is not None:
+            return await self.analyze_frame(image_data, target_letter, priority=PRIORITY_BATCH)
+        
+        landmarks = await self.scheduler.run(
+            PRIORITY_BATCH, lambda: self._extract_landmarks(image_data, self.quality.current)
+        )
+        if landmarks is None:
+            return None, None
+        return landmarks, await self.batch_predictor.submit((landmarks, target_letter))
+    
+    async def analyze_decoded_frame(self, image: np.ndarray, target_letter: Optional[str] = None
+                                    ) -> Tuple[Optional[np.ndarray], Optional[Dict[str, Any]]]:
+        """
+        Analizar un frame BGR ya decodificado (video), con prioridad batch
+
+        En local se pasa el arreglo directo a MediaPipe, sin volver a
+        codificar; el pool y el sidecar reciben imágenes comprimidas, así
+        que ahí el frame se codifica a JPEG y sigue como un item de lote.
+        """
+        if self.pool is not None or self.sidecar is not None:
+            encoded, ok = None, False
+            try:
+                ok, encoded = cv2.imencode(".jpg", image)
+            except cv2.error:
+                pass
+            if not ok:
+                raise ModelError("No se pudo codificar el frame de video")
+            return await self.analyze_batch_item(memoryview(encoded), target_letter)
+        
+        loop = asyncio.get_running_loop()
+        tier = self.quality.current
+        landmarks = await self.scheduler.run(
+            PRIORITY_BATCH,
+            lambda: loop.run_in_executor(self._executor, self._landmarks_from_bgr, image, tier)
+        )
+        if landmarks is None:
+            return None, None
+        return landmarks, await self.batch_predictor.submit((landmarks, target_letter))
+    
+    def _landmarks_from_bgr(self, image: np.ndarray, tier: QualityTier) -> Optional[np.ndarray]:
+        try:
+            hands = self._get_hands(tier.model_complexity)
+            return landmarks_from_rgb(hands, to_rgb(image, tier.max_side))
+        except Exception as e:
+            raise ModelError(f"Error procesando landmarks: {str(e)}")
+    
+    async def predict_landmarks_batch(self, features: np.ndarray,
+                                      target_letters: Optional[List[Optional[str]]] = None) -> List[Dict[str, Any]]:
+        """
+        Predecir una matriz (n, 63) de landmarks ya extraídos, con prioridad batch
+        """
+        loop = asyncio.get_running_loop()
+        return await self.scheduler.run(
+            PRIORITY_BATCH,
+            lambda: loop.run_in_executor(self._executor, self.predict_batch, features, target_letters)
+        )
+    
+    async def _extract_landmarks(self, image_data: Union[bytes, memoryview],
+                                 tier: QualityTier) -> Optional[np.ndarray]:
+        if self.pool is not None:
+            # Sin versión del modelo: el proceso solo extrae landmarks
+            landmarks, _ = await self.pool.analyze(image_data, None, tier)
+            return landmarks
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.process_landmarks, image_data, tier)
+    
+    async def start_inference_backend(self) -> None:
+        """
+        Inicializar el backend de inferencia configurado en INFERENCE_BACKEND
+        """
+        if settings.INFERENCE_BACKEND == "sidecar":
+            if self.sidecar is None:
+                self.sidecar = SidecarClient(settings.SIDECAR_SOCKET, settings.INFERENCE_TIMEOUT_S)
+            try:
+                await self.sidecar.refresh_info()
+            except ModelError as e:
+                # El worker arranca igual y se conecta en el primer frame
+                print(f"⚠️  Sidecar de inferencia no disponible: {e.message}")
+            # Suficientes frames en vuelo para llenar un lote del sidecar
+            self.scheduler.set_capacity(settings.INFERENCE_CONCURRENCY or settings.SIDECAR_MAX_BATCH)
+            self.quality.start(self.scheduler.load_sample)
+            return
+        
+        self.initialize()
+        if settings.INFERENCE_BACKEND == "pool" and self.pool is None:
+            self.pool = create_inference_pool(self.letters)
+            self.pool.start(preload=self.registry.active)
+            # Cargar cada versión activada en los procesos antes de su primer frame
+            self.registry.add_listener(self.pool.preload)
+        # Local: un frame a la vez (un solo hilo); pool: dos por proceso para no dejarlos ociosos
+        capacity = self.pool.size * 2 if self.pool is not None else 1
+        if self.pool is None and self._uses_tasks_landmarker():
+            # Cada HandLandmarker corre en su propio grafo: las sesiones avanzan en paralelo
+            capacity = os.cpu_count() or 1
+            if settings.HAND_LANDMARKER_MODE == "live_stream":
+                capacity *= 2  # Frames en vuelo para que MediaPipe pueda descartar
+        self.scheduler.set_capacity(settings.INFERENCE_CONCURRENCY or capacity)
+        self.quality.start(self.scheduler.load_sample)
+    
+    async def stop_inference_backend(self) -> None:
+        self.quality.stop()
+        await self.batch_predictor.stop()
+        self.landmarkers.close_all()
+        if self.pool is not None:
+            self.pool.stop()
+            self.pool = None
+        if self.sidecar is not None:
+            await self.sidecar.close()
+            self.sidecar = None
+    
+    def _analyze_local(self, image_data: bytes, target_letter: Optional[str],
+                       tier: QualityTier) -> Tuple[Optional[np.ndarray], Optional[Dict[str, Any]]]:
+        landmarks = self.process_landmarks(image_data, tier)
+        if landmarks is None:
+            return None, None
+        return landmarks, self.predict_letter(landmarks, target_letter)
+    
+    def _uses_tasks_landmarker(self) -> bool:
+        return settings.LANDMARK_EXTRACTOR == "tasks" and self.pool is None and self.sidecar is None
+    
+    def release_stream(self, stream_id: str) -> None:
+        """
+        Liberar el estado de inferencia de una conexión WebSocket terminada
+        """
+        self.landmarkers.release(stream_id)
+    
+    async def _analyze_tasks(self, stream_id: str, image_data: bytes, target_letter: Optional[str],
+                             tier: QualityTier) -> Tuple[Optional[np.ndarray], Optional[Dict[str, Any]]]:
+        """
+        Landmarks con el HandLandmarker de la sesión y predicción en el hilo de inferencia
+        """
+        loop = asyncio.get_running_loop()
+        landmarker = self.landmarkers.get(stream_id)
+        if landmarker.live:
+            landmarks = await landmarker.detect_live(image_data, tier.max_side, self._executor)
+        else:
+            landmarks = await loop.run_in_executor(self._executor, landmarker.detect_video, image_data, tier.max_side)
+        
+        if landmarks is None:
+            return None, None
+        return landmarks, await loop.run_in_executor(self._executor, self.predict_letter, landmarks, target_letter)
+    
+    async def analyze_frame(self, image_data: bytes, target_letter: Optional[str] = None,
+                            priority: int = PRIORITY_INTERACTIVE,
+                            stream_id: Optional[str] = None) -> Tuple[Optional[np.ndarray], Optional[Dict[str, Any]]]:
+        """
+        Extraer landmarks y predecir fuera del event loop
+
+        Devuelve (landmarks, resultado); ambos son None si no se detectó
+        una mano. Usa el pool de procesos si está activo y, si no, un
+        hilo dedicado (MediaPipe Hands no admite llamadas concurrentes).
+        El frame espera su turno en el planificador según su prioridad y
+        lanza DeadlineExceededError si su plazo vence en la cola. Se procesa
+        con el escalón de calidad activo al salir de la cola.
+
+        Con LANDMARK_EXTRACTOR=tasks y backend local, los frames con
+        stream_id (uno por conexión) usan el HandLandmarker de esa conexión
+        (ver hand_landmarker).
+        """
+        return await self.scheduler.run(
+            priority, lambda: self._analyze_frame(image_data, target_letter, self.quality.current, stream_id)
+        )
+    
+    async def _analyze_frame(self, image_data: bytes, target_letter: Optional[str], tier: QualityTier,
+                             stream_id: Optional[str]) -> Tuple[Optional[np.ndarray], Optional[Dict[str, Any]]]:
+        if stream_id is not None and self._uses_tasks_landmarker():
+            return await self._analyze_tasks(stream_id, image_data, target_letter, tier)
+        
+        if self.sidecar is not None:
+            return await self.sidecar.analyze(image_data, target_letter, tier)
+        
+        if self.pool is None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._analyze_local, image_data, target_letter, tier)
+        
+        with self.registry.acquire(required=False) as version:
+            landmarks, result = await self.pool.analyze(image_data, version, tier)
+        
+        if landmarks is None:
+            return None, None
+        if result is None:
+            raise ModelError("Error en predicción: Modelo no cargado")
+        
+        self.registry.record(version, result["processing_time_ms"], result["letter"], target_letter)
+        self.shadow.submit(landmarks.reshape(1, -1), result["letter"], result["confidence"],
+                           result["processing_time_ms"])
+        result["model_version"] = version.version
+        return landmarks, result
+    
     def get_model_info(self) -> Dict[str, Any]:
         """
         Obtener información del modelo
         """
+        if self.sidecar is not None and self.sidecar.model_info:
+            info = dict(self.sidecar.model_info)
+            info.pop("batching", None)
+            return info
+        
+        active = self.registry.active
         return {
-            "model_loaded": self.model is not None,
+            "model_loaded": active is not None,
             "supported_letters": self.letters,
             "total_letters": len(self.letters),
-            "confidence_threshold": settings.CONFIDENCE_THRESHOLD,
+            "confidence_threshold": active.spec.confidence_threshold if active else settings.CONFIDENCE_THRESHOLD,
             "language": "Ecuatoriano",
-            "version": "1.0"
+            "version": active.version if active else "1.0"
         }
 
 
@@ -183,6 +456,21 @@ class TutorialService:
         # Información detallada de cada letra (fallback)
         self.fallback_letters_info = self._get_fallback_letters_info()
     
+    def finger_feedback(self, letter: str, landmarks: np.ndarray) -> Optional[Dict[str, Any]]:
+        """
+        Qué dedo corregir para acercarse a la plantilla de la letra (None sin plantilla)
+        """
+        return finger_feedback(letter, landmarks)
+    
+    def reference_landmarks(self, letter: str) -> Optional[List[List[float]]]:
+        """
+        Pose de referencia de la letra (mediana del dataset) para dibujar la guía
+        """
+        if not settings.TEMPLATES_ENABLED:
+            return None
+        templates = load_templates(ml_service.letters)
+        return templates.reference_landmarks(letter) if templates is not None and letter else None
+    
     def _get_fallback_letters_info(self) -> Dict[str, Dict[str, Any]]:
         """
         Información detallada de cada letra para el tutorial (datos de respaldo)
@@ -233,6 +521,7 @@ class TutorialService:
                 "difficulty": lesson.get("difficulty", "medium"),
                 "tips": lesson.get("tips", []),
                 "progress": round((step / len(self.learning_sequence)) * 100, 1),
+                "reference_landmarks": self.reference_landmarks(lesson.get("letter", "")),
                 "data_source": "supabase"
             }
         else:
@@ -248,6 +537,7 @@ class TutorialService:
                 "difficulty": letter_info.get("difficulty", "medium"),
                 "tips": letter_info.get("tips", []),
                 "progress": round((step / len(self.learning_sequence)) * 100, 1),
+                "reference_landmarks": self.reference_landmarks(letter),
                 "data_source": "fallback"
             }
     
@@ -0,0 +1,184 @@
+"""
+Evaluación en sombra de un modelo candidato sobre tráfico real
+
+Una fracción de los vectores de landmarks que llegan a predict_letter se
+encola (sin bloquear) y un hilo aparte los pasa por la versión candidata.
+La respuesta al usuario nunca espera a la sombra: si la cola está llena o
+se agotó el presupuesto de CPU la muestra se descarta. Se registra, por
+letra predicha por el modelo activo, la tasa de acuerdo y las diferencias
+de confianza y latencia.
+"""
+
+import logging
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import register_metrics
+from app.modules.ml.registry import ModelVersion
+
+logger = logging.getLogger(__name__)
+
+# Segundos de inferencia que se pueden acumular sin usar
+MAX_BUDGET_S = 1.0
+
+
+class LetterAgreement:
+    """
+    Contadores de comparación para una letra del modelo activo
+    """
+
+    def __init__(self):
+        self.samples = 0
+        self.agreements = 0
+        self.confidence_delta = 0.0
+        self.latency_delta_ms = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "agreement_rate": round(self.agreements / self.samples, 4),
+            "avg_confidence_delta": round(self.confidence_delta / self.samples, 4),
+            "avg_latency_delta_ms": round(self.latency_delta_ms / self.samples, 3),
+        }
+
+
+class ShadowEvaluator:
+    """
+    Ejecuta una versión candidata en paralelo al modelo activo, fuera del camino de respuesta
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue(maxsize=settings.SHADOW_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self.candidate: Optional[ModelVersion] = None
+        self.letters: List[str] = []
+        self.sample_rate = 0.0
+        self._reset_counters()
+
+    def _reset_counters(self) -> None:
+        self.started_at = time.monotonic()
+        self.submitted = 0
+        self.evaluated = 0
+        self.dropped_queue_full = 0
+        self.dropped_budget = 0
+        self.errors = 0
+        self.shadow_ms = 0.0
+        self.by_letter: Dict[str, LetterAgreement] = {}
+        self._budget_s = MAX_BUDGET_S
+        self._budget_at = time.monotonic()
+
+    def start(self, candidate: ModelVersion, letters: List[str], sample_rate: float) -> None:
+        """
+        Empezar a evaluar una versión candidata con los contadores en cero
+        """
+        with self._lock:
+            self.candidate = candidate
+            self.letters = list(letters)
+            self.sample_rate = sample_rate
+            self._reset_counters()
+
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="shadow-eval", daemon=True)
+                self._thread.start()
+
+        logger.info(f"Evaluación en sombra de v{candidate.version} (muestreo {sample_rate:.0%})")
+
+    def stop(self) -> None:
+        with self._lock:
+            self.candidate = None
+            self.sample_rate = 0.0
+
+    def submit(self, features: np.ndarray, letter: str, confidence: float,
+               processing_time_ms: float) -> None:
+        """
+        Encolar una muestra del tráfico real sin bloquear al llamador
+        """
+        if self.candidate is None or random.random() >= self.sample_rate:
+            return
+
+        try:
+            self._queue.put_nowait((self.candidate, features, letter, confidence, processing_time_ms))
+            self.submitted += 1
+        except queue.Full:
+            self.dropped_queue_full += 1
+
+    def _take_budget(self) -> bool:
+        """
+        Presupuesto de CPU: SHADOW_CPU_BUDGET segundos de inferencia por segundo de reloj
+        """
+        now = time.monotonic()
+        self._budget_s = min(MAX_BUDGET_S, self._budget_s + (now - self._budget_at) * settings.SHADOW_CPU_BUDGET)
+        self._budget_at = now
+        return self._budget_s > 0
+
+    def _run(self) -> None:
+        while True:
+            candidate, features, letter, confidence, primary_ms = self._queue.get()
+            # La candidata cambió mientras la muestra esperaba en la cola
+            if candidate is not self.candidate:
+                continue
+            if not self._take_budget():
+                self.dropped_budget += 1
+                continue
+
+            started = time.perf_counter()
+            try:
+                prediction = candidate.model.predict(features, verbose=0)
+                shadow_letter, shadow_confidence, _ = candidate.decode(prediction, self.letters)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Error en evaluación en sombra de v{candidate.version}: {str(e)}")
+                continue
+            finally:
+                elapsed = time.perf_counter() - started
+                self._budget_s -= elapsed
+
+            self._observe(candidate, letter, confidence, primary_ms,
+                          shadow_letter, shadow_confidence, elapsed * 1000)
+
+    def _observe(self, candidate: ModelVersion, letter: str, confidence: float, primary_ms: float,
+                 shadow_letter: str, shadow_confidence: float, shadow_ms: float) -> None:
+        with self._lock:
+            if candidate is not self.candidate:
+                return
+            self.evaluated += 1
+            self.shadow_ms += shadow_ms
+
+            entry = self.by_letter.setdefault(letter or "?", LetterAgreement())
+            entry.samples += 1
+            entry.agreements += shadow_letter == letter
+            entry.confidence_delta += shadow_confidence - confidence
+            entry.latency_delta_ms += shadow_ms - primary_ms
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            if self.candidate is None:
+                return {"enabled": False}
+
+            agreements = sum(e.agreements for e in self.by_letter.values())
+            elapsed = time.monotonic() - self.started_at
+            return {
+                "enabled": True,
+                "candidate_version": self.candidate.version,
+                "sample_rate": self.sample_rate,
+                "submitted": self.submitted,
+                "evaluated": self.evaluated,
+                "dropped_queue_full": self.dropped_queue_full,
+                "dropped_budget": self.dropped_budget,
+                "errors": self.errors,
+                "agreement_rate": round(agreements / self.evaluated, 4) if self.evaluated else None,
+                "cpu_fraction": round(self.shadow_ms / 1000 / elapsed, 4) if elapsed else 0.0,
+                "letters": {letter: e.to_dict() for letter, e in sorted(self.by_letter.items())},
+            }
+
+
+# Instancia global del evaluador en sombra
+shadow_evaluator = ShadowEvaluator()
+register_metrics("shadow", shadow_evaluator.summary)
@@ -0,0 +1,338 @@
+"""
+Servidor de inferencia local (sidecar) sobre un socket UNIX
+
+Un solo proceso con MediaPipe y los modelos calientes atiende a todos los
+workers de la API (INFERENCE_BACKEND=sidecar), que ya no cargan
+TensorFlow. Los frames de todas las conexiones se agrupan en lotes
+(SIDECAR_MAX_BATCH / SIDECAR_MAX_WAIT_MS) y el modelo se invoca una vez
+por lote. El sidecar se puede reiniciar sin reiniciar la API: los
+clientes se reconectan en el siguiente frame.
+
+Protocolo binario (big-endian), mensajes con encabezado de 9 bytes:
+
+    request_id  u32 | length u32 | type u8 | payload[length]
+
+    FRAME   (1)  cliente → sidecar: target u8 (latin-1, 0 = sin letra) | model_complexity u8
+                 | max_side u16 (0 = original) + imagen
+    RESULT  (2)  sidecar → cliente: ver RESULT_HEADER (+ 63 x f32 de landmarks
+                 + f32 de probabilidad por letra hasta el final del mensaje)
+    ERROR   (3)  sidecar → cliente: mensaje UTF-8
+    INFO    (4)  cliente → sidecar: vacío; respuesta INFO con JSON de get_model_info()
+
+Uso:
+    python -m app.modules.ml.sidecar --socket /tmp/comsigns-inference.sock
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.exceptions import ModelError, ValidationError
+from app.core.serialization import dumps, loads
+from app.modules.ml.degradation import QualityTier
+from app.modules.ml.landmarks import FeatureBuffer
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct("!IIB")
+# target u8 | model_complexity u8 | max_side u16 (escalón de calidad del worker que envía)
+FRAME_HEADER = struct.Struct("!BBH")
+# status u8 | hand u8 | letter u8 | confidence f32 | processing_ms f32 | version_len u8
+RESULT_HEADER = struct.Struct("!BBBffB")
+
+MSG_FRAME = 1
+MSG_RESULT = 2
+MSG_ERROR = 3
+MSG_INFO = 4
+
+STATUSES = ["success", "low_confidence", "out_of_range", "no_hand_detected"]
+
+
+# ==============================================
+# 📦 CODIFICACIÓN
+# ==============================================
+
+def encode_message(request_id: int, msg_type: int, payload: bytes = b"") -> bytes:
+    return HEADER.pack(request_id, len(payload), msg_type) + payload
+
+
+def encode_letter(letter: Optional[str]) -> int:
+    """
+    Letra como un byte latin-1 (la Ñ incluida); 0 = sin letra
+    """
+    if not letter:
+        return 0
+    if not isinstance(letter, str) or len(letter) != 1 or not 0 < ord(letter) < 256:
+        raise ValidationError(f"Letra inválida para el servicio de inferencia: {letter!r}")
+    return ord(letter)
+
+
+def encode_result(landmarks: Optional[np.ndarray], result: Optional[Dict[str, Any]]) -> bytes:
+    if landmarks is None:
+        return RESULT_HEADER.pack(STATUSES.index("no_hand_detected"), 0, 0, 0.0, 0.0, 0)
+
+    version = result["model_version"].encode()
+    header = RESULT_HEADER.pack(
+        STATUSES.index(result["status"]), 1, encode_letter(result["letter"]),
+        result["confidence"], result["processing_time_ms"], len(version)
+    )
+    probabilities = result.get("probabilities")
+    probabilities = b"" if probabilities is None else np.asarray(probabilities, dtype=">f4").tobytes()
+    return header + version + landmarks.astype(">f4").tobytes() + probabilities
+
+
+def decode_result(payload: bytes) -> Tuple[Optional[np.ndarray], Optional[Dict[str, Any]]]:
+    status, hand, letter, confidence, processing_ms, version_len = RESULT_HEADER.unpack_from(payload)
+    if not hand:
+        return None, None
+
+    offset = RESULT_HEADER.size
+    version = payload[offset:offset + version_len].decode()
+    offset += version_len
+    landmarks = np.frombuffer(payload, dtype=">f4", count=63, offset=offset).astype(np.float32).reshape(21, 3)
+    offset += 63 * 4
+    probabilities = np.frombuffer(payload, dtype=">f4", offset=offset).astype(np.float32)
+    return landmarks, {
+        "letter": chr(letter) if letter else "",
+        "confidence": confidence,
+        "processing_time_ms": processing_ms,
+        "status": STATUSES[status],
+        "model_version": version,
+        "probabilities": probabilities if len(probabilities) else None,
+    }
+
+
+async def read_message(reader: asyncio.StreamReader) -> Tuple[int, int, bytes]:
+    request_id, length, msg_type = HEADER.unpack(await reader.readexactly(HEADER.size))
+    payload = await reader.readexactly(length) if length else b""
+    return request_id, msg_type, payload
+
+
+# ==============================================
+# 🖥️ SERVIDOR
+# ==============================================
+
+class InferenceSidecar:
+    """
+    Servidor que agrupa frames de todas las conexiones en lotes
+    """
+
+    def __init__(self, socket_path: str, max_batch: int, max_wait_ms: float):
+        from app.modules.ml.batching import MicroBatcher
+        from app.modules.ml.services import ml_service
+
+        self.socket_path = socket_path
+        self.ml_service = ml_service
+        self.batcher = MicroBatcher(self._process_batch, max_batch, max_wait_ms, name="sidecar-batch")
+        self.connections = 0
+
+    def _process_batch(self, items: List[Tuple[bytes, Optional[str], QualityTier]]) -> List[Any]:
+        """
+        Landmarks frame a frame y una sola inferencia para todas las manos detectadas
+        """
+        outputs: List[Any] = []
+        detected = []
+        # Cada mano detectada ocupa la siguiente fila: el lote del modelo queda armado sin copias
+        buffer = FeatureBuffer(len(items))
+        for index, (image_data, target, tier) in enumerate(items):
+            try:
+                landmarks = self.ml_service.process_landmarks(image_data, tier, buffer.row(len(detected)))
+            except ModelError as e:
+                outputs.append(e)
+                continue
+            outputs.append((landmarks, None))
+            if landmarks is not None:
+                detected.append((index, landmarks, target))
+
+        if detected:
+            try:
+                results = self.ml_service.predict_batch(
+                    buffer.batch(len(detected)),
+                    [target for _, _, target in detected]
+                )
+            except ModelError as e:
+                results = [e] * len(detected)
+            for (index, landmarks, _), result in zip(detected, results):
+                outputs[index] = result if isinstance(result, Exception) else (landmarks, result)
+        return outputs
+
+    async def _handle_frame(self, writer: asyncio.StreamWriter, request_id: int, payload: bytes) -> None:
+        try:
+            target, model_complexity, max_side = FRAME_HEADER.unpack_from(payload)
+            tier = QualityTier(-1, "remote", model_complexity, max_side, 0.0)
+            item = (payload[FRAME_HEADER.size:], chr(target) if target else None, tier)
+            landmarks, result = await self.batcher.submit(item)
+            message = encode_message(request_id, MSG_RESULT, encode_result(landmarks, result))
+        except Exception as e:
+            message = encode_message(request_id, MSG_ERROR, str(e).encode())
+        if not writer.is_closing():
+            writer.write(message)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        tasks = set()
+        try:
+            while True:
+                request_id, msg_type, payload = await read_message(reader)
+                if msg_type == MSG_FRAME:
+                    # Sin esperar la respuesta: los frames de la conexión entran al mismo lote
+                    task = asyncio.create_task(self._handle_frame(writer, request_id, payload))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                elif msg_type == MSG_INFO:
+                    info = self.ml_service.get_model_info()
+                    info["batching"] = self.batcher.summary()
+                    writer.write(encode_message(request_id, MSG_INFO, dumps(info)))
+                else:
+                    writer.write(encode_message(request_id, MSG_ERROR, b"Tipo de mensaje no soportado"))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.connections -= 1
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def serve(self) -> None:
+        self.ml_service.initialize()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        logger.info(f"Sidecar de inferencia escuchando en {self.socket_path}")
+        async with server:
+            await server.serve_forever()
+
+
+# ==============================================
+# 🔌 CLIENTE
+# ==============================================
+
+class SidecarClient:
+    """
+    Conexión multiplexada de un worker de la API al sidecar
+    """
+
+    def __init__(self, socket_path: str, timeout_s: float):
+        self.socket_path = socket_path
+        self.timeout_s = timeout_s
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._request_ids = itertools.count(1)
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self.model_info: Dict[str, Any] = {}
+        self.reconnects = 0
+
+    async def _ensure_connected(self) -> asyncio.StreamWriter:
+        if self._writer is not None and not self._writer.is_closing():
+            return self._writer
+
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return self._writer
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path)
+            except OSError as e:
+                raise ModelError(f"Servicio de inferencia no disponible: {str(e)}")
+            self.reconnects += 1
+            # Cada conexión tiene sus propias respuestas pendientes
+            self._writer, self._pending = writer, {}
+            self._reader_task = asyncio.get_running_loop().create_task(
+                self._read_responses(reader, writer, self._pending)
+            )
+        return self._writer
+
+    async def _read_responses(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                              pending: Dict[int, asyncio.Future]) -> None:
+        try:
+            while True:
+                request_id, msg_type, payload = await read_message(reader)
+                future = pending.pop(request_id, None)
+                if future is None or future.done():
+                    continue
+                if msg_type == MSG_ERROR:
+                    future.set_exception(ModelError(payload.decode(errors="replace")))
+                else:
+                    future.set_result((msg_type, payload))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            # El sidecar se reinició o cerró: fallar lo pendiente y reconectar en el próximo frame
+            writer.close()
+            if self._writer is writer:
+                self._writer = None
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(ModelError("Conexión con el servicio de inferencia perdida"))
+            pending.clear()
+
+    async def _request(self, msg_type: int, payload: bytes = b"") -> Tuple[int, bytes]:
+        writer = await self._ensure_connected()
+        pending = self._pending
+        request_id = next(self._request_ids) & 0xFFFFFFFF
+        future = asyncio.get_running_loop().create_future()
+        pending[request_id] = future
+        writer.write(encode_message(request_id, msg_type, payload))
+        try:
+            await writer.drain()
+            return await asyncio.wait_for(future, self.timeout_s)
+        except asyncio.TimeoutError:
+            raise ModelError("Tiempo de inferencia agotado")
+        except ConnectionError as e:
+            raise ModelError(f"Conexión con el servicio de inferencia perdida: {str(e)}")
+        finally:
+            pending.pop(request_id, None)
+
+    async def analyze(self, image_data: bytes, target_letter: Optional[str] = None,
+                      tier: Optional[QualityTier] = None) -> Tuple[Optional[np.ndarray], Optional[Dict[str, Any]]]:
+        target = encode_letter(target_letter.upper() if isinstance(target_letter, str) else target_letter)
+        quality = (tier.model_complexity, tier.max_side) if tier is not None else (1, 0)
+        _, payload = await self._request(MSG_FRAME, FRAME_HEADER.pack(target, *quality) + image_data)
+        return decode_result(payload)
+
+    async def refresh_info(self) -> Dict[str, Any]:
+        _, payload = await self._request(MSG_INFO)
+        self.model_info = loads(payload)
+        return self.model_info
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sidecar de inferencia de COMSIGNS")
+    parser.add_argument("--socket", default=settings.SIDECAR_SOCKET)
+    parser.add_argument("--max-batch", type=int, default=settings.SIDECAR_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=settings.SIDECAR_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOG_LEVEL.upper())
+    # El sidecar es quien carga el modelo, no un cliente de sí mismo
+    settings.INFERENCE_BACKEND = "local"
+
+    sidecar = InferenceSidecar(args.socket, args.max_batch, args.max_wait_ms)
+    try:
+        asyncio.run(sidecar.serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
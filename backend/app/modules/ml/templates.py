@@ -0,0 +1,248 @@
+"""
+Plantillas por letra y corrección por dedo para el tutorial y la práctica
+
+Al iniciar se calcula, para cada letra del dataset de entrenamiento
+(app.modules.ml.dataset), la pose mediana y la covarianza de cada dedo
+(4 landmarks x 3 coordenadas). Los landmarks se dividen por la distancia
+muñeca -> base del dedo medio, así que la plantilla no depende del tamaño
+de la mano en la imagen.
+
+Para un frame con letra objetivo, la desviación de cada dedo es la
+distancia de Mahalanobis a la plantilla dividida por su tolerancia: el
+cuantil TEMPLATE_TOLERANCE_QUANTILE de esa misma distancia en las
+muestras de la letra (1.0 = en el borde de lo que se ve en el dataset).
+Todo se precalcula en una matriz de blanqueo (60, 63) por letra con la
+escala y la mediana ya plegadas, así que un frame cuesta dos productos
+matriz-vector y unas pocas operaciones en el lugar (~6 µs de NumPy,
+~14 µs con el armado de la respuesta).
+"""
+
+import logging
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import register_metrics
+from app.modules.ml.dataset import LandmarkDataset, load_dataset
+from app.modules.ml.landmarks import FEATURE_SIZE, LANDMARK_COUNT
+
+logger = logging.getLogger(__name__)
+
+FINGERS = ("thumb", "index", "middle", "ring", "pinky")
+FINGER_NAMES = {
+    "thumb": "pulgar",
+    "index": "índice",
+    "middle": "dedo medio",
+    "ring": "anular",
+    "pinky": "meñique",
+}
+HINTS = {
+    "extend": "Estira más el {finger}",
+    "bend": "Dobla más el {finger}",
+    "adjust": "Revisa la posición del {finger}",
+}
+
+# Landmark 9 (base del dedo medio): su distancia a la muñeca es la escala de la mano
+SCALE_LANDMARK = 9
+# 4 landmarks por dedo a partir del 1 (el 0 es la muñeca): base y punta de cada uno
+FINGER_POINTS = len(FINGERS) * 4 * 3
+FINGER_BASES = [1 + 4 * finger for finger in range(len(FINGERS))]
+FINGER_TIPS = [4 + 4 * finger for finger in range(len(FINGERS))]
+# Ridge relativo sobre la covarianza de cada dedo (pocas muestras por letra)
+COVARIANCE_RIDGE = 1e-2
+# Diferencia relativa de largo base -> punta a partir de la cual el dedo está estirado o doblado de más
+EXTENSION_MARGIN = 0.1
+
+
+def hand_scale(points: np.ndarray) -> np.ndarray:
+    """
+    Distancia muñeca -> base del dedo medio de landmarks (..., 21, 3) relativos a la muñeca
+    """
+    return np.linalg.norm(points[..., SCALE_LANDMARK, :], axis=-1)
+
+
+class LetterTemplates:
+    """
+    Plantillas de todas las letras del dataset; feedback() evalúa un frame contra una
+    """
+
+    def __init__(self, dataset: LandmarkDataset, quantile: float):
+        points = dataset.features.reshape(-1, LANDMARK_COUNT, 3)
+        scales = hand_scale(points)
+        valid = scales > 1e-6
+        normalized = points / np.where(valid, scales, 1.0)[:, None, None]
+
+        self.letters = [letter for label, letter in enumerate(dataset.letters)
+                        if np.any(valid & (dataset.labels == label))]
+        self.index = {letter: row for row, letter in enumerate(self.letters)}
+        count = len(self.letters)
+        self.reference = np.zeros((count, LANDMARK_COUNT, 3), dtype=np.float32)
+        self.extension = np.zeros((count, len(FINGERS)), dtype=np.float32)
+        # z = whitening @ landmarks / escala - offset: componentes blanqueadas de cada dedo
+        self.whitening = np.zeros((count, FINGER_POINTS, FEATURE_SIZE), dtype=np.float32)
+        self.offset = np.zeros((count, FINGER_POINTS), dtype=np.float32)
+        # deviation² = selector @ z²: suma por dedo dividida por la tolerancia²
+        self.selector = np.zeros((count, len(FINGERS), FINGER_POINTS), dtype=np.float32)
+
+        for row, letter in enumerate(self.letters):
+            members = valid & (dataset.labels == dataset.letters.index(letter))
+            samples = normalized[members]
+            median = np.median(samples, axis=0)
+            self.reference[row] = median * np.median(scales[members])
+            self.extension[row] = self._extension(median)
+
+            fingers = samples[:, 1:].reshape(len(samples), len(FINGERS), 12)
+            centered = fingers - median[1:].reshape(len(FINGERS), 12)
+            covariance = np.einsum("nfi,nfj->fij", centered, centered) / len(samples)
+            ridge = COVARIANCE_RIDGE * np.trace(covariance, axis1=1, axis2=2) / 12 + 1e-8
+            covariance += ridge[:, None, None] * np.eye(12)
+            # inv(cov) = L L^T  =>  distancia² = |L^T (x - mediana)|²
+            blocks = np.swapaxes(np.linalg.cholesky(np.linalg.inv(covariance)), 1, 2)
+            distances = np.linalg.norm(np.einsum("fij,nfj->nfi", blocks, centered), axis=2)
+            tolerance = np.maximum(np.quantile(distances, quantile, axis=0), 1e-6)
+
+            for finger in range(len(FINGERS)):
+                rows = slice(12 * finger, 12 * (finger + 1))
+                columns = slice(3 + 12 * finger, 3 + 12 * (finger + 1))
+                self.whitening[row, rows, columns] = blocks[finger]
+                self.selector[row, finger, rows] = 1.0 / tolerance[finger] ** 2
+            self.offset[row] = self.whitening[row] @ median.reshape(FEATURE_SIZE)
+
+    @staticmethod
+    def _extension(points: np.ndarray) -> np.ndarray:
+        return np.linalg.norm(points[FINGER_TIPS] - points[FINGER_BASES], axis=-1)
+
+    def __len__(self) -> int:
+        return len(self.letters)
+
+    def feedback(self, letter: str, landmarks: np.ndarray) -> Optional[Dict[str, Any]]:
+        """
+        Desviación por dedo respecto de la plantilla de letter y el dedo a corregir
+
+        landmarks son los 21 x 3 relativos a la muñeca (como los entrega
+        extract_landmarks). None si la letra no tiene plantilla.
+        """
+        row = self.index.get(letter.upper())
+        if row is None:
+            return None
+        flat = np.asarray(landmarks, dtype=np.float32).reshape(FEATURE_SIZE)
+        x, y, z = flat[3 * SCALE_LANDMARK:3 * SCALE_LANDMARK + 3].tolist()
+        scale = math.sqrt(x * x + y * y + z * z)
+        if scale < 1e-6:
+            return None
+
+        whitened = self.whitening[row] @ flat
+        whitened *= 1.0 / scale
+        whitened -= self.offset[row]
+        whitened *= whitened
+        deviations = [math.sqrt(value) for value in (self.selector[row] @ whitened).tolist()]
+
+        worst = deviations.index(max(deviations))
+        feedback = {
+            "target": letter.upper(),
+            "ok": deviations[worst] <= 1.0,
+            "finger": None,
+            "action": None,
+            "hint": None,
+            "deviation": {finger: round(value, 2) for finger, value in zip(FINGERS, deviations)},
+        }
+        if not feedback["ok"]:
+            finger = FINGERS[worst]
+            action = self._action(row, worst, flat, scale)
+            feedback.update(finger=finger, action=action,
+                            hint=HINTS[action].format(finger=FINGER_NAMES[finger]))
+        return feedback
+
+    def _action(self, row: int, finger: int, flat: np.ndarray, scale: float) -> str:
+        # Largo base -> punta del dedo contra el de la plantilla
+        tip, base = 3 * FINGER_TIPS[finger], 3 * FINGER_BASES[finger]
+        length = math.dist(flat[tip:tip + 3].tolist(), flat[base:base + 3].tolist()) / scale
+        expected = float(self.extension[row, finger])
+        if length < expected * (1 - EXTENSION_MARGIN):
+            return "extend"
+        if length > expected * (1 + EXTENSION_MARGIN):
+            return "bend"
+        return "adjust"
+
+    def reference_landmarks(self, letter: str) -> Optional[List[List[float]]]:
+        """
+        Pose mediana de la letra (21 x 3, relativa a la muñeca) para dibujarla como guía
+        """
+        row = self.index.get(letter.upper())
+        if row is None:
+            return None
+        return np.round(self.reference[row].astype(np.float64), 4).tolist()
+
+
+class _TemplateStats:
+    def __init__(self):
+        self.frames = 0
+        self.ok = 0
+        self.busy_s = 0.0
+        self.off = {finger: 0 for finger in FINGERS}
+
+    def observe(self, feedback: Dict[str, Any], elapsed_s: float) -> None:
+        self.frames += 1
+        self.busy_s += elapsed_s
+        if feedback["ok"]:
+            self.ok += 1
+        else:
+            self.off[feedback["finger"]] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.TEMPLATES_ENABLED,
+            "letters": len(_templates) if _templates is not None else 0,
+            "frames": self.frames,
+            "ok": self.ok,
+            "off_by_finger": dict(self.off),
+            "us_per_frame": round(self.busy_s / self.frames * 1e6, 2) if self.frames else 0.0,
+        }
+
+
+template_stats = _TemplateStats()
+register_metrics("templates", template_stats.summary)
+
+
+_templates: Optional[LetterTemplates] = None
+_templates_loaded = False
+_templates_lock = threading.Lock()
+
+
+def load_templates(letters: List[str]) -> Optional[LetterTemplates]:
+    """
+    Plantillas del dataset de entrenamiento, calculadas una sola vez; None si no hay dataset
+    """
+    global _templates, _templates_loaded
+    if _templates_loaded:
+        return _templates
+    with _templates_lock:
+        if not _templates_loaded:
+            dataset = load_dataset(letters)
+            if dataset is not None:
+                started = time.perf_counter()
+                _templates = LetterTemplates(dataset, settings.TEMPLATE_TOLERANCE_QUANTILE)
+                logger.info(
+                    f"Plantillas por letra: {len(_templates)} letras "
+                    f"en {(time.perf_counter() - started) * 1000:.0f}ms"
+                )
+            _templates_loaded = True
+    return _templates
+
+
+def finger_feedback(letter: str, landmarks: np.ndarray) -> Optional[Dict[str, Any]]:
+    """
+    Corrección por dedo de un frame contra la letra objetivo; None sin plantillas o sin letra
+    """
+    templates = _templates
+    if templates is None or not settings.TEMPLATES_ENABLED or not isinstance(letter, str):
+        return None
+    started = time.perf_counter()
+    feedback = templates.feedback(letter, landmarks)
+    if feedback is not None:
+        template_stats.observe(feedback, time.perf_counter() - started)
+    return feedback
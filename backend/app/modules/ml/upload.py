@@ -0,0 +1,467 @@
+"""
+Lectura acotada de imágenes subidas a /ml/predict/upload
+
+El cuerpo se lee por chunks desde la conexión (sin UploadFile, que
+escribe el archivo completo a disco o memoria antes del handler) y la
+imagen se copia a un UploadBuffer de tamaño acotado:
+
+    - Content-Length mayor que MAX_UPLOAD_SIZE: 413 sin leer el cuerpo
+    - más de MAX_UPLOAD_SIZE bytes de imagen: 413 en cuanto se superan
+    - primeros bytes que no son JPEG, PNG, WebP ni BMP: 415 sin leer el resto
+
+Acepta multipart/form-data (campo "file", parser incremental de
+python-multipart) o el cuerpo crudo con Content-Type image/*. La imagen
+se entrega como memoryview del buffer, que se devuelve a un pool al
+terminar la predicción para reutilizarlo en la siguiente subida.
+
+iter_multipart_images hace lo mismo con varios archivos por request
+(/ml/predict/batch): cada imagen se entrega en cuanto termina de llegar.
+"""
+
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.core.exceptions import PayloadTooLargeError, UnsupportedMediaError, ValidationError
+from app.core.metrics import register_metrics
+
+# Encabezados de multipart (boundary, Content-Disposition, ...) además de la imagen
+MULTIPART_OVERHEAD = 16 * 1024
+INITIAL_CAPACITY = 256 * 1024
+# Buffers libres que se conservan entre subidas, y el tamaño máximo de uno conservado
+POOL_SIZE = 4
+RETAIN_MAX_BYTES = 2 * 1024 * 1024
+SNIFF_BYTES = 12
+
+
+def sniff_image(head: bytes) -> Optional[str]:
+    """
+    Tipo de imagen según los primeros bytes (los formatos que decodifica cv2.imdecode)
+    """
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith(b"BM"):
+        return "image/bmp"
+    return None
+
+
+class UploadBuffer:
+    """
+    bytearray reutilizable con longitud propia; crece al doble hasta el límite
+    """
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self._data = bytearray(capacity)
+        self.length = 0
+        self.media_type: Optional[str] = None
+
+    @property
+    def capacity(self) -> int:
+        return len(self._data)
+
+    def append(self, chunk, start: int = 0, end: Optional[int] = None) -> None:
+        end = len(chunk) if end is None else end
+        size = end - start
+        if self.length + size > settings.MAX_UPLOAD_SIZE:
+            raise PayloadTooLargeError(f"La imagen supera el máximo de {settings.MAX_UPLOAD_SIZE} bytes")
+        if self.length + size > len(self._data):
+            grown = bytearray(min(settings.MAX_UPLOAD_SIZE, max(len(self._data) * 2, self.length + size)))
+            grown[:self.length] = memoryview(self._data)[:self.length]
+            self._data = grown
+        memoryview(self._data)[self.length:self.length + size] = memoryview(chunk)[start:end]
+        self.length += size
+
+        if self.media_type is None and self.length >= SNIFF_BYTES:
+            self._check_image()
+
+    def _check_image(self) -> None:
+        self.media_type = sniff_image(bytes(self._data[:min(self.length, SNIFF_BYTES)]))
+        if self.media_type is None:
+            raise UnsupportedMediaError("El archivo debe ser una imagen JPEG, PNG, WebP o BMP")
+
+    def finish(self) -> memoryview:
+        """
+        Validar lo recibido y devolver la imagen sin copiarla
+        """
+        if self.length == 0:
+            raise ValidationError("No se recibió ninguna imagen")
+        if self.media_type is None:
+            self._check_image()
+        return memoryview(self._data)[:self.length]
+
+    def reset(self) -> None:
+        self.length = 0
+        self.media_type = None
+
+
+def sniff_video(head: bytes) -> Optional[str]:
+    """
+    Contenedor de video según los primeros bytes (los que abre cv2.VideoCapture con FFmpeg)
+    """
+    if head[4:8] == b"ftyp":
+        return "video/mp4"  # MP4, MOV, 3GP
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "video/webm"  # WebM, Matroska
+    if head.startswith(b"RIFF") and head[8:12] == b"AVI ":
+        return "video/x-msvideo"
+    return None
+
+
+class FileSink:
+    """
+    Destino en archivo con la interfaz de UploadBuffer, para subidas que no caben en memoria (videos)
+    """
+
+    def __init__(self, file, limit: int):
+        self.file = file
+        self.limit = limit
+        self.length = 0
+        self.media_type: Optional[str] = None
+        self._head = b""
+
+    def append(self, chunk, start: int = 0, end: Optional[int] = None) -> None:
+        end = len(chunk) if end is None else end
+        size = end - start
+        if self.length + size > self.limit:
+            raise PayloadTooLargeError(f"El video supera el máximo de {self.limit} bytes")
+        data = memoryview(chunk)[start:end]
+        if self.media_type is None and len(self._head) < SNIFF_BYTES:
+            self._head += bytes(data[:SNIFF_BYTES - len(self._head)])
+            if len(self._head) >= SNIFF_BYTES:
+                self._check_video()
+        self.file.write(data)
+        self.length += size
+
+    def _check_video(self) -> None:
+        self.media_type = sniff_video(self._head)
+        if self.media_type is None:
+            raise UnsupportedMediaError("El archivo debe ser un video MP4, MOV, WebM, MKV o AVI")
+
+    def finish(self) -> int:
+        if self.length == 0:
+            raise ValidationError("No se recibió ningún video")
+        if self.media_type is None:
+            self._check_video()
+        self.file.flush()
+        return self.length
+
+
+class UploadBufferPool:
+    """
+    Buffers libres entre subidas; cada subida en curso usa uno propio
+    """
+
+    def __init__(self):
+        self._free: List[UploadBuffer] = []
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.created = 0
+        self.accepted = 0
+        self.rejected: Dict[str, int] = {"too_large": 0, "not_image": 0, "invalid": 0}
+        self.peak_bytes = 0
+
+    def acquire(self) -> UploadBuffer:
+        with self._lock:
+            if self._free:
+                self.reused += 1
+                return self._free.pop()
+            self.created += 1
+        return UploadBuffer()
+
+    def release(self, buffer: UploadBuffer, reusable: bool = True) -> None:
+        """
+        reusable=False si algo podría seguir leyendo el memoryview (p. ej. request cancelada)
+        """
+        self.peak_bytes = max(self.peak_bytes, buffer.length)
+        buffer.reset()
+        if not reusable or buffer.capacity > RETAIN_MAX_BYTES:
+            return
+        with self._lock:
+            if len(self._free) < POOL_SIZE:
+                self._free.append(buffer)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "max_upload_bytes": settings.MAX_UPLOAD_SIZE,
+            "accepted": self.accepted,
+            "rejected": dict(self.rejected),
+            "peak_image_bytes": self.peak_bytes,
+            "buffers_created": self.created,
+            "buffers_reused": self.reused,
+            "free_buffers": len(self._free),
+        }
+
+
+upload_buffers = UploadBufferPool()
+register_metrics("uploads", upload_buffers.summary)
+
+
+class _MultipartReader:
+    """
+    Callbacks del parser incremental: encabezados de cada parte y sus datos
+    """
+
+    def __init__(self):
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+
+    def callbacks(self) -> Dict[str, Any]:
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self.part_data,
+            "on_part_end": self.part_end,
+        }
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        filename = options.get(b"filename")
+        self.part_begin(
+            options.get(b"name", b"").decode("latin-1"),
+            filename.decode("utf-8", "replace") if filename is not None else None,
+            self._headers.get(b"content-type")
+        )
+
+    def part_begin(self, name: str, filename: Optional[str], content_type: Optional[bytes]) -> None:
+        pass
+
+    def part_data(self, data: bytes, start: int, end: int) -> None:
+        pass
+
+    def part_end(self) -> None:
+        pass
+
+
+def _check_part_type(content_type: Optional[bytes], media_prefix: bytes = b"image/") -> None:
+    if content_type is not None and not content_type.lower().startswith(media_prefix):
+        kind = "una imagen" if media_prefix == b"image/" else "un video"
+        raise UnsupportedMediaError(f"El archivo debe ser {kind}")
+
+
+class _MultipartFileReader(_MultipartReader):
+    """
+    Copiar al buffer (o FileSink) solo los datos de la parte del campo indicado
+    """
+
+    def __init__(self, buffer: Any, field: str, media_prefix: bytes):
+        super().__init__()
+        self.buffer = buffer
+        self.field = field
+        self.media_prefix = media_prefix
+        self.found = False
+        self._in_file = False
+
+    def part_begin(self, name: str, filename: Optional[str], content_type: Optional[bytes]) -> None:
+        self._in_file = False
+        if name != self.field or self.found:
+            return
+        _check_part_type(content_type, self.media_prefix)
+        self.found = self._in_file = True
+
+    def part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_file:
+            self.buffer.append(data, start, end)
+
+
+class _MultipartImagesReader(_MultipartReader):
+    """
+    Cada parte con archivo va a su propio buffer; los errores de una parte no cortan las demás
+    """
+
+    def __init__(self):
+        super().__init__()
+        # (nombre de archivo, buffer o None, error o None) de las partes terminadas
+        self.completed: List[Tuple[str, Optional[UploadBuffer], Optional[ValidationError]]] = []
+        self._current: Optional[UploadBuffer] = None
+        self._filename = ""
+        self._error: Optional[ValidationError] = None
+        self._is_file = False
+
+    def part_begin(self, name: str, filename: Optional[str], content_type: Optional[bytes]) -> None:
+        self._is_file = filename is not None
+        if not self._is_file:
+            return  # Campos de texto del formulario
+        self._filename = filename
+        self._error = None
+        self._current = upload_buffers.acquire()
+        try:
+            _check_part_type(content_type)
+        except ValidationError as e:
+            self._fail(e)
+
+    def part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._current is None:
+            return
+        try:
+            self._current.append(data, start, end)
+        except ValidationError as e:
+            self._fail(e)
+
+    def _fail(self, error: ValidationError) -> None:
+        # El resto de la parte se descarta sin copiarlo
+        self._error = error
+        upload_buffers.release(self._current)
+        self._current = None
+
+    def part_end(self) -> None:
+        if not self._is_file:
+            return
+        self._is_file = False
+        buffer, self._current = self._current, None
+        self.completed.append((self._filename, buffer, self._error))
+
+    def release_pending(self) -> None:
+        for _, buffer, _ in self.completed:
+            if buffer is not None:
+                upload_buffers.release(buffer)
+        self.completed.clear()
+        if self._current is not None:
+            upload_buffers.release(self._current)
+            self._current = None
+
+
+async def read_image_upload(request: Request, buffer: UploadBuffer, field: str = "file") -> memoryview:
+    """
+    Leer la imagen de la request en buffer; lanza ValidationError (o sus subclases) al rechazarla
+    """
+    try:
+        image = await _read_into(request, buffer, field)
+    except PayloadTooLargeError:
+        upload_buffers.rejected["too_large"] += 1
+        raise
+    except UnsupportedMediaError:
+        upload_buffers.rejected["not_image"] += 1
+        raise
+    except ValidationError:
+        upload_buffers.rejected["invalid"] += 1
+        raise
+    upload_buffers.accepted += 1
+    return image
+
+
+async def read_video_upload(request: Request, sink: "FileSink", field: str = "file") -> int:
+    """
+    Escribir el video de la request en sink; devuelve los bytes escritos
+    """
+    return await _read_into(request, sink, field, b"video/", sink.limit)
+
+
+async def _read_into(request: Request, buffer: Any, field: str, media_prefix: bytes = b"image/",
+                     limit: Optional[int] = None) -> Any:
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    multipart = content_type == b"multipart/form-data"
+    if not multipart and not content_type.startswith(media_prefix):
+        raise UnsupportedMediaError(
+            f"Enviar el archivo como multipart/form-data o con Content-Type {media_prefix.decode()}*"
+        )
+
+    limit = settings.MAX_UPLOAD_SIZE if limit is None else limit
+    body_limit = limit + (MULTIPART_OVERHEAD if multipart else 0)
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > body_limit:
+        raise PayloadTooLargeError(f"El archivo supera el máximo de {limit} bytes")
+
+    if not multipart:
+        async for chunk in request.stream():
+            buffer.append(chunk)
+        return buffer.finish()
+
+    reader = _MultipartFileReader(buffer, field, media_prefix)
+    async for _ in _feed_multipart(request, options, reader, body_limit):
+        pass
+
+    if not reader.found:
+        raise ValidationError(f"Campo '{field}' requerido")
+    return buffer.finish()
+
+
+async def _feed_multipart(request: Request, options: Dict[bytes, bytes], reader: _MultipartReader,
+                          body_limit: int) -> AsyncIterator[None]:
+    """
+    Pasar el cuerpo al parser por chunks; cede el control después de cada chunk
+    """
+    boundary = options.get(b"boundary")
+    if not boundary:
+        raise ValidationError("multipart/form-data sin boundary")
+    parser = MultipartParser(boundary, reader.callbacks())
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > body_limit:
+            # Otras partes del formulario también cuentan: el cuerpo entero queda acotado
+            raise PayloadTooLargeError(f"La solicitud supera el máximo de {body_limit} bytes")
+        try:
+            parser.write(chunk)
+        except ValidationError:
+            raise
+        except Exception as e:
+            raise ValidationError(f"multipart/form-data inválido: {str(e)}")
+        yield
+    parser.finalize()
+    yield
+
+
+async def iter_multipart_images(request: Request, body_limit: int
+                                ) -> AsyncIterator[Tuple[str, Optional[UploadBuffer], Optional[ValidationError]]]:
+    """
+    Imágenes de un multipart/form-data con varios archivos, a medida que terminan de llegar
+
+    Cada imagen llega en un UploadBuffer del pool que el consumidor debe
+    liberar (upload_buffers.release). Una parte rechazada (tamaño o tipo)
+    llega con buffer None y su error; el resto del formulario sigue. El
+    cuerpo no se sigue leyendo mientras el consumidor no pida la siguiente.
+    """
+    _, options = parse_options_header(request.headers.get("content-type", ""))
+    reader = _MultipartImagesReader()
+    try:
+        async for _ in _feed_multipart(request, options, reader, body_limit):
+            while reader.completed:
+                filename, buffer, error = reader.completed.pop(0)
+                if buffer is not None:
+                    try:
+                        buffer.finish()
+                    except ValidationError as e:
+                        upload_buffers.release(buffer)
+                        buffer, error = None, e
+                yield filename, buffer, error
+    finally:
+        reader.release_pending()
+
+
+async def read_body(request: Request, limit: int) -> bytes:
+    """
+    Leer el cuerpo completo (JSON, zip) con un máximo de bytes
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > limit:
+        raise PayloadTooLargeError(f"La solicitud supera el máximo de {limit} bytes")
+    body = bytearray()
+    async for chunk in request.stream():
+        if len(body) + len(chunk) > limit:
+            raise PayloadTooLargeError(f"La solicitud supera el máximo de {limit} bytes")
+        body += chunk
+    return bytes(body)
@@ -0,0 +1,316 @@
+"""
+Análisis de clips de video: /ml/predict/video
+
+El video se escribe a un archivo temporal mientras llega (acotado por
+VIDEO_MAX_BYTES) y luego se decodifica frame a frame con cv2.VideoCapture
+en un hilo. Solo se analizan sample_fps frames por segundo de video: los
+demás se saltan con grab(), que avanza el demuxer sin convertir el frame
+a BGR. Hay a lo sumo VIDEO_MAX_IN_FLIGHT frames decodificados en análisis
+a la vez, así que la memoria no depende del largo del clip.
+
+Los frames se analizan con prioridad batch y los resultados se consumen
+en orden; las corridas de frames consecutivos con la misma letra
+(status success) forman segmentos. La respuesta es NDJSON: una línea por
+segmento en cuanto se cierra y una línea final de resumen con el
+throughput (frames por segundo decodificados y analizados).
+"""
+
+import asyncio
+import collections
+import os
+import tempfile
+import time
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.core.exceptions import UnsupportedMediaError
+from app.core.metrics import register_metrics
+from app.core.serialization import dumps
+from app.modules.ml.services import ml_service
+from app.modules.ml.upload import FileSink, read_video_upload
+
+# FPS supuestos si el contenedor no los informa
+DEFAULT_VIDEO_FPS = 30.0
+
+SUFFIXES = {"video/mp4": ".mp4", "video/webm": ".webm", "video/x-msvideo": ".avi"}
+
+
+class _VideoStats:
+    def __init__(self):
+        self.clips = 0
+        self.failed = 0
+        self.frames_decoded = 0
+        self.frames_analyzed = 0
+        self.segments = 0
+        self.video_s = 0.0
+        self.busy_s = 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "clips": self.clips,
+            "failed": self.failed,
+            "frames_decoded": self.frames_decoded,
+            "frames_analyzed": self.frames_analyzed,
+            "segments": self.segments,
+            "video_s": round(self.video_s, 1),
+            "decode_fps": round(self.frames_decoded / self.busy_s, 1) if self.busy_s else 0.0,
+            "analyzed_fps": round(self.frames_analyzed / self.busy_s, 1) if self.busy_s else 0.0,
+            # Segundos de video por segundo de procesamiento
+            "realtime_factor": round(self.video_s / self.busy_s, 2) if self.busy_s else 0.0,
+        }
+
+
+video_stats = _VideoStats()
+register_metrics("video", video_stats.summary)
+
+
+# ==============================================
+# 📥 ARCHIVO Y DECODIFICACIÓN
+# ==============================================
+
+async def save_video_upload(request: Request) -> Tuple[str, int]:
+    """
+    Escribir el video de la request a un archivo temporal; devuelve (ruta, bytes)
+
+    Lanza ValidationError (o sus subclases) si el video no se acepta; si
+    se acepta, el archivo queda a cargo del llamador (ver open_video).
+    """
+    directory = settings.UPLOAD_DIR if os.path.isdir(settings.UPLOAD_DIR) else None
+    file = tempfile.NamedTemporaryFile(prefix="clip-", dir=directory, delete=False)
+    try:
+        with file:
+            sink = FileSink(file, settings.VIDEO_MAX_BYTES)
+            size = await read_video_upload(request, sink)
+    except BaseException:
+        os.unlink(file.name)
+        raise
+    # FFmpeg elige el demuxer por contenido, pero algunos builds usan la extensión
+    path = file.name + SUFFIXES.get(sink.media_type, "")
+    os.rename(file.name, path)
+    return path, size
+
+
+class VideoFrames:
+    """
+    Frames muestreados de un video: (índice, segundo, imagen BGR)
+    """
+
+    def __init__(self, path: str, sample_fps: float):
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            self.capture.release()
+            raise UnsupportedMediaError("No se pudo abrir el video (formato o códec no soportado)")
+        fps = self.capture.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and 0 < fps < 1000 else DEFAULT_VIDEO_FPS
+        # Analizar uno de cada step frames; sample_fps <= 0 analiza todos
+        self.step = max(1, round(self.fps / sample_fps)) if sample_fps > 0 else 1
+        self.decoded = 0
+        self._frames: Optional[Iterator[Tuple[int, float, np.ndarray]]] = None
+
+    def __iter__(self) -> Iterator[Tuple[int, float, np.ndarray]]:
+        self._frames = self._iterate()
+        return self._frames
+
+    def _iterate(self) -> Iterator[Tuple[int, float, np.ndarray]]:
+        try:
+            while True:
+                index = self.decoded
+                if not self.capture.grab():
+                    return
+                self.decoded += 1
+                if index % self.step:
+                    continue
+                ok, frame = self.capture.retrieve()
+                if ok:
+                    yield index, index / self.fps, frame
+        finally:
+            self.capture.release()
+
+    @property
+    def duration_s(self) -> float:
+        return self.decoded / self.fps
+
+    def close(self) -> None:
+        """
+        Liberar el VideoCapture (también si nunca se iteró); se puede llamar más de una vez
+        """
+        if self._frames is not None:
+            try:
+                self._frames.close()
+            except ValueError:
+                return  # Un hilo sigue en grab(): el VideoCapture se libera al terminar el generador
+        self.capture.release()
+
+
+def discard_video(path: str, frames: VideoFrames) -> None:
+    """
+    Liberar el video y borrar su archivo temporal; idempotente
+
+    Corre como tarea de fondo de la respuesta: si el cliente se desconecta
+    antes de que empiece el cuerpo, stream_video_segments nunca arranca y
+    su finally no se ejecuta.
+    """
+    frames.close()
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+async def open_video(path: str, sample_fps: float) -> VideoFrames:
+    """
+    Abrir el video antes de responder, para rechazar con 415 lo que FFmpeg no puede leer
+
+    Si falla, borra el archivo y lanza UnsupportedMediaError.
+    """
+    try:
+        return await asyncio.to_thread(VideoFrames, path, sample_fps)
+    except BaseException:
+        video_stats.failed += 1
+        os.unlink(path)
+        raise
+
+
+async def _from_thread(frames: Iterator[Any]) -> AsyncIterator[Any]:
+    # Decodificar fuera del event loop
+    done = object()
+    while True:
+        frame = await asyncio.to_thread(next, frames, done)
+        if frame is done:
+            return
+        yield frame
+
+
+# ==============================================
+# 🔤 SEGMENTOS
+# ==============================================
+
+class LetterSegmenter:
+    """
+    Agrupar frames consecutivos con la misma letra en segmentos
+
+    Un frame sin mano, de baja confianza o con otra letra cierra la
+    corrida actual; las corridas de menos de min_frames frames se descartan
+    (transiciones entre letras).
+    """
+
+    def __init__(self, min_frames: int):
+        self.min_frames = max(1, min_frames)
+        self._letter = ""
+        self._start_s = self._end_s = 0.0
+        self._frames = 0
+        self._confidence = 0.0
+
+    def push(self, second: float, letter: str, confidence: float) -> Optional[Dict[str, Any]]:
+        """
+        Agregar un frame (letter="" si no hubo letra); devuelve el segmento que se cerró, si hubo uno
+        """
+        if letter and letter == self._letter:
+            self._end_s = second
+            self._frames += 1
+            self._confidence += confidence
+            return None
+        closed = self.flush()
+        if letter:
+            self._letter, self._start_s, self._end_s = letter, second, second
+            self._frames, self._confidence = 1, confidence
+        return closed
+
+    def flush(self) -> Optional[Dict[str, Any]]:
+        letter, frames, confidence = self._letter, self._frames, self._confidence
+        self._letter, self._frames, self._confidence = "", 0, 0.0
+        if not letter or frames < self.min_frames:
+            return None
+        return {
+            "type": "segment",
+            "letter": letter,
+            "start_s": round(self._start_s, 3),
+            "end_s": round(self._end_s, 3),
+            "frames": frames,
+            "confidence": round(confidence / frames, 4),
+        }
+
+
+# ==============================================
+# ⚙️ PROCESAMIENTO
+# ==============================================
+
+async def stream_video_segments(path: str, frames: VideoFrames) -> AsyncIterator[bytes]:
+    """
+    Analizar el video y emitir NDJSON: segmentos a medida que se cierran y un resumen
+
+    Borra el archivo al terminar (también si el cliente se desconecta a
+    mitad de la respuesta); la ruta repite la limpieza con discard_video
+    como tarea de fondo por si el generador no llega a empezar.
+    """
+    started = time.perf_counter()
+    video_stats.clips += 1
+    counts = {"frames_analyzed": 0, "no_hand_detected": 0, "errors": 0}
+    segmenter = LetterSegmenter(settings.VIDEO_MIN_SEGMENT_FRAMES)
+    pending: Deque[Tuple[float, asyncio.Task]] = collections.deque()
+    text = []
+
+    def record(second: float, task: asyncio.Task) -> Optional[Dict[str, Any]]:
+        counts["frames_analyzed"] += 1
+        video_stats.frames_analyzed += 1
+        try:
+            landmarks, result = task.result()
+        except Exception:
+            counts["errors"] += 1
+            return segmenter.push(second, "", 0.0)
+        if landmarks is None:
+            counts["no_hand_detected"] += 1
+            return segmenter.push(second, "", 0.0)
+        letter = result["letter"] if result["status"] == "success" else ""
+        return segmenter.push(second, letter, result["confidence"])
+
+    def segment_line(segment: Dict[str, Any]) -> bytes:
+        text.append(segment["letter"])
+        video_stats.segments += 1
+        return dumps(segment) + b"\n"
+
+    try:
+        async for _, second, frame in _from_thread(iter(frames)):
+            pending.append((second, asyncio.create_task(ml_service.analyze_decoded_frame(frame))))
+            # Resultados en orden; sin lugar libre se deja de decodificar (contrapresión)
+            while len(pending) >= max(1, settings.VIDEO_MAX_IN_FLIGHT) or (pending and pending[0][1].done()):
+                second, task = pending.popleft()
+                await asyncio.wait([task])
+                segment = record(second, task)
+                if segment is not None:
+                    yield segment_line(segment)
+
+        while pending:
+            second, task = pending.popleft()
+            await asyncio.wait([task])
+            segment = record(second, task)
+            if segment is not None:
+                yield segment_line(segment)
+        segment = segmenter.flush()
+        if segment is not None:
+            yield segment_line(segment)
+
+        elapsed_s = time.perf_counter() - started
+        yield dumps({"summary": dict(
+            counts,
+            frames_decoded=frames.decoded,
+            duration_s=round(frames.duration_s, 3),
+            video_fps=round(frames.fps, 2),
+            sample_step=frames.step,
+            segments=len(text),
+            text="".join(text),
+            elapsed_ms=round(elapsed_s * 1000, 1),
+            decode_fps=round(frames.decoded / elapsed_s, 1) if elapsed_s else 0.0,
+            analyzed_fps=round(counts["frames_analyzed"] / elapsed_s, 1) if elapsed_s else 0.0,
+        )}) + b"\n"
+    finally:
+        for _, task in pending:
+            task.cancel()
+        video_stats.frames_decoded += frames.decoded
+        video_stats.video_s += frames.duration_s
+        video_stats.busy_s += time.perf_counter() - started
+        discard_video(path, frames)
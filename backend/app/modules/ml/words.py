@@ -0,0 +1,275 @@
+"""
+Decodificación de palabras deletreadas sobre el WebSocket de predicción
+
+El modelo clasifica cada frame por separado; aquí se arman palabras con
+los vectores de probabilidad de predict_letter de una conexión:
+
+    segmentación  una letra se acepta cuando el argmax se mantiene
+                  WORD_STABLE_FRAMES frames seguidos; WORD_GAP_FRAMES frames
+                  sin mano cierran la palabra
+    beam search   cada letra aceptada extiende las WORD_BEAM_WIDTH mejores
+                  hipótesis por los hijos del trie del léxico, con el log de
+                  la probabilidad media de la letra en su segmento
+
+El léxico (WORD_LEXICON_PATH, ordenado por frecuencia) se carga una vez
+en un trie compacto: una tabla (nodos, alfabeto) de índices de hijos, así
+que extender el beam es una indexación y un top-k sobre una matriz
+(beam, alfabeto). Las letras que el modelo no predice (J, Z, Ñ) tienen la
+probabilidad mínima WORD_MIN_LETTER_PROB: las palabras que las contienen
+siguen siendo alcanzables.
+"""
+
+import logging
+import os
+import threading
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import register_metrics
+
+logger = logging.getLogger(__name__)
+
+ALPHABET = "ABCDEFGHIJKLMNÑOPQRSTUVWXYZ"
+ALPHABET_INDEX = {letter: index for index, letter in enumerate(ALPHABET)}
+
+ROOT = 0
+
+
+def normalize_word(word: str) -> str:
+    """
+    Mayúsculas sin tildes ni diéresis; la Ñ se conserva
+    """
+    word = word.strip().upper().replace("Ñ", "\0")
+    word = "".join(c for c in unicodedata.normalize("NFD", word) if not unicodedata.combining(c))
+    return word.replace("\0", "Ñ")
+
+
+class LexiconTrie:
+    """
+    Trie de palabras en arreglos de numpy
+
+    children[nodo, letra] es el nodo hijo (-1 si no existe), terminal[nodo]
+    marca fin de palabra y best[nodo] es la palabra más frecuente que pasa
+    por el nodo (para sugerir cómo completar un prefijo).
+    """
+
+    def __init__(self, words: Iterable[str]):
+        rows: List[List[int]] = [[-1] * len(ALPHABET)]
+        terminal = [False]
+        best = [-1]
+        self.words: List[str] = []
+        seen = set()
+        for raw in words:
+            word = normalize_word(raw)
+            if not word or word in seen or any(c not in ALPHABET_INDEX for c in word):
+                continue
+            seen.add(word)
+            rank = len(self.words)
+            self.words.append(word)
+            node = ROOT
+            if best[node] < 0:
+                best[node] = rank
+            for letter in word:
+                column = ALPHABET_INDEX[letter]
+                child = rows[node][column]
+                if child < 0:
+                    child = rows[node][column] = len(rows)
+                    rows.append([-1] * len(ALPHABET))
+                    terminal.append(False)
+                    best.append(rank)  # Las palabras llegan por frecuencia: la primera es la mejor
+                node = child
+            terminal[node] = True
+
+        self.children = np.array(rows, dtype=np.int32)
+        self.terminal = np.array(terminal, dtype=bool)
+        self.best = np.array(best, dtype=np.int32)
+
+    @classmethod
+    def from_file(cls, path: str) -> "LexiconTrie":
+        with open(path, encoding="utf-8") as f:
+            return cls(line for line in f if not line.startswith("#"))
+
+    @property
+    def nodes(self) -> int:
+        return len(self.children)
+
+    def completion(self, node: int) -> Optional[str]:
+        rank = int(self.best[node])
+        return self.words[rank] if rank >= 0 else None
+
+
+_lexicon: Optional[LexiconTrie] = None
+_lexicon_loaded = False
+_lexicon_lock = threading.Lock()
+
+
+def load_lexicon() -> Optional[LexiconTrie]:
+    """
+    Léxico de WORD_LEXICON_PATH, cargado una sola vez; None si no existe (solo letras)
+    """
+    global _lexicon, _lexicon_loaded
+    if _lexicon_loaded:
+        return _lexicon
+    with _lexicon_lock:
+        if not _lexicon_loaded:
+            path = settings.WORD_LEXICON_PATH
+            if os.path.exists(path):
+                _lexicon = LexiconTrie.from_file(path)
+                logger.info(f"Léxico cargado: {len(_lexicon.words)} palabras, {_lexicon.nodes} nodos")
+            else:
+                logger.warning(f"Léxico no encontrado en {path}: las palabras se arman sin restricción")
+            _lexicon_loaded = True
+    return _lexicon
+
+
+class _WordStats:
+    def __init__(self):
+        self.decoders = 0
+        self.frames = 0
+        self.letters = 0
+        self.words = 0
+        self.out_of_lexicon = 0
+
+    def summary(self) -> Dict[str, Any]:
+        lexicon = _lexicon
+        return {
+            "enabled": settings.WORD_DECODER_ENABLED,
+            "lexicon_words": len(lexicon.words) if lexicon else 0,
+            "lexicon_nodes": lexicon.nodes if lexicon else 0,
+            "decoders": self.decoders,
+            "frames": self.frames,
+            "letters": self.letters,
+            "words": self.words,
+            "out_of_lexicon": self.out_of_lexicon,
+        }
+
+
+word_stats = _WordStats()
+register_metrics("word_decoder", word_stats.summary)
+
+
+class WordDecoder:
+    """
+    Decodificador de una conexión; push() recibe los frames en orden de llegada
+    """
+
+    def __init__(self, letters: Sequence[str], lexicon: Optional[LexiconTrie] = None):
+        self.lexicon = lexicon
+        self.beam_width = max(1, settings.WORD_BEAM_WIDTH)
+        self.stable_frames = max(1, settings.WORD_STABLE_FRAMES)
+        self.gap_frames = max(1, settings.WORD_GAP_FRAMES)
+        # Columna del alfabeto de cada salida del modelo
+        self._columns = np.array([ALPHABET_INDEX[letter] for letter in letters], dtype=np.intp)
+        self._emission = np.zeros(len(ALPHABET), dtype=np.float32)
+        self._segment = np.zeros(len(letters), dtype=np.float32)
+        word_stats.decoders += 1
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Descartar la palabra en curso
+        """
+        self.letters = ""
+        self._candidate = -1
+        self._run = 0
+        self._gap = 0
+        self._nodes = np.zeros(1, dtype=np.int32)
+        self._scores = np.zeros(1, dtype=np.float64)
+        self._texts = [""]
+
+    def push(self, probabilities: Optional[np.ndarray]) -> Optional[Dict[str, Any]]:
+        """
+        Agregar un frame (None si no hubo mano); devuelve un mensaje "word" si cambió la palabra
+        """
+        word_stats.frames += 1
+        if probabilities is None:
+            self._candidate, self._run = -1, 0
+            self._gap += 1
+            if self._gap == self.gap_frames and self.letters:
+                return self.finish()
+            return None
+
+        self._gap = 0
+        probabilities = probabilities[:len(self._columns)]
+        if len(probabilities) != len(self._columns):
+            return None  # Salida del modelo sin una columna por letra
+        top = int(np.argmax(probabilities))
+        if top != self._candidate:
+            self._candidate, self._run = top, 1
+            self._segment[:] = probabilities
+            return None
+
+        self._run += 1
+        self._segment += probabilities
+        # Una letra por segmento estable: repetirla requiere un cambio o un hueco
+        if self._run != self.stable_frames:
+            return None
+        return self._accept(self._segment / self._run)
+
+    def _accept(self, probabilities: np.ndarray) -> Dict[str, Any]:
+        word_stats.letters += 1
+        self.letters += ALPHABET[self._columns[int(np.argmax(probabilities))]]
+
+        # Log-probabilidades por letra del alfabeto (mínimo para las que el modelo no predice)
+        self._emission[:] = 0.0
+        self._emission[self._columns] = probabilities
+        log_probs = np.log(np.maximum(self._emission, settings.WORD_MIN_LETTER_PROB))
+
+        if self.lexicon is not None and len(self._nodes):
+            self._extend(log_probs)
+        return self._message(final=False)
+
+    def _extend(self, log_probs: np.ndarray) -> None:
+        # (beam, alfabeto): O(beam x alfabeto) por letra aceptada
+        children = self.lexicon.children[self._nodes]
+        scores = np.where(children >= 0, self._scores[:, None] + log_probs[None, :], -np.inf)
+        flat = scores.ravel()
+        valid = int(np.count_nonzero(children >= 0))
+        if valid == 0:
+            # La secuencia salió del léxico: queda la transcripción letra a letra
+            self._nodes = self._nodes[:0]
+            self._scores = self._scores[:0]
+            self._texts = []
+            return
+        k = min(self.beam_width, valid)
+        top = np.argpartition(-flat, k - 1)[:k]
+        top = top[np.argsort(-flat[top])]
+        rows, columns = np.divmod(top, len(ALPHABET))
+        self._nodes = children[rows, columns]
+        self._scores = flat[top]
+        self._texts = [self._texts[row] + ALPHABET[column] for row, column in zip(rows, columns)]
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        Cerrar la palabra en curso y devolver el mensaje final
+        """
+        message = self._message(final=True)
+        word_stats.words += 1
+        if not message["in_lexicon"]:
+            word_stats.out_of_lexicon += 1
+        self.reset()
+        return message
+
+    def _message(self, final: bool) -> Dict[str, Any]:
+        hypotheses = []
+        beam = zip(self._nodes, self._scores, self._texts) if self.lexicon is not None else ()
+        for node, score, text in beam:
+            complete = bool(self.lexicon.terminal[node])
+            if final and not complete:
+                continue
+            hypothesis = {"text": text, "score": round(float(score), 3), "complete": complete}
+            if not final:
+                hypothesis["completion"] = self.lexicon.completion(int(node))
+            hypotheses.append(hypothesis)
+            if len(hypotheses) == settings.WORD_HYPOTHESES:
+                break
+
+        message = {"type": "word", "final": final, "letters": self.letters, "hypotheses": hypotheses}
+        if final:
+            # Sin palabra del léxico que coincida, la transcripción letra a letra
+            message["word"] = hypotheses[0]["text"] if hypotheses else self.letters
+            message["in_lexicon"] = bool(hypotheses)
+        return message
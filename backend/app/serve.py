@@ -0,0 +1,331 @@
+"""
+Servidor pre-fork con supervisión de workers
+
+El master importa la aplicación y las librerías pesadas (TensorFlow,
+OpenCV, MediaPipe, numpy) una sola vez, congela el heap (gc.freeze) y
+hace fork de N workers uvicorn que comparten ese código y esos objetos
+copy-on-write y aceptan conexiones del mismo socket. Cada worker crea su
+detector de manos y su modelo después del fork (startup), porque el
+runtime de TensorFlow y MediaPipe no son seguros ante fork.
+
+El master reinicia workers que terminan o cuyo event loop deja de
+enviar heartbeats, y atiende señales:
+
+    SIGTERM / SIGINT  parada ordenada (SIGTERM a los workers, SIGKILL al vencer el plazo)
+    SIGHUP            reinicio gradual, un worker a la vez (p. ej. para un modelo nuevo)
+
+Uso:
+    python -m app.serve --host 0.0.0.0 --port 8000 --workers 4
+"""
+
+import argparse
+import asyncio
+import gc
+import importlib
+import logging
+import mmap
+import os
+import signal
+import socket
+import struct
+import sys
+import time
+from typing import List, Optional
+
+logger = logging.getLogger("comsigns.serve")
+
+HEARTBEAT_INTERVAL_S = 1.0
+# Pausa mínima entre reinicios de un mismo worker que falla al arrancar
+RESPAWN_BACKOFF_S = 1.0
+
+
+class _WorkerSlot:
+    def __init__(self, index: int):
+        self.index = index
+        self.pid: Optional[int] = None
+        self.started_at = 0.0
+        self.last_exit = 0.0
+        self.failures = 0
+
+
+class PreforkMaster:
+    """
+    Proceso master: socket compartido, fork de workers y supervisión
+    """
+
+    def __init__(self, app_path: str, host: str, port: int, workers: int,
+                 boot_timeout: float, heartbeat_timeout: float, graceful_timeout: float,
+                 log_level: str = "info"):
+        self.app_path = app_path
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.boot_timeout = boot_timeout
+        self.heartbeat_timeout = heartbeat_timeout
+        self.graceful_timeout = graceful_timeout
+        self.log_level = log_level
+
+        self.app = None
+        self.sock: Optional[socket.socket] = None
+        # Un double por worker con el último heartbeat (memoria compartida anónima)
+        self.heartbeats = mmap.mmap(-1, 8 * workers)
+        self.slots: List[_WorkerSlot] = [_WorkerSlot(i) for i in range(workers)]
+        self._stopping = False
+        self._restart_queue: List[int] = []
+        self._restarting: Optional[int] = None
+        # Worker viejo del reinicio en curso y plazo para su apagado ordenado
+        self._restart_pid: Optional[int] = None
+        self._restart_deadline = 0.0
+
+    # ==============================================
+    # 🧱 PRECARGA
+    # ==============================================
+
+    def preload(self) -> None:
+        """
+        Importar la aplicación y las librerías pesadas una sola vez en el master
+        """
+        started = time.perf_counter()
+        try:
+            # Solo importar: inicializar el runtime antes del fork no es seguro
+            importlib.import_module("tensorflow.keras.models")
+        except ImportError as e:
+            logger.warning(f"TensorFlow no disponible para precarga: {e}")
+
+        module_name, attr = self.app_path.split(":")
+        self.app = getattr(importlib.import_module(module_name), attr)
+
+        # Sacar los objetos precargados del GC para que sus páginas no se copien en los workers
+        gc.collect()
+        gc.freeze()
+        logger.info(f"Aplicación precargada en {time.perf_counter() - started:.1f}s")
+
+    def bind(self) -> None:
+        self.sock = socket.socket(socket.AF_INET6 if ":" in self.host else socket.AF_INET)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(2048)
+        self.sock.set_inheritable(True)
+
+    # ==============================================
+    # 👷 WORKERS
+    # ==============================================
+
+    def _set_heartbeat(self, index: int, value: float) -> None:
+        struct.pack_into("d", self.heartbeats, index * 8, value)
+
+    def _get_heartbeat(self, index: int) -> float:
+        return struct.unpack_from("d", self.heartbeats, index * 8)[0]
+
+    def spawn(self, slot: _WorkerSlot) -> None:
+        self._set_heartbeat(slot.index, 0.0)
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._run_worker(slot.index)
+            except BaseException:
+                logger.exception(f"Worker {slot.index} terminó con error")
+                code = 1
+            finally:
+                os._exit(code)
+
+        slot.pid = pid
+        slot.started_at = time.monotonic()
+        logger.info(f"Worker {slot.index} iniciado (pid {pid})")
+
+    def _run_worker(self, index: int) -> None:
+        import uvicorn
+
+        # Restaurar señales: uvicorn instala las suyas para el apagado ordenado
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD):
+            signal.signal(sig, signal.SIG_DFL)
+
+        config = uvicorn.Config(self.app, log_level=self.log_level, lifespan="on")
+        server = uvicorn.Server(config)
+
+        async def heartbeat():
+            # Solo late si el event loop del worker está atendiendo
+            while True:
+                if server.started:
+                    self._set_heartbeat(index, time.time())
+                await asyncio.sleep(HEARTBEAT_INTERVAL_S)
+
+        async def run():
+            task = asyncio.get_running_loop().create_task(heartbeat())
+            try:
+                await server.serve(sockets=[self.sock])
+            finally:
+                task.cancel()
+
+        asyncio.run(run())
+        if not server.started:
+            sys.exit(1)
+
+    def _reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+
+            for slot in self.slots:
+                if slot.pid == pid:
+                    code = os.waitstatus_to_exitcode(status)
+                    logger.warning(f"Worker {slot.index} (pid {pid}) terminó con código {code}")
+                    booted = self._get_heartbeat(slot.index) > 0
+                    slot.failures = 0 if booted else slot.failures + 1
+                    slot.pid = None
+                    slot.last_exit = time.monotonic()
+
+    def _check_health(self) -> None:
+        now = time.monotonic()
+        for slot in self.slots:
+            if slot.pid is None:
+                continue
+            last = self._get_heartbeat(slot.index)
+            if last == 0.0:
+                if now - slot.started_at > self.boot_timeout:
+                    logger.error(f"Worker {slot.index} no arrancó en {self.boot_timeout}s; terminando")
+                    self._kill(slot, signal.SIGKILL)
+            elif time.time() - last > self.heartbeat_timeout:
+                logger.error(f"Worker {slot.index} sin heartbeat hace {time.time() - last:.0f}s; terminando")
+                self._kill(slot, signal.SIGKILL)
+
+    def _respawn_missing(self) -> None:
+        now = time.monotonic()
+        for slot in self.slots:
+            if slot.pid is not None:
+                continue
+            # Backoff exponencial para workers que fallan al arrancar
+            delay = RESPAWN_BACKOFF_S * (2 ** min(slot.failures, 6)) if slot.failures else 0.0
+            if now - slot.last_exit >= delay:
+                self.spawn(slot)
+
+    def _advance_restart(self) -> None:
+        """
+        Reinicio gradual: el siguiente worker se reinicia cuando el reemplazo ya atiende
+
+        Mientras el worker viejo termina (las conexiones WebSocket abiertas lo
+        mantienen vivo) sigue enviando heartbeats con su pid: solo cuenta el
+        heartbeat de un pid nuevo. Si el viejo no termina en graceful_timeout
+        recibe SIGKILL.
+        """
+        if self._restarting is not None:
+            slot = self.slots[self._restarting]
+            if slot.pid is not None and slot.pid == self._restart_pid:
+                if time.monotonic() > self._restart_deadline:
+                    logger.warning(f"Worker {slot.index} no terminó en {self.graceful_timeout}s; SIGKILL")
+                    self._kill(slot, signal.SIGKILL)
+                    self._restart_deadline = float("inf")
+                return
+            if slot.pid is None or self._get_heartbeat(slot.index) == 0.0:
+                return
+            self._restarting = None
+            self._restart_pid = None
+
+        if self._restart_queue:
+            index = self._restart_queue.pop(0)
+            slot = self.slots[index]
+            if slot.pid is None:
+                return  # Ya se está reemplazando (terminó o falló al arrancar)
+            self._restarting = index
+            self._restart_pid = slot.pid
+            self._restart_deadline = time.monotonic() + self.graceful_timeout
+            logger.info(f"Reinicio gradual del worker {index} (pid {slot.pid})")
+            self._kill(slot, signal.SIGTERM)
+
+    def _kill(self, slot: _WorkerSlot, sig: int) -> None:
+        if slot.pid is None:
+            return
+        try:
+            os.kill(slot.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    # ==============================================
+    # 🔁 BUCLE DEL MASTER
+    # ==============================================
+
+    def _on_stop(self, signum, frame) -> None:
+        self._stopping = True
+
+    def _on_reload(self, signum, frame) -> None:
+        self._restart_queue = list(range(self.workers))
+
+    def run(self) -> None:
+        self.preload()
+        self.bind()
+
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+
+        logger.info(f"Master {os.getpid()} en {self.host}:{self.port} con {self.workers} workers")
+        for slot in self.slots:
+            self.spawn(slot)
+
+        while not self._stopping:
+            time.sleep(0.5)
+            self._reap()
+            if self._stopping:
+                break
+            self._check_health()
+            self._advance_restart()
+            self._respawn_missing()
+
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        logger.info("Deteniendo workers")
+        for slot in self.slots:
+            self._kill(slot, signal.SIGTERM)
+
+        deadline = time.monotonic() + self.graceful_timeout
+        while any(slot.pid for slot in self.slots) and time.monotonic() < deadline:
+            time.sleep(0.2)
+            self._reap()
+
+        for slot in self.slots:
+            if slot.pid is not None:
+                logger.warning(f"Worker {slot.index} no terminó a tiempo; SIGKILL")
+                self._kill(slot, signal.SIGKILL)
+        self._reap()
+        self.sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor pre-fork de COMSIGNS")
+    parser.add_argument("--app", default="app.main:app")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=None, help="Por defecto WEB_WORKERS")
+    args = parser.parse_args()
+
+    # Diferir MediaPipe y el modelo hasta después del fork (ver MLService.initialize)
+    os.environ["ML_INIT_ON_IMPORT"] = "false"
+    from app.core.config import settings
+
+    logging.basicConfig(level=settings.LOG_LEVEL.upper(), format="%(asctime)s [%(process)d] %(message)s")
+    workers = (args.workers if args.workers is not None else settings.WEB_WORKERS) or os.cpu_count()
+    if settings.STORAGE_BACKEND == "sqlite" and workers > 1:
+        # SQLite admite un solo escritor: el lote abierto de un worker bloquea el event loop de los demás
+        logger.warning(f"STORAGE_BACKEND=sqlite admite un solo escritor; se usa 1 worker en lugar de {workers}")
+        workers = 1
+
+    PreforkMaster(
+        app_path=args.app,
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        boot_timeout=settings.WORKER_BOOT_TIMEOUT,
+        heartbeat_timeout=settings.WORKER_HEARTBEAT_TIMEOUT,
+        graceful_timeout=settings.WORKER_GRACEFUL_TIMEOUT,
+        log_level=settings.LOG_LEVEL.lower(),
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+"""
+Herramientas de benchmarking y pruebas de carga para COMSIGNS
+"""
@@ -0,0 +1,168 @@
+"""
+Latencia y CPU por frame: mp.solutions.hands vs MediaPipe Tasks HandLandmarker
+
+Procesa la misma secuencia de frames JPEG renderizados del dataset con:
+
+    solutions     Hands.process (extractor por defecto), model_complexity 1 y 0
+    tasks-video   HandLandmarker.detect_for_video, síncrono
+    tasks-live    HandLandmarker.detect_async al FPS indicado; latencia hasta
+                  el callback y frames descartados por MediaPipe
+
+La CPU por frame es el tiempo de CPU del proceso (todos los hilos,
+incluidos los de MediaPipe) dividido por los frames procesados.
+
+Uso:
+    python -m benchmarks.landmarker_compare --frames 300 --model /app/models/hand_landmarker.task
+    python -m benchmarks.landmarker_compare --fps 30 --output results/landmarker.json
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.ws_load import DEFAULT_DATASET, percentile, render_hand_frames
+
+
+def _report(latencies_ms: List[float], cpu_s: float, frames: int, detected: int,
+            dropped: int = 0) -> Dict[str, Any]:
+    return {
+        "frames": frames,
+        "detected": detected,
+        "dropped": dropped,
+        "p50_ms": percentile(latencies_ms, 50),
+        "p95_ms": percentile(latencies_ms, 95),
+        "cpu_ms_per_frame": round(cpu_s * 1000 / max(1, frames - dropped), 2),
+    }
+
+
+def run_sync(process: Callable[[bytes], Any], frames: List[bytes], total: int, warmup: int) -> Dict[str, Any]:
+    for i in range(warmup):
+        process(frames[i % len(frames)])
+
+    latencies, detected = [], 0
+    cpu_started = time.process_time()
+    for i in range(total):
+        started = time.perf_counter()
+        if process(frames[i % len(frames)]) is not None:
+            detected += 1
+        latencies.append((time.perf_counter() - started) * 1000)
+    return _report(latencies, time.process_time() - cpu_started, total, detected)
+
+
+def run_solutions(frames: List[bytes], total: int, warmup: int, model_complexity: int) -> Dict[str, Any]:
+    from app.modules.ml.landmarks import create_hands, extract_landmarks
+
+    hands = create_hands(model_complexity)
+    try:
+        return run_sync(lambda frame: extract_landmarks(hands, frame), frames, total, warmup)
+    finally:
+        hands.close()
+
+
+def run_tasks_video(frames: List[bytes], total: int, warmup: int) -> Dict[str, Any]:
+    from app.modules.ml.hand_landmarker import SessionHandLandmarker
+
+    landmarker = SessionHandLandmarker("video")
+    try:
+        return run_sync(landmarker.detect_video, frames, total, warmup)
+    finally:
+        landmarker.close()
+
+
+def run_tasks_live(frames: List[bytes], total: int, warmup: int, fps: float) -> Dict[str, Any]:
+    """
+    Enviar frames al ritmo de una cámara y medir hasta el callback
+    """
+    from app.modules.ml.hand_landmarker import create_hand_landmarker, landmarks_from_result, to_mp_image
+    from app.modules.ml.landmarks import decode_rgb
+
+    submitted: Dict[int, float] = {}
+    latencies: List[float] = []
+    counts = {"results": 0, "detected": 0}
+    lock = threading.Lock()
+    done = threading.Event()
+    last_timestamp = [0]
+
+    def on_result(result, output_image, timestamp_ms: int):
+        with lock:
+            started = submitted.pop(timestamp_ms, None)
+            if started is not None and timestamp_ms >= warmup:
+                latencies.append((time.perf_counter() - started) * 1000)
+                counts["results"] += 1
+                if landmarks_from_result(result) is not None:
+                    counts["detected"] += 1
+            if timestamp_ms == last_timestamp[0]:
+                done.set()
+
+    landmarker = create_hand_landmarker("live_stream", on_result)
+    interval = 1 / fps if fps else 0.0
+    try:
+        cpu_started = None
+        next_at = time.perf_counter()
+        for timestamp in range(warmup + total):
+            if timestamp == warmup:
+                cpu_started = time.process_time()
+            rgb_image = decode_rgb(frames[timestamp % len(frames)])
+            with lock:
+                submitted[timestamp] = time.perf_counter()
+                last_timestamp[0] = timestamp
+            # Timestamps sintéticos en ms: uno por frame
+            landmarker.detect_async(to_mp_image(rgb_image), timestamp)
+            next_at += interval
+            time.sleep(max(0.0, next_at - time.perf_counter()))
+        done.wait(timeout=10)
+        cpu_s = time.process_time() - cpu_started
+    finally:
+        landmarker.close()
+
+    return _report(latencies, cpu_s, total, counts["detected"], dropped=total - counts["results"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparar extractores de landmarks de MediaPipe")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--fps", type=float, default=30.0, help="Ritmo de envío en tasks-live (0 = sin pausa)")
+    parser.add_argument("--model", default=None, help="hand_landmarker.task (por defecto HAND_LANDMARKER_MODEL_PATH)")
+    parser.add_argument("--dataset", type=Path, default=DEFAULT_DATASET)
+    parser.add_argument("--output", type=Path, default=None, help="Guardar resultados en JSON")
+    args = parser.parse_args()
+
+    if args.model:
+        os.environ["HAND_LANDMARKER_MODEL_PATH"] = args.model
+    frames = render_hand_frames(args.dataset, 64, seed=11)
+
+    runs = {
+        "solutions-c1": lambda: run_solutions(frames, args.frames, args.warmup, 1),
+        "solutions-c0": lambda: run_solutions(frames, args.frames, args.warmup, 0),
+        "tasks-video": lambda: run_tasks_video(frames, args.frames, args.warmup),
+        "tasks-live": lambda: run_tasks_live(frames, args.frames, args.warmup, args.fps),
+    }
+
+    print(f"{'extractor':<14} {'p50 ms':>8} {'p95 ms':>8} {'CPU ms/frame':>13} {'detectados':>11} {'descartados':>12}")
+    results: Dict[str, Optional[Dict[str, Any]]] = {}
+    for name, run in runs.items():
+        try:
+            result = run()
+        except Exception as e:
+            print(f"{name:<14} ❌ {e}")
+            results[name] = None
+            continue
+        results[name] = result
+        print(f"{name:<14} {result['p50_ms']:>8} {result['p95_ms']:>8} {result['cpu_ms_per_frame']:>13} "
+              f"{result['detected']:>11} {result['dropped']:>12}")
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps({
+            "frames": args.frames, "fps": args.fps, "cpu_count": os.cpu_count(), "results": results,
+        }, indent=2))
+        print(f"💾 Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,477 @@
+"""
+Microbenchmarks de las funciones del camino crítico
+
+Cubre MLService.process_landmarks / predict_letter, el armado de features
+(camino anterior en float64 vs float32 en el lugar), la codificación JSON
+(json de la stdlib vs orjson) de mensajes del WebSocket y respuestas HTTP,
+el parseo base64 / data URL del handler WebSocket, la segunda opinión k-NN,
+la corrección por dedo contra las plantillas, PracticeService.calculate_score y las
+rutas de escritura de SupabaseService contra un cliente simulado.
+Usa entradas fijas y warm-up, guarda los resultados en JSON y compara
+contra una corrida anterior marcando regresiones sobre un umbral. Para
+los casos síncronos también se guarda la memoria asignada por llamada
+(pico de tracemalloc, alloc_bytes).
+
+Uso:
+    python -m benchmarks.microbench                      # corre y guarda results/<commit>.json
+    python -m benchmarks.microbench --compare results/abc123.json --threshold 0.10
+    python -m benchmarks.microbench --only supabase
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.ws_load import DEFAULT_DATASET, render_hand_frames, to_frame_messages
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+DEFAULT_THRESHOLD = 0.10  # 10% más lento que la referencia = regresión
+
+
+# ==============================================
+# ⏱️ MEDICIÓN
+# ==============================================
+
+def _summarize(samples_ns: List[float], iterations: int) -> Dict[str, float]:
+    per_call_us = [s / iterations / 1000 for s in samples_ns]
+    return {
+        "median_us": round(statistics.median(per_call_us), 3),
+        "mean_us": round(statistics.fmean(per_call_us), 3),
+        "min_us": round(min(per_call_us), 3),
+        "stdev_us": round(statistics.pstdev(per_call_us), 3),
+        "iterations": iterations,
+        "rounds": len(per_call_us),
+    }
+
+
+def measure(fn: Callable[[], Any], iterations: int, rounds: int, warmup: int) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter_ns()
+        for _ in range(iterations):
+            fn()
+        samples.append(time.perf_counter_ns() - start)
+    return _summarize(samples, iterations)
+
+
+def measure_allocations(fn: Callable[[], Any]) -> int:
+    """
+    Bytes asignados en el pico de una llamada (tracemalloc), sin contar el resultado previo
+    """
+    fn()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        fn()
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+def measure_async(fn: Callable[[], Any], iterations: int, rounds: int, warmup: int) -> Dict[str, float]:
+    async def runner():
+        for _ in range(warmup):
+            await fn()
+
+        samples = []
+        for _ in range(rounds):
+            start = time.perf_counter_ns()
+            for _ in range(iterations):
+                await fn()
+            samples.append(time.perf_counter_ns() - start)
+        return samples
+
+    return _summarize(asyncio.run(runner()), iterations)
+
+
+# ==============================================
+# 🧪 ENTRADAS FIJAS
+# ==============================================
+
+class Fixtures:
+    """
+    Entradas deterministas compartidas por todos los benchmarks
+    """
+
+    def __init__(self, dataset_path: Path = DEFAULT_DATASET):
+        self.dataset_path = dataset_path
+        self._frames: Optional[List[bytes]] = None
+
+    @property
+    def frame(self) -> bytes:
+        if self._frames is None:
+            self._frames = render_hand_frames(self.dataset_path, 1, seed=42)
+        return self._frames[0]
+
+    @property
+    def data_url(self) -> str:
+        return to_frame_messages([self.frame])[0]
+
+    @property
+    def landmarks(self) -> np.ndarray:
+        return np.load(self.dataset_path)[0].reshape(21, 3)
+
+    @property
+    def landmark_points(self) -> List[SimpleNamespace]:
+        """
+        21 puntos con x, y, z como los NormalizedLandmark de MediaPipe
+        """
+        return [SimpleNamespace(x=float(x), y=float(y), z=float(z)) for x, y, z in self.landmarks]
+
+    @property
+    def prediction_message(self) -> Dict[str, Any]:
+        return {
+            "type": "prediction", "letter": "A", "confidence": 0.9312, "processing_time_ms": 12.418,
+            "status": "success", "landmarks_detected": True, "model_version": "1.0",
+            "quality_tier": "full", "session_id": FakeSupabaseClient.SESSION_ID, "seq": 1842,
+        }
+
+    @property
+    def frame_message(self) -> str:
+        return json.dumps({"type": "frame", "image": self.data_url, "target": "A", "seq": 1842})
+
+    @property
+    def leaderboard(self) -> Dict[str, Any]:
+        entries = [
+            {"user_id": FakeSupabaseClient.USER_ID, "full_name": f"Usuario {i}", "total_points": 5000 - i * 37,
+             "accuracy_percentage": 95.5 - i * 0.4, "games_played": 120 - i, "current_level": 10 - i // 10,
+             "last_played_at": "2024-05-01T12:00:00+00:00"}
+            for i in range(100)
+        ]
+        return {"success": True, "leaderboard": entries, "difficulty": "beginner", "total_players": 100}
+
+    @property
+    def practice_predictions(self) -> Dict[str, Any]:
+        letters = [chr(i) for i in range(65, 91) if i not in (74, 90)]
+        predictions = [
+            {"letter": letter if i % 3 else "A", "confidence": 0.6 + (i % 4) * 0.1}
+            for i, letter in enumerate(letters)
+        ]
+        return {"predictions": predictions, "target_letters": letters}
+
+
+# ==============================================
+# 🗄️ CLIENTE SUPABASE SIMULADO
+# ==============================================
+
+class _FakeResponse:
+    def __init__(self, data: List[Dict]):
+        self.data = data
+
+
+class _FakeQuery:
+    """
+    Query builder encadenable que devuelve filas fijas en execute()
+    """
+
+    def __init__(self, rows: List[Dict]):
+        self._rows = rows
+
+    def __getattr__(self, name):
+        # select / insert / update / upsert / eq / order / limit ...
+        return lambda *args, **kwargs: self
+
+    def execute(self) -> _FakeResponse:
+        return _FakeResponse(self._rows)
+
+
+class FakeSupabaseClient:
+    USER_ID = "c1d5bed7-fa7c-41fe-947a-11be465cd512"
+    SESSION_ID = "6f1c7d1e-1111-4a4a-9c9c-000000000001"
+
+    def __init__(self):
+        profile = {
+            "id": self.USER_ID, "full_name": "Usuario", "total_points": 120,
+            "games_played": 12, "accuracy_percentage": 75.0, "current_streak": 2,
+            "longest_streak": 6, "current_level": 2, "is_active": True,
+        }
+        session = {
+            "id": self.SESSION_ID, "session_id": self.SESSION_ID, "user_id": self.USER_ID,
+            "status": "active", "total_score": 0, "level": 1,
+        }
+        self.tables = {
+            "user_profiles": [profile],
+            "game_sessions": [session],
+            "game_attempts": [{"is_correct": i % 2 == 0} for i in range(10)],
+            "ml_predictions": [{"id": 1}],
+            "achievements": [{"id": 1}],
+            "user_achievements": [{"id": 1, "achievement_id": 1}],
+            "letters": [{"id": 1, "letter": "A"}],
+        }
+
+    def table(self, name: str) -> _FakeQuery:
+        return _FakeQuery(self.tables.get(name, [{"id": 1}]))
+
+
+def make_supabase_service():
+    from app.core.db_metrics import TracedClient
+    from app.core.supabase import SupabaseService
+
+    service = SupabaseService.__new__(SupabaseService)
+    service.supabase = TracedClient(FakeSupabaseClient())
+    service._connected = True
+    return service
+
+
+# ==============================================
+# 📋 CASOS
+# ==============================================
+
+def build_cases(fixtures: Fixtures) -> Dict[str, Dict[str, Any]]:
+    """
+    Registrar los casos: nombre -> {"setup": callable, "async": bool, "iterations": int}
+    """
+    cases: Dict[str, Dict[str, Any]] = {}
+
+    def case(name: str, iterations: int, is_async: bool = False):
+        def decorator(setup):
+            cases[name] = {"setup": setup, "async": is_async, "iterations": iterations}
+            return setup
+        return decorator
+
+    @case("ml.process_landmarks", iterations=20)
+    def _():
+        from app.modules.ml.services import ml_service
+        frame = fixtures.frame
+        return lambda: ml_service.process_landmarks(frame)
+
+    @case("ml.predict_letter", iterations=20)
+    def _():
+        from app.modules.ml.services import ml_service
+        if ml_service.model is None:
+            raise RuntimeError("modelo no cargado")
+        landmarks = fixtures.landmarks
+        return lambda: ml_service.predict_letter(landmarks)
+
+    @case("ml.features_legacy", iterations=2000)
+    def _():
+        # Camino anterior: lista de listas -> float64 -> resta -> flatten -> float32 para el modelo
+        points = fixtures.landmark_points
+
+        def features():
+            landmarks = np.array([[lm.x, lm.y, lm.z] for lm in points])
+            landmarks = landmarks - landmarks[0]
+            return np.expand_dims(landmarks.flatten(), axis=0).astype(np.float32)
+        return features
+
+    @case("ml.features_float32", iterations=2000)
+    def _():
+        from app.modules.ml.landmarks import FeatureBuffer, relative_landmarks
+        points = fixtures.landmark_points
+        buffer = FeatureBuffer(1)
+
+        def features():
+            relative_landmarks(points, buffer.row())
+            return buffer.batch(1)
+        return features
+
+    @case("ml.knn_query", iterations=200)
+    def _():
+        from app.modules.ml.dataset import LandmarkDataset
+        from app.modules.ml.knn import KnnIndex
+        from app.modules.ml.services import ml_service
+        labels_path = fixtures.dataset_path.with_name("hand_labels.npy")
+        dataset = LandmarkDataset(np.load(fixtures.dataset_path), np.load(labels_path), ml_service.letters)
+        index = KnnIndex(dataset, k=5)
+        landmarks = fixtures.landmarks
+        return lambda: index.query(landmarks)
+
+    @case("ml.finger_feedback", iterations=2000)
+    def _():
+        from app.modules.ml.dataset import LandmarkDataset
+        from app.modules.ml.services import ml_service
+        from app.modules.ml.templates import LetterTemplates
+        labels_path = fixtures.dataset_path.with_name("hand_labels.npy")
+        labels = np.load(labels_path)
+        dataset = LandmarkDataset(np.load(fixtures.dataset_path), labels, ml_service.letters)
+        templates = LetterTemplates(dataset, quantile=0.98)
+        landmarks = dataset.features[0].reshape(21, 3)
+        letter = ml_service.letters[int(labels[0])]
+        return lambda: templates.feedback(letter, landmarks)
+
+    # Codificación JSON: stdlib con las opciones de Starlette (send_json / JSONResponse) vs orjson
+    def stdlib_dumps(data):
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    json_cases = {
+        "ws.encode_prediction": (lambda: fixtures.prediction_message, 2000),
+        "http.encode_leaderboard": (lambda: fixtures.leaderboard, 200),
+    }
+    for name, (payload, iterations) in json_cases.items():
+        def stdlib_setup(payload=payload):
+            data = payload()
+            return lambda: stdlib_dumps(data)
+
+        def orjson_setup(payload=payload):
+            from app.core.serialization import dumps
+            data = payload()
+            return lambda: dumps(data)
+        cases[f"{name}.stdlib"] = {"setup": stdlib_setup, "async": False, "iterations": iterations}
+        cases[f"{name}.orjson"] = {"setup": orjson_setup, "async": False, "iterations": iterations}
+
+    @case("ws.decode_frame.stdlib", iterations=200)
+    def _():
+        message = fixtures.frame_message
+        return lambda: json.loads(message)
+
+    @case("ws.decode_frame.orjson", iterations=200)
+    def _():
+        from app.core.serialization import loads
+        message = fixtures.frame_message
+        return lambda: loads(message)
+
+    @case("ws.decode_image_payload", iterations=200)
+    def _():
+        from app.modules.ml.routes import decode_image_payload
+        data_url = fixtures.data_url
+        return lambda: decode_image_payload(data_url)
+
+    @case("practice.calculate_score", iterations=2000)
+    def _():
+        from app.modules.ml.services import PracticeService
+        service = PracticeService()
+        inputs = fixtures.practice_predictions
+        return lambda: service.calculate_score(inputs["predictions"], inputs["target_letters"])
+
+    user_id = FakeSupabaseClient.USER_ID
+    session_id = FakeSupabaseClient.SESSION_ID
+    supabase_writes = {
+        "create_user_profile": lambda s: s.create_user_profile(user_id, "Usuario"),
+        "update_user_stats": lambda s: s.update_user_stats(user_id, {
+            "total_score": 80, "total_attempts": 10, "correct_attempts": 8, "completed": True}),
+        "start_game_session": lambda s: s.start_game_session(user_id),
+        "update_game_session": lambda s: s.update_game_session(session_id, {"total_score": 10}),
+        "end_game_session": lambda s: s.end_game_session(session_id, 80),
+        "record_game_attempt": lambda s: s.record_game_attempt(
+            session_id, user_id, 1, True, 2.5, 0.9, target_word="CASA", predicted_word="CASA"),
+        "record_ml_prediction": lambda s: s.record_ml_prediction(user_id, session_id, "A", "A", 0.9),
+        "award_achievement": lambda s: s.award_achievement(user_id, 2),
+        "save_ml_prediction": lambda s: s.save_ml_prediction(
+            session_id, user_id, {"letter": "A", "target_letter": "A"}, 0.9),
+    }
+    for method, call in supabase_writes.items():
+        def setup(call=call):
+            service = make_supabase_service()
+            return lambda: call(service)
+        cases[f"supabase.{method}"] = {"setup": setup, "async": True, "iterations": 200}
+
+    return cases
+
+
+# ==============================================
+# 🚀 EJECUCIÓN Y COMPARACIÓN
+# ==============================================
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmarks(cases: Dict[str, Dict[str, Any]], only: Optional[str],
+                   rounds: int, warmup: int) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for name, spec in cases.items():
+        if only and only not in name:
+            continue
+        try:
+            fn = spec["setup"]()
+        except Exception as e:
+            print(f"⏭️  {name}: omitido ({e})")
+            results[name] = {"skipped": str(e)}
+            continue
+
+        runner = measure_async if spec["async"] else measure
+        results[name] = runner(fn, spec["iterations"], rounds, warmup)
+        allocated = ""
+        if not spec["async"]:
+            results[name]["alloc_bytes"] = measure_allocations(fn)
+            allocated = f" {results[name]['alloc_bytes']:>8} B asignados"
+        print(f"⏱️  {name:<34} {results[name]['median_us']:>12.2f} µs (mediana){allocated}")
+    return results
+
+
+def compare(current: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            threshold: float) -> List[Dict[str, Any]]:
+    """
+    Comparar medianas contra una corrida de referencia
+    """
+    regressions = []
+    for name, stats in current.items():
+        base = baseline.get(name)
+        if not base or "median_us" not in stats or "median_us" not in base:
+            continue
+        ratio = stats["median_us"] / base["median_us"] if base["median_us"] else 1.0
+        marker = "❌" if ratio > 1 + threshold else ("✅" if ratio < 1 - threshold else "  ")
+        print(f"{marker} {name:<34} {base['median_us']:>10.2f} → {stats['median_us']:>10.2f} µs "
+              f"({(ratio - 1) * 100:+.1f}%)")
+        if ratio > 1 + threshold:
+            regressions.append({"case": name, "baseline_us": base["median_us"],
+                                "current_us": stats["median_us"], "ratio": round(ratio, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks del camino crítico de COMSIGNS")
+    parser.add_argument("--only", default=None, help="Filtrar casos por subcadena")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--warmup", type=int, default=3, help="Llamadas de warm-up por caso")
+    parser.add_argument("--output", type=Path, default=None,
+                        help="Archivo JSON de salida (por defecto results/<commit>.json)")
+    parser.add_argument("--compare", type=Path, default=None, help="JSON de referencia")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Fracción de empeoramiento tolerada antes de marcar regresión")
+    parser.add_argument("--dataset", type=Path, default=DEFAULT_DATASET)
+    args = parser.parse_args()
+
+    # Los logs INFO de los servicios distorsionan las mediciones
+    logging.basicConfig(level=logging.WARNING)
+
+    commit = git_commit()
+    results = run_benchmarks(build_cases(Fixtures(args.dataset)), args.only, args.rounds, args.warmup)
+
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+    output = args.output or RESULTS_DIR / f"{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"💾 Resultados guardados en {output}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        print(f"\n📊 Comparación contra {baseline.get('commit', args.compare)} (umbral {args.threshold:.0%})")
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regresión(es) sobre el umbral")
+            sys.exit(1)
+        print("\n✅ Sin regresiones")
+
+
+if __name__ == "__main__":
+    main()
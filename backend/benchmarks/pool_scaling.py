@@ -0,0 +1,121 @@
+"""
+Throughput del pool de inferencia según el número de procesos
+
+Mide frames/s de landmarks + predicción con el backend local (un hilo,
+como INFERENCE_BACKEND=local) y con InferencePool de 1 a N procesos,
+usando los mismos frames JPEG renderizados del dataset.
+
+Uso:
+    python -m benchmarks.pool_scaling --max-workers 8 --frames 2000
+    python -m benchmarks.pool_scaling --model /app/models/model.h5 --output results/pool.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing as mp
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from benchmarks.ws_load import DEFAULT_DATASET, render_hand_frames
+
+LETTERS = [chr(i) for i in range(65, 91) if i not in (74, 90)]
+
+
+def make_version(model_path: Optional[str]):
+    """
+    Versión de modelo para los procesos (None = solo landmarks)
+    """
+    if not model_path:
+        return None
+
+    from app.modules.ml.registry import ModelVersion
+    from app.modules.ml.schemas import MLModelCreate
+
+    spec = MLModelCreate(name=Path(model_path).name, version="bench", file_path=model_path)
+    return ModelVersion(1, spec, model=None)
+
+
+def run_local(frames: List[bytes], total: int, model_path: Optional[str]) -> float:
+    from app.modules.ml.landmarks import create_hands, extract_landmarks
+
+    hands = create_hands()
+    model = None
+    if model_path:
+        from app.modules.ml.registry import _load_keras_model
+        model = _load_keras_model(model_path)
+
+    started = time.perf_counter()
+    for i in range(total):
+        landmarks = extract_landmarks(hands, frames[i % len(frames)])
+        if landmarks is not None and model is not None:
+            model.predict(landmarks.reshape(1, -1), verbose=0)
+    return total / (time.perf_counter() - started)
+
+
+async def run_pool(frames: List[bytes], total: int, workers: int, concurrency: int,
+                   model_path: Optional[str]) -> Dict[str, Any]:
+    from app.modules.ml.pool import InferencePool
+
+    version = make_version(model_path)
+    pool = InferencePool(workers, LETTERS)
+    pool.start(preload=version)
+    try:
+        # Warm-up: arranque de procesos, MediaPipe y carga del modelo
+        await asyncio.gather(*[pool.analyze(frames[i % len(frames)], version) for i in range(workers * 4)])
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for i in range(total):
+            queue.put_nowait(frames[i % len(frames)])
+
+        async def client():
+            while not queue.empty():
+                await pool.analyze(queue.get_nowait(), version)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[client() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+        return {"fps": total / elapsed, "inline_frames": pool.inline_frames}
+    finally:
+        pool.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput del pool de inferencia vs procesos")
+    parser.add_argument("--max-workers", type=int, default=mp.cpu_count())
+    parser.add_argument("--frames", type=int, default=1000, help="Frames procesados por configuración")
+    parser.add_argument("--concurrency", type=int, default=64, help="Frames en vuelo")
+    parser.add_argument("--model", default=None, help="Modelo .h5 (por defecto solo landmarks)")
+    parser.add_argument("--dataset", type=Path, default=DEFAULT_DATASET)
+    parser.add_argument("--output", type=Path, default=None, help="Guardar resultados en JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    frames = render_hand_frames(args.dataset, 64, seed=7)
+
+    local_fps = run_local(frames, min(args.frames, 300), args.model)
+    print(f"{'backend':<10} {'procesos':>8} {'frames/s':>10} {'speedup':>8}")
+    print(f"{'local':<10} {1:>8} {local_fps:>10.1f} {1.0:>8.2f}")
+
+    results = {"local": {"workers": 1, "fps": round(local_fps, 2)}, "pool": []}
+    counts = sorted({1, args.max_workers} | {2 ** i for i in range(1, 8) if 2 ** i < args.max_workers})
+    for workers in counts:
+        run = asyncio.run(run_pool(frames, args.frames, workers, args.concurrency, args.model))
+        print(f"{'pool':<10} {workers:>8} {run['fps']:>10.1f} {run['fps'] / local_fps:>8.2f}")
+        results["pool"].append({"workers": workers, "fps": round(run["fps"], 2),
+                                "speedup": round(run["fps"] / local_fps, 2),
+                                "inline_frames": run["inline_frames"]})
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps({
+            "cpu_count": mp.cpu_count(), "frames": args.frames,
+            "concurrency": args.concurrency, "model": args.model, "results": results,
+        }, indent=2))
+        print(f"💾 Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
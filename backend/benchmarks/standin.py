@@ -0,0 +1,76 @@
+"""
+Servidor COMSIGNS con persistencia local para pruebas de carga
+
+Arranca la aplicación con el backend de almacenamiento SQLite en lugar de
+Supabase, de modo que el pipeline /ml/predict se pueda medir sin depender
+de un servicio remoto. --db-latency-ms agrega una espera bloqueante por
+round-trip para simular la latencia de red del cliente Supabase (que
+también es síncrono).
+
+Todos los clientes de la prueba llegan desde 127.0.0.1, así que los
+límites por IP del control de admisión (MAX_SESSIONS_PER_IP,
+FRAME_RATE_PER_IP) se desactivan salvo que estén definidos en el entorno.
+
+Uso:
+    python -m benchmarks.standin --port 8765 --db-latency-ms 0
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from app.core.sqlite_storage import SQLiteStorage
+
+
+class DelayedSQLiteStorage(SQLiteStorage):
+    """
+    SQLiteStorage con latencia fija por round-trip
+    """
+
+    def __init__(self, path: str, latency_ms: float, **kwargs):
+        super().__init__(path, **kwargs)
+        self.latency_s = latency_ms / 1000
+
+    def execute(self, query):
+        time.sleep(self.latency_s)
+        return super().execute(query)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor COMSIGNS con almacenamiento SQLite local")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--db-path", default=None,
+                        help="Archivo SQLite (por defecto uno temporal)")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0,
+                        help="Latencia simulada por round-trip a la base de datos")
+    args = parser.parse_args()
+
+    db_path = args.db_path or os.path.join(tempfile.mkdtemp(prefix="comsigns-load-"), "load.db")
+    os.environ["STORAGE_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = db_path
+    # Exportarlos para medir el control de admisión por IP
+    os.environ.setdefault("MAX_SESSIONS_PER_IP", "0")
+    os.environ.setdefault("FRAME_RATE_PER_IP", "0")
+
+    import uvicorn
+    from app.core import supabase as supabase_module
+    from app.core.config import settings
+
+    if args.db_latency_ms:
+        supabase_module.supabase_service = supabase_module.SupabaseService(
+            client=DelayedSQLiteStorage(
+                db_path, args.db_latency_ms,
+                batch_size=settings.SQLITE_BATCH_SIZE,
+                batch_interval_ms=settings.SQLITE_BATCH_INTERVAL_MS
+            )
+        )
+
+    from app.main import app
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
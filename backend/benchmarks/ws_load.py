@@ -0,0 +1,508 @@
+"""
+Generador de carga WebSocket para el pipeline /ml/predict
+
+Abre N clientes concurrentes que hablan el protocolo existente
+(mensajes "frame" y "ping") a un FPS configurable y reporta throughput,
+latencia ida y vuelta por frame (p50/p95/p99), frames descartados o
+tardíos y consumo de CPU/memoria del servidor.
+
+Los frames son JPEG generados a partir de los landmarks de
+backend/dataset/hand_data.npy (o imágenes reales con --images).
+
+Uso:
+    # Levanta un servidor local con persistencia stand-in y lo mide
+    python -m benchmarks.ws_load --spawn --clients 20 --fps 5 --duration 30
+
+    # Contra un servidor ya corriendo
+    python -m benchmarks.ws_load --url ws://127.0.0.1:8000/api/v1/ml/predict --server-pid 1234
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+DEFAULT_DATASET = BACKEND_DIR / "dataset" / "hand_data.npy"
+
+# Conexiones entre landmarks de MediaPipe Hands (para dibujar la mano)
+HAND_CONNECTIONS = [
+    (0, 1), (1, 2), (2, 3), (3, 4),
+    (0, 5), (5, 6), (6, 7), (7, 8),
+    (5, 9), (9, 10), (10, 11), (11, 12),
+    (9, 13), (13, 14), (14, 15), (15, 16),
+    (13, 17), (0, 17), (17, 18), (18, 19), (19, 20),
+]
+
+
+# ==============================================
+# 🖼️ GENERACIÓN DE FRAMES
+# ==============================================
+
+def render_hand_frames(dataset_path: Path, count: int, width: int = 640,
+                       height: int = 480, quality: int = 80, seed: int = 0) -> List[bytes]:
+    """
+    Renderizar JPEGs sintéticos de manos a partir de landmarks del dataset
+    """
+    import cv2
+
+    data = np.load(dataset_path)
+    rng = np.random.default_rng(seed)
+    rows = data[rng.choice(len(data), size=min(count, len(data)), replace=False)]
+
+    frames = []
+    for row in rows:
+        landmarks = row.reshape(21, 3)
+        image = np.full((height, width, 3), (200, 205, 210), dtype=np.uint8)
+
+        # Landmarks relativos a la muñeca en coordenadas normalizadas de imagen
+        points = [
+            (int((0.5 + x) * width), int((0.85 + y) * height))
+            for x, y, _ in landmarks
+        ]
+        for a, b in HAND_CONNECTIONS:
+            cv2.line(image, points[a], points[b], (120, 160, 210), 22, cv2.LINE_AA)
+        for point in points:
+            cv2.circle(image, point, 12, (110, 150, 200), -1, cv2.LINE_AA)
+
+        ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if ok:
+            frames.append(encoded.tobytes())
+
+    return frames
+
+
+def load_image_frames(images_dir: Path) -> List[bytes]:
+    """
+    Cargar imágenes reales (jpg/png) desde un directorio
+    """
+    frames = []
+    for path in sorted(images_dir.iterdir()):
+        if path.suffix.lower() in (".jpg", ".jpeg", ".png"):
+            frames.append(path.read_bytes())
+    return frames
+
+
+def to_frame_messages(frames: List[bytes]) -> List[str]:
+    """
+    Pre-serializar mensajes "frame" (data URL base64) para no medir al cliente
+    """
+    messages = []
+    for frame in frames:
+        mime = "image/png" if frame[:4] == b"\x89PNG" else "image/jpeg"
+        data_url = f"data:{mime};base64,{base64.b64encode(frame).decode()}"
+        messages.append(data_url)
+    return messages
+
+
+# ==============================================
+# 📈 MONITOREO DEL SERVIDOR
+# ==============================================
+
+class ProcessMonitor:
+    """
+    Muestrea CPU y memoria (RSS) de un proceso vía /proc (o psutil si está disponible)
+    """
+
+    def __init__(self, pid: int, interval_s: float = 1.0):
+        self.pid = pid
+        self.interval_s = interval_s
+        self.cpu_samples: List[float] = []
+        self.rss_samples: List[float] = []
+        self._clock_ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def _read(self):
+        try:
+            import psutil
+            process = psutil.Process(self.pid)
+            times = process.cpu_times()
+            return times.user + times.system, process.memory_info().rss
+        except ImportError:
+            pass
+
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu_s = (int(fields[11]) + int(fields[12])) / self._clock_ticks
+
+        rss = 0
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) * 1024
+                    break
+        return cpu_s, rss
+
+    async def run(self, stop: asyncio.Event):
+        last_cpu, _ = self._read()
+        last_time = time.perf_counter()
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=self.interval_s)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                cpu, rss = self._read()
+            except (OSError, ValueError):
+                break
+            now = time.perf_counter()
+            self.cpu_samples.append((cpu - last_cpu) / (now - last_time) * 100)
+            self.rss_samples.append(rss / (1024 * 1024))
+            last_cpu, last_time = cpu, now
+
+    def summary(self) -> Dict[str, float]:
+        if not self.cpu_samples:
+            return {}
+        return {
+            "cpu_percent_avg": round(float(np.mean(self.cpu_samples)), 1),
+            "cpu_percent_max": round(float(np.max(self.cpu_samples)), 1),
+            "rss_mb_avg": round(float(np.mean(self.rss_samples)), 1),
+            "rss_mb_max": round(float(np.max(self.rss_samples)), 1),
+        }
+
+
+# ==============================================
+# 🔌 CLIENTES
+# ==============================================
+
+class ClientStats:
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0  # ticks omitidos porque el frame anterior seguía en vuelo
+        self.late = 0     # respuestas que llegaron después del siguiente tick
+        self.errors = 0
+        self.timeouts = 0
+        self.words = 0    # mensajes "word" del decodificador de palabras (no son respuestas a un frame)
+        self.stale = 0    # respuestas a frames anteriores que ya habían vencido por timeout
+        self.rtts_ms: List[float] = []
+        self.ping_rtts_ms: List[float] = []
+        self.ping_sent_at: Optional[float] = None
+        self.statuses: Counter = Counter()
+        # Control de admisión: mensajes "busy" por motivo y esperas pedidas por el servidor
+        self.rejected: Optional[str] = None
+        self.busy: Counter = Counter()
+        self.retry_after_ms: List[int] = []
+        self.throttled = 0  # ticks no enviados respetando retry_after_ms
+
+    def observe_busy(self, message: Dict) -> float:
+        """
+        Contar un mensaje "busy"; devuelve los segundos que pide esperar
+        """
+        retry_after_ms = message.get("retry_after_ms") or 0
+        self.busy[message.get("reason", "unknown")] += 1
+        self.retry_after_ms.append(retry_after_ms)
+        return retry_after_ms / 1000
+
+
+async def receive_reply(ws, seq: int, timeout_s: float, stats: ClientStats) -> Optional[Dict]:
+    """
+    Esperar la respuesta al frame seq; None si no llega en timeout_s
+
+    Por el camino cuenta los mensajes "word" (llevan el seq del frame que
+    los produjo, después de su predicción), los "pong" y las respuestas
+    atrasadas a frames anteriores. Los "busy" por admisión no llevan seq y
+    siempre responden al último frame enviado.
+    """
+    deadline = time.perf_counter() + timeout_s
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return None
+        try:
+            message = json.loads(await asyncio.wait_for(ws.recv(), timeout=remaining))
+        except asyncio.TimeoutError:
+            return None
+
+        kind = message.get("type")
+        if kind == "word":
+            stats.words += 1
+        elif kind == "pong":
+            if stats.ping_sent_at is not None:
+                stats.ping_rtts_ms.append((time.perf_counter() - stats.ping_sent_at) * 1000)
+                stats.ping_sent_at = None
+        elif message.get("seq") == seq or ("seq" not in message and kind in ("busy", "error")):
+            return message
+        else:
+            stats.stale += 1
+
+
+async def run_client(url: str, messages: List[str], fps: float, duration_s: float,
+                     ping_interval_s: float, timeout_s: float, offset: int,
+                     stats: ClientStats, start_at: float):
+    import websockets
+
+    period = 1.0 / fps
+    async with websockets.connect(url, max_size=None) as ws:
+        first = json.loads(await ws.recv())  # mensaje inicial "session"
+        if first.get("type") == "busy":
+            # Sesión rechazada por el control de admisión (el servidor cierra con 1013)
+            stats.rejected = first.get("reason", "unknown")
+            stats.observe_busy(first)
+            return
+
+        # Repartir los clientes dentro del primer periodo para no sincronizar ráfagas
+        next_tick = start_at + (offset % 1000) / 1000 * period
+        end_at = start_at + duration_s
+        next_ping = start_at + ping_interval_s
+        index = offset
+        paused_until = 0.0
+
+        while True:
+            now = time.perf_counter()
+            if now >= end_at:
+                break
+
+            if next_tick < paused_until:
+                # El servidor pidió esperar: los ticks de la pausa no se envían
+                skipped = math.ceil((paused_until - next_tick) / period)
+                stats.throttled += skipped
+                next_tick += skipped * period
+                continue
+
+            if now < next_tick:
+                await asyncio.sleep(next_tick - now)
+            elif now - next_tick >= period:
+                missed = int((now - next_tick) // period)
+                stats.dropped += missed
+                next_tick += missed * period
+
+            if ping_interval_s and time.perf_counter() >= next_ping:
+                # El "pong" llega antes que la respuesta al frame y lo cuenta receive_reply
+                stats.ping_sent_at = time.perf_counter()
+                await ws.send(json.dumps({"type": "ping", "timestamp": int(time.time() * 1000)}))
+                next_ping += ping_interval_s
+
+            image = messages[index % len(messages)]
+            index += 1
+            seq = stats.sent
+            sent_at = time.perf_counter()
+            await ws.send(json.dumps({
+                "type": "frame",
+                "image": image,
+                "timestamp": int(time.time() * 1000),
+                "seq": seq
+            }))
+            stats.sent += 1
+
+            response = await receive_reply(ws, seq, timeout_s, stats)
+            received_at = time.perf_counter()
+            if response is None:
+                # Si llega tarde se cuenta como atrasada al esperar el frame siguiente
+                stats.timeouts += 1
+            elif response.get("type") == "busy":
+                # Frame descartado (rate_limited, reduced_quality) o vencido en cola (deadline_exceeded)
+                paused_until = received_at + stats.observe_busy(response)
+            elif response.get("type") == "error":
+                stats.errors += 1
+            else:
+                stats.received += 1
+                stats.rtts_ms.append((received_at - sent_at) * 1000)
+                stats.statuses[response.get("status", response.get("type"))] += 1
+
+            next_tick += period
+            if received_at > next_tick:
+                stats.late += 1
+
+
+# ==============================================
+# 🚀 EJECUCIÓN
+# ==============================================
+
+def spawn_server(port: int, db_latency_ms: float) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.setdefault("ENVIRONMENT", "development")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.standin", "--port", str(port),
+         "--db-latency-ms", str(db_latency_ms)],
+        cwd=str(BACKEND_DIR),
+        env=env,
+    )
+
+    deadline = time.time() + 120  # TensorFlow + modelo tardan en cargar
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("El servidor terminó durante el arranque")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1)
+            return process
+        except OSError:
+            time.sleep(0.5)
+
+    process.terminate()
+    raise RuntimeError("El servidor no respondió a /health a tiempo")
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    return round(float(np.percentile(values, q)), 2) if values else None
+
+
+def build_report(args, all_stats: List[ClientStats], elapsed_s: float,
+                 monitor: Optional[ProcessMonitor]) -> Dict:
+    rtts = [rtt for s in all_stats for rtt in s.rtts_ms]
+    pings = [rtt for s in all_stats for rtt in s.ping_rtts_ms]
+    statuses = Counter()
+    busy = Counter()
+    for s in all_stats:
+        statuses.update(s.statuses)
+        busy.update(s.busy)
+    retry_after = [ms for s in all_stats for ms in s.retry_after_ms]
+
+    sent = sum(s.sent for s in all_stats)
+    received = sum(s.received for s in all_stats)
+    expected = int(args.clients * args.fps * args.duration)
+
+    return {
+        "config": {
+            "clients": args.clients,
+            "fps": args.fps,
+            "duration_s": args.duration,
+            "frames_source": args.images or str(args.dataset),
+        },
+        "elapsed_s": round(elapsed_s, 2),
+        "frames_expected": expected,
+        "frames_sent": sent,
+        "frames_received": received,
+        "throughput_fps": round(received / elapsed_s, 2) if elapsed_s else 0.0,
+        "dropped_frames": sum(s.dropped for s in all_stats),
+        "late_frames": sum(s.late for s in all_stats),
+        "errors": sum(s.errors for s in all_stats),
+        "timeouts": sum(s.timeouts for s in all_stats),
+        "stale_replies": sum(s.stale for s in all_stats),
+        "word_messages": sum(s.words for s in all_stats),
+        "latency_ms": {
+            "p50": percentile(rtts, 50),
+            "p95": percentile(rtts, 95),
+            "p99": percentile(rtts, 99),
+            "max": round(max(rtts), 2) if rtts else None,
+        },
+        "ping_latency_ms": {
+            "p50": percentile(pings, 50),
+            "p99": percentile(pings, 99),
+        },
+        "statuses": dict(statuses),
+        "rejected_clients": sum(1 for s in all_stats if s.rejected),
+        "busy": dict(busy),
+        "throttled_ticks": sum(s.throttled for s in all_stats),
+        "retry_after_ms": {
+            "p50": percentile(retry_after, 50),
+            "max": max(retry_after) if retry_after else None,
+        },
+        "server": monitor.summary() if monitor else {},
+    }
+
+
+async def run_load(args, messages: List[str], server_pid: Optional[int]) -> Dict:
+    all_stats = [ClientStats() for _ in range(args.clients)]
+    stop = asyncio.Event()
+    monitor = ProcessMonitor(server_pid) if server_pid else None
+    monitor_task = asyncio.create_task(monitor.run(stop)) if monitor else None
+
+    start_at = time.perf_counter() + 1.0  # margen para abrir todas las conexiones
+    step = max(1, 1000 // max(1, args.clients))
+    results = await asyncio.gather(*[
+        run_client(args.url, messages, args.fps, args.duration, args.ping_interval,
+                   args.timeout, i * step, all_stats[i], start_at)
+        for i in range(args.clients)
+    ], return_exceptions=True)
+    elapsed = time.perf_counter() - start_at
+
+    stop.set()
+    if monitor_task:
+        await monitor_task
+
+    report = build_report(args, all_stats, elapsed, monitor)
+    report["client_failures"] = [repr(r) for r in results if isinstance(r, Exception)]
+    return report
+
+
+def print_report(report: Dict):
+    latency = report["latency_ms"]
+    print("\n📊 Resultado de la prueba de carga")
+    print(f"   Clientes: {report['config']['clients']} @ {report['config']['fps']} FPS "
+          f"durante {report['config']['duration_s']}s")
+    print(f"   Frames enviados/recibidos: {report['frames_sent']}/{report['frames_received']} "
+          f"(esperados {report['frames_expected']})")
+    print(f"   Throughput: {report['throughput_fps']} frames/s")
+    print(f"   Latencia ms p50/p95/p99/max: {latency['p50']} / {latency['p95']} / "
+          f"{latency['p99']} / {latency['max']}")
+    print(f"   Descartados: {report['dropped_frames']}  Tardíos: {report['late_frames']}  "
+          f"Errores: {report['errors']}  Timeouts: {report['timeouts']}")
+    print(f"   Estados: {report['statuses']}  Mensajes word: {report['word_messages']}  "
+          f"Respuestas atrasadas: {report['stale_replies']}")
+    if report["busy"]:
+        print(f"   Busy: {report['busy']}  Clientes rechazados: {report['rejected_clients']}  "
+              f"Ticks en pausa: {report['throttled_ticks']}  retry_after ms p50/max: "
+              f"{report['retry_after_ms']['p50']} / {report['retry_after_ms']['max']}")
+    if report["server"]:
+        server = report["server"]
+        print(f"   Servidor CPU% avg/max: {server['cpu_percent_avg']} / {server['cpu_percent_max']}  "
+              f"RSS MB avg/max: {server['rss_mb_avg']} / {server['rss_mb_max']}")
+    if report["client_failures"]:
+        print(f"   ⚠️  Clientes fallidos: {len(report['client_failures'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga WebSocket para /ml/predict")
+    parser.add_argument("--url", default=None,
+                        help="URL WebSocket (por defecto el servidor lanzado con --spawn)")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--fps", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--ping-interval", type=float, default=5.0,
+                        help="Segundos entre pings por cliente (0 = sin pings)")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--dataset", type=Path, default=DEFAULT_DATASET)
+    parser.add_argument("--images", type=Path, default=None,
+                        help="Directorio con imágenes reales en lugar de frames sintéticos")
+    parser.add_argument("--frames", type=int, default=64, help="Frames sintéticos distintos")
+    parser.add_argument("--spawn", action="store_true",
+                        help="Lanzar un servidor local con persistencia stand-in")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    parser.add_argument("--server-pid", type=int, default=None)
+    parser.add_argument("--output", type=Path, default=None, help="Guardar el reporte JSON")
+    args = parser.parse_args()
+
+    if args.images:
+        frames = load_image_frames(args.images)
+    else:
+        frames = render_hand_frames(args.dataset, args.frames)
+    if not frames:
+        parser.error("No hay frames para enviar")
+    messages = to_frame_messages(frames)
+
+    server = None
+    server_pid = args.server_pid
+    if args.spawn:
+        server = spawn_server(args.port, args.db_latency_ms)
+        server_pid = server.pid
+        args.url = args.url or f"ws://127.0.0.1:{args.port}/api/v1/ml/predict"
+    elif not args.url:
+        parser.error("Indica --url o usa --spawn")
+
+    try:
+        report = asyncio.run(run_load(args, messages, server_pid))
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+
+    print_report(report)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        print(f"💾 Reporte guardado en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
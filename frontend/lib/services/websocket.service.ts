@@ -38,6 +38,7 @@ export class WebSocketService {
   private reconnectTimeout: NodeJS.Timeout | null = null;
   private heartbeatInterval: NodeJS.Timeout | null = null;
   private isManualClose = false;
+  private busyUntil = 0;
 
   constructor(options: WebSocketOptions, callbacks: WebSocketCallbacks = {}) {
     this.options = {
@@ -124,6 +125,11 @@ export class WebSocketService {
               this.send({ type: 'pong' });
               return;
             }
+
+            // Servidor ocupado: no enviar frames ni reconectar antes de retry_after_ms
+            if (message.type === 'busy') {
+              this.busyUntil = Date.now() + (Number(message.retry_after_ms) || 0);
+            }
             
             this.callbacks.onMessage?.(message);
           } catch (error) {
@@ -206,6 +212,10 @@ export class WebSocketService {
    * Envía un frame como mensaje JSON con base64
    */
   public sendFrame(base64Data: string, metadata: Record<string, unknown> = {}): boolean {
+    if (Date.now() < this.busyUntil) {
+      return false;
+    }
+
     return this.send({
       type: 'frame',
       data: base64Data,
@@ -243,9 +253,10 @@ export class WebSocketService {
 
     this.setStatus('reconnecting');
     this.reconnectAttempts++;
+    const delay = Math.max(this.options.reconnectInterval, this.busyUntil - Date.now());
     
     if (this.options.debug) {
-      console.log(`[WebSocketService] Reconectando en ${this.options.reconnectInterval}ms (intento ${this.reconnectAttempts})`);
+      console.log(`[WebSocketService] Reconectando en ${delay}ms (intento ${this.reconnectAttempts})`);
     }
     
     this.callbacks.onReconnect?.(this.reconnectAttempts);
@@ -254,7 +265,7 @@ export class WebSocketService {
       this.connect().catch(() => {
         // El error ya se maneja en connect()
       });
-    }, this.options.reconnectInterval);
+    }, delay);
   }
 
   private startHeartbeat(): void {